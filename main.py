@@ -1,47 +1,386 @@
 # main.py
-from src import config
-from src.data_loader import load_data, expand_sales, tag_promotions, cluster_by_avg, assign_clusters
-from src.feature_engineering import engineer_features
-from src.visualizer import visualize_all
-from src.forecaster import forecast_promotion5, evaluate_forecast, summarize_clusters, export_forecast
-from src.model import train_model
-from src.visualizer import visualize_all
-
-def main():
-    # Load + prep
-    sales_a, sales_b, promos, product_groups = load_data()
-    promo5 = promos[promos["Period"] == "Promo5"].iloc[0]
-    sales_full = expand_sales(sales_a, expand=config.EXPAND_SALES)
-    sales_full, sales_b, sales_b_promo5 = tag_promotions(sales_full, sales_b, promos)
-
-    # Clustering
-    item_clusters = cluster_by_avg(sales_full, "Item", "Item")
-    store_clusters = cluster_by_avg(sales_full, "Store", "Store")
+import os
+import argparse
+import warnings
+from src import config, instrument
+from src.pipeline import Stage, run_pipeline, select_stages
+
+# Stage bodies import their modules lazily so each subcommand only pays for what it runs
+
+DATA_FILES = ["data/assignment4.1a.csv", "data/assignment4.1b.csv", "data/PromotionDates.csv", "data/assignment4.1c.csv"]
+
+def shard_options():
+    """map_shards options for the sharded stages, or None to run them in-process."""
+    if not config.SHARDS or config.SHARDS <= 1:
+        return None
+    return {"n_shards": config.SHARDS, "n_workers": config.SHARD_WORKERS, "mode": config.SHARD_MODE,
+            "shard_dir": config.SHARD_DIR}
+
+def export_options():
+    """export_predictions options for the prediction and forecast outputs."""
+    return {"fmt": config.PREDICTION_FORMAT, "columns": config.PREDICTION_COLUMNS, "mode": config.PREDICTION_MODE,
+            "freq": config.PREDICTION_PERIOD_FREQ, "compression": config.PREDICTION_COMPRESSION}
+
+def stage_load():
+    from src.data_loader import load_data
+    sales_a, sales_b, promos, product_groups = load_data(
+        chunksize=config.LOAD_CHUNKSIZE, id_dtype=config.LOAD_ID_DTYPE,
+        aggregate=config.LOAD_AGGREGATE_DUPLICATES,
+    )
+    promo5 = promos[promos["Period"] == config.HOLDOUT_PERIOD].iloc[0]
+    train_promos = promos[promos["EndDate"] < promo5["StartDate"]]
+    return {"sales_a": sales_a, "sales_b": sales_b, "promos": promos, "product_groups": product_groups,
+            "promo5": promo5, "train_promos": train_promos}
+
+def stage_expand(sales_a):
+    from src.data_loader import expand_sales
+    return {"sales_full": expand_sales(sales_a, expand=config.EXPAND_SALES, method=config.EXPAND_METHOD)}
+
+def stage_tag(sales_full, sales_b, promos):
+    from src.data_loader import tag_promotions
+    # Stages copy before mutating so cached upstream outputs stay untouched
+    sales_full, sales_b, _ = tag_promotions(sales_full.copy(), sales_b.copy(), promos,
+                                            holdout_period=config.HOLDOUT_PERIOD)
+    return {"sales_full": sales_full, "sales_b": sales_b}
+
+def stage_tensor(sales_full):
+    if config.DATA_BACKEND == "frame":
+        return {"tensor": None}
+    if config.DATA_BACKEND != "tensor":
+        raise ValueError(f"Unsupported data backend: {config.DATA_BACKEND}")
+    from src.sales_tensor import build_sales_tensor
+    from src.feature_cache import digest
+    # Content-addressed directory, so a cached stage output never points at another run's arrays
+    path = os.path.join(config.TENSOR_DIR, digest(sales_full)[:16])
+    return {"tensor": build_sales_tensor(sales_full, path)}
+
+def stage_stats(sales_full, tensor):
+    from src.sales_stats import build_sales_stats
+    return {"stats": build_sales_stats(sales_full, tensor=tensor)}
+
+def stage_cluster(sales_full, sales_b, stats):
+    from src.data_loader import cluster_by_avg, assign_clusters
+    item_clusters = cluster_by_avg(sales_full, "Item", "Item", stats=stats)
+    store_clusters = cluster_by_avg(sales_full, "Store", "Store", stats=stats)
     sales_full, sales_b = assign_clusters(sales_full, sales_b, item_clusters, store_clusters)
+    return {"sales_full": sales_full, "sales_b": sales_b,
+            "item_clusters": item_clusters, "store_clusters": store_clusters}
+
+def stage_lift(stats, product_groups, item_clusters, store_clusters):
+    from src.lift_cube import build_lift_cube
+    return {"lift_cube": build_lift_cube(stats, product_groups, item_clusters, store_clusters)}
 
-    # Feature engineering
-    sales_full, sales_b = engineer_features(sales_full, sales_b, enable=config.FEATURE_ENGINEERING)
-    
-    # Compute cluster lift (used by baseline forecaster)
-    item_cluster_lift = sales_full.groupby(["ItemCluster", "Promotion"])["Quantity"] \
-        .mean().unstack().assign(Lift=lambda x: x[True] - x[False])
-    
-    # Forecast and evaluate
-    sales_b, sales_b_promo5 = forecast_promotion5(sales_full, sales_b, promos, item_cluster_lift, item_clusters, store_clusters)
-    _ = evaluate_forecast(sales_b, sales_b_promo5)
-    summarize_clusters(sales_full, "Train (Promo1-4 period)")
+def stage_features(sales_full, sales_b, promos, tensor):
+    from src.feature_engineering import engineer_features
+    from src.feature_cache import FeatureCache
+    cache = FeatureCache(config.FEATURE_CACHE_DIR, max_bytes=config.FEATURE_CACHE_MAX_BYTES,
+                         fmt=config.FEATURE_CACHE_FORMAT) if config.FEATURE_CACHE else None
+    sales_full, sales_b = engineer_features(sales_full.copy(), sales_b.copy(), enable=config.FEATURE_ENGINEERING,
+                                             engine="tensor" if tensor is not None else config.FEATURE_ENGINE,
+                                             cache=cache, key_parts=(promos, config.FEATURES), tensor=tensor,
+                                             shards=shard_options())
+    if cache is not None:
+        cache.report()
+    return {"sales_full": sales_full, "sales_b": sales_b,
+            "feature_table": cache.table_path("sales_full") if cache is not None else None}
+
+def stage_forecast(sales_full, sales_b, promos, product_groups, item_clusters, store_clusters, lift_cube, stats):
+    from src.forecaster import forecast_promotion5, evaluate_forecast, summarize_clusters
+    # Forecast (baseline + lift from the lift cube) and evaluate
+    sales_b, sales_b_promo5 = forecast_promotion5(sales_full, sales_b.copy(), promos, None,
+                                                  item_clusters, store_clusters,
+                                                  holdout_period=config.HOLDOUT_PERIOD, lift_cube=lift_cube,
+                                                  lift_levels=config.LIFT_LEVELS, min_count=config.LIFT_MIN_COUNT,
+                                                  shards=shard_options())
+    metrics, segments = evaluate_forecast(sales_b, sales_b_promo5, product_groups=product_groups,
+                                          segment_levels=config.METRIC_SEGMENTS)
+    summarize_clusters(sales_full, "Train (Promo1-4 period)", stats, item_clusters, store_clusters)
     summarize_clusters(sales_b_promo5, "Test (Promo5 period)")
-    export_forecast(sales_b_promo5)
+    return {"sales_b": sales_b, "sales_b_promo5": sales_b_promo5, "metrics": metrics, "segments": segments}
 
-    model, sales_b, sales_b_promo5 = train_model(
-        sales_full, sales_b, sales_b_promo5,
-        config.FEATURES, config.RESULTS_DIR, config.MODELS_DIR, config.FIGS_DIR,
-        promos.head(4), promos[promos["Period"] == "Promo5"].iloc[0],
-        model_name=config.MODEL_NAME,
-    )
+def stage_train(sales_full, feature_table, sales_b, sales_b_promo5, product_groups):
+    from src.metrics import segment_metrics
+    sales_b, sales_b_promo5 = sales_b.copy(), sales_b_promo5.copy()
+    if config.MODEL_TYPE == "chunked":
+        from src.chunked_train import train_model_chunked
+        model, metrics, sales_b, sales_b_promo5 = train_model_chunked(
+            feature_table, sales_b, sales_b_promo5, config.FEATURES, config.TRAIN_DATASET_DIR,
+            model_name=config.MODEL_NAME, chunk_rows=config.TRAIN_CHUNK_ROWS, sales_full=sales_full,
+        )
+    elif config.MODEL_TYPE == "stream":
+        from src.stream import stream_model, benchmark_stream
+        # Stream metrics have no validation split, so there is no results txt to write
+        model, sales_b, sales_b_promo5 = stream_model(
+            sales_full, sales_b, sales_b_promo5, config.FEATURES, config.MODELS_DIR,
+            model_name=config.MODEL_NAME, n_rounds=config.STREAM_ROUNDS,
+            learning_rate=config.STREAM_LEARNING_RATE,
+        )
+        metrics = None
+        if config.STREAM_BENCHMARK:
+            benchmark_stream(sales_full, sales_b, config.FEATURES, config.RESULTS_DIR,
+                             model_name=config.MODEL_NAME, n_rounds=config.STREAM_ROUNDS,
+                             learning_rate=config.STREAM_LEARNING_RATE)
+    else:
+        from src.model import train_model
+        model, metrics, sales_b, sales_b_promo5 = train_model(
+            sales_full, sales_b, sales_b_promo5, config.FEATURES,
+            model_name=config.MODEL_NAME, shards=shard_options(),
+        )
+    segments = segment_metrics({"test": sales_b, "promo5": sales_b_promo5}, levels=config.METRIC_SEGMENTS,
+                               product_groups=product_groups)
+    return {"model": model, "metrics": metrics, "segments": segments,
+            "sales_b": sales_b, "sales_b_promo5": sales_b_promo5}
+
+def stage_leaderboard(sales_full, sales_b, sales_b_promo5):
+    if not config.LEADERBOARD_MODELS:
+        return {}
+    from src.leaderboard import train_leaderboard
+    board = train_leaderboard(sales_full, sales_b, sales_b_promo5, config.FEATURES,
+                              config.RESULTS_DIR, config.MODELS_DIR, config.LEADERBOARD_MODELS,
+                              n_workers=config.LEADERBOARD_WORKERS)
+    return {"leaderboard": board}
+
+def stage_backtest(sales_full, feature_table, train_promos, product_groups):
+    if not config.BACKTEST:
+        return {}
+    from src.backtest import backtest
+    metrics = backtest(sales_full, train_promos, config.FEATURES, config.RESULTS_DIR,
+                       methods=config.BACKTEST_METHODS, n_workers=config.BACKTEST_WORKERS,
+                       product_groups=product_groups, lift_levels=config.LIFT_LEVELS,
+                       min_count=config.LIFT_MIN_COUNT, table_path=feature_table)
+    return {"metrics": metrics}
+
+def stage_visualize(sales_full, sales_b, train_promos, promo5, product_groups, item_clusters, store_clusters, model,
+                    lift_cube, tensor, stats):
+    from src.visualizer import visualize_all
     # Visual diagnostics
-    visualize_all(sales_full, sales_b, promos.head(4), promo5, product_groups,
-                  item_clusters, store_clusters, config.FIGS_DIR, model, config.MODEL_NAME, config.FEATURE_ENGINEERING)
+    visualize_all(sales_full, sales_b, train_promos, promo5, product_groups,
+                  item_clusters, store_clusters, config.FIGS_DIR, model, config.MODEL_NAME, config.FEATURE_ENGINEERING,
+                  figures=config.VIS_FIGURES, n_workers=config.VIS_WORKERS, max_points=config.VIS_MAX_POINTS,
+                  lift_cube=lift_cube, tensor=tensor, stats=stats)
+    return {}
+
+EXPORT_CONFIG = ["PREDICTION_FORMAT", "PREDICTION_COLUMNS", "PREDICTION_MODE", "PREDICTION_PERIOD_FREQ",
+                 "PREDICTION_COMPRESSION"]
+
+STAGES = [
+    Stage("load", stage_load, files=DATA_FILES, code=["src.data_loader"],
+          config=["LOAD_CHUNKSIZE", "LOAD_ID_DTYPE", "LOAD_AGGREGATE_DUPLICATES", "HOLDOUT_PERIOD"]),
+    Stage("expand", stage_expand, inputs={"sales_a": "load.sales_a"}, code=["src.data_loader"],
+          config=["EXPAND_SALES", "EXPAND_METHOD"]),
+    Stage("tag", stage_tag, code=["src.data_loader"], config=["HOLDOUT_PERIOD"],
+          inputs={"sales_full": "expand.sales_full", "sales_b": "load.sales_b", "promos": "load.promos"}),
+    Stage("tensor", stage_tensor, code=["src.sales_tensor"], config=["DATA_BACKEND", "TENSOR_DIR"],
+          inputs={"sales_full": "tag.sales_full"}),
+    Stage("stats", stage_stats, code=["src.sales_stats", "src.sales_tensor"],
+          inputs={"sales_full": "tag.sales_full", "tensor": "tensor.tensor"}),
+    Stage("cluster", stage_cluster, code=["src.data_loader", "src.sales_stats"],
+          inputs={"sales_full": "tag.sales_full", "sales_b": "tag.sales_b", "stats": "stats.stats"}),
+    Stage("lift", stage_lift, code=["src.lift_cube", "src.sales_stats"],
+          inputs={"stats": "stats.stats", "product_groups": "load.product_groups",
+                  "item_clusters": "cluster.item_clusters", "store_clusters": "cluster.store_clusters"}),
+    Stage("features", stage_features, code=["src.feature_engineering", "src.sales_tensor", "src.sharding"],
+          config=["FEATURE_ENGINEERING", "FEATURE_ENGINE", "FEATURES", "FEATURE_CACHE", "FEATURE_CACHE_DIR",
+                  "FEATURE_CACHE_FORMAT"],
+          inputs={"sales_full": "cluster.sales_full", "sales_b": "cluster.sales_b", "promos": "load.promos",
+                  "tensor": "tensor.tensor"}),
+    Stage("forecast", stage_forecast,
+          code=["src.forecaster", "src.lift_cube", "src.sales_stats", "src.sharding", "src.prediction_store",
+                "src.metrics"],
+          config=["HOLDOUT_PERIOD", "LIFT_LEVELS", "LIFT_MIN_COUNT", "METRIC_SEGMENTS"],
+          inputs={"sales_full": "features.sales_full", "sales_b": "features.sales_b", "promos": "load.promos",
+                  "product_groups": "load.product_groups",
+                  "item_clusters": "cluster.item_clusters", "store_clusters": "cluster.store_clusters",
+                  "lift_cube": "lift.lift_cube", "stats": "stats.stats"}),
+    Stage("train", stage_train,
+          code=["src.model", "src.stream", "src.chunked_train", "src.sharding", "src.metrics"],
+          config=["MODEL_NAME", "MODEL_TYPE", "FEATURES", "STREAM_ROUNDS", "STREAM_LEARNING_RATE",
+                  "STREAM_BENCHMARK", "RESULTS_DIR", "MODELS_DIR", "TRAIN_CHUNK_ROWS", "TRAIN_DATASET_DIR",
+                  "METRIC_SEGMENTS"],
+          inputs={"sales_full": "features.sales_full", "feature_table": "features.feature_table",
+                  "sales_b": "forecast.sales_b",
+                  "sales_b_promo5": "forecast.sales_b_promo5",
+                  "product_groups": "load.product_groups"}),
+    Stage("leaderboard", stage_leaderboard, code=["src.model", "src.metrics", "src.leaderboard"],
+          config=["LEADERBOARD_MODELS", "LEADERBOARD_WORKERS", "FEATURES"],
+          inputs={"sales_full": "features.sales_full", "sales_b": "forecast.sales_b",
+                  "sales_b_promo5": "forecast.sales_b_promo5"}),
+    Stage("backtest", stage_backtest,
+          code=["src.model", "src.forecaster", "src.lift_cube", "src.sales_stats", "src.metrics", "src.data_loader",
+                "src.feature_engineering", "src.backtest"],
+          config=["BACKTEST", "BACKTEST_METHODS", "BACKTEST_WORKERS", "FEATURES", "LIFT_LEVELS", "LIFT_MIN_COUNT"],
+          inputs={"sales_full": "features.sales_full", "feature_table": "features.feature_table",
+                  "train_promos": "load.train_promos", "product_groups": "load.product_groups"}),
+    Stage("visualize", stage_visualize, code=["src.visualizer", "src.sales_tensor", "src.sales_stats"], config=["FIGS_DIR", "MODEL_NAME", "FEATURE_ENGINEERING", "VIS_FIGURES", "VIS_MAX_POINTS"],
+          inputs={"sales_full": "features.sales_full", "sales_b": "train.sales_b",
+                  "train_promos": "load.train_promos", "promo5": "load.promo5",
+                  "product_groups": "load.product_groups", "item_clusters": "cluster.item_clusters",
+                  "store_clusters": "cluster.store_clusters", "model": "train.model",
+                  "lift_cube": "lift.lift_cube", "tensor": "tensor.tensor", "stats": "stats.stats"}),
+]
+
+def save_outputs(results, summary):
+    """Files other commands read (cluster maps, the model file, results, prediction exports and
+    segment metrics), written after every run.
+
+    Cached stages skip their bodies, so writing these inside a stage would leave them missing or
+    stale whenever the stage is a cache hit. Appending exports are the exception: they are only
+    written by a run of their stage, as a hit's rows were appended when it ran.
+    """
+    export = export_options()
+
+    def exports(name):
+        return config.PREDICTION_MODE != "append" or summary.get(name, ("skipped",))[0] == "run"
+
+    if "cluster" in results:
+        from src.data_loader import save_clusters
+        save_clusters(results["cluster"]["item_clusters"], results["cluster"]["store_clusters"], config.MODELS_DIR)
+    if "forecast" in results:
+        from src.forecaster import export_forecast
+        from src.metrics import write_segment_metrics
+        forecast = results["forecast"]
+        write_segment_metrics(forecast["segments"], os.path.join(config.RESULTS_DIR, "naive_segment_metrics.csv"))
+        if exports("forecast"):
+            export_forecast(forecast["sales_b_promo5"], config.RESULTS_DIR, export=export)
+    if "train" in results:
+        from src.model import save_training_outputs
+        train, name = results["train"], config.MODEL_NAME
+        path = save_training_outputs(train["model"], train["metrics"], train["segments"], name, config.RESULTS_DIR,
+                                     config.MODELS_DIR)
+        print(f"   📤 Published as {path}")
+        if exports("train"):
+            from src.prediction_store import export_predictions
+            export_predictions(train["sales_b"], config.RESULTS_DIR, f"{name}_test_predictions", **export)
+            export_predictions(train["sales_b_promo5"], config.RESULTS_DIR, f"{name}_promo5_predictions", **export)
+
+def main(start=None, until=None, only=None, load=()):
+    instrument.configure(quiet=config.QUIET, profile=config.PROFILE_STAGE, profile_dir=config.RESULTS_DIR)
+    selected, _ = select_stages([stage.name for stage in STAGES], start, until, only)
+    load = list(load) + [name for name in ("cluster", "forecast", "train") if name in selected]
+    results = run_pipeline(STAGES, config, config.PIPELINE_CACHE_DIR, start=start, until=until, only=only,
+                           load=load)
+    save_outputs(*results)
+    if instrument.TRACE and config.TRACE_PATH:
+        print(f"   🧾 Stage trace saved to {instrument.write_trace(config.TRACE_PATH)}")
+    return results
+
+def score(input_path, output_path, model_name, models_dir):
+    """Predict Quantity for the rows of a CSV with a saved model; prints MAE/RMSE when Quantity is present."""
+    import numpy as np
+    import pandas as pd
+    from src.data_loader import load_clusters, map_clusters
+    from src.model import MODEL_EXTENSIONS, load_model, scoring_features
+
+    model = load_model(model_name, os.path.join(models_dir, f"{model_name}.{MODEL_EXTENSIONS[model_name]}"))
+    df = map_clusters(pd.read_csv(input_path), *load_clusters(models_dir))
+    df["PredictedQuantity"] = model.predict(scoring_features(df, config.FEATURES, model_name))
+    df.to_csv(output_path, index=False)
+    print(f"   Scored {len(df):,} rows with {model_name} -> {output_path}")
+    if "Quantity" in df.columns:
+        err = df["Quantity"].to_numpy(dtype=np.float64) - df["PredictedQuantity"].to_numpy()
+        print(f"   MAE:  {np.mean(np.abs(err)):.4f}")
+        print(f"   RMSE: {np.sqrt(np.mean(err ** 2)):.4f}")
+    return df
+
+def simulate(calendars_path, output_path, model_name, models_dir, period, starts=None, lengths=None,
+             by_cluster=False):
+    """Projected lift of candidate calendars for `period`, scored on the engineered test rows with a saved model.
+
+    Calendars come from a CSV (Scenario, StartDate, EndDate, optional Store) or, without one, a
+    grid of start days (default: a week either side of the period's own start) and lengths.
+    """
+    import pandas as pd
+    from src.model import MODEL_EXTENSIONS, load_model
+    from src.simulator import candidate_calendars, simulate_promotions
+
+    results, _ = main(until="features", load=["load", "features"])
+    promos, sales_b = results["load"]["promos"], results["features"]["sales_b"]
+    if calendars_path:
+        calendars = pd.read_csv(calendars_path, parse_dates=["StartDate", "EndDate"])
+    else:
+        window = promos[promos["Period"] == period]
+        if starts is None and window.empty:
+            raise ValueError(f"No '{period}' in the promotion calendar; pass calendars or --starts")
+        first, last = starts or (window["StartDate"].iloc[0] - pd.Timedelta(days=7),
+                                 window["StartDate"].iloc[0] + pd.Timedelta(days=7))
+        lengths = lengths or ([(window["EndDate"].iloc[0] - window["StartDate"].iloc[0]).days + 1]
+                              if not window.empty else [7])
+        store_sets = {"all": None}
+        if by_cluster:
+            clusters = sales_b.drop_duplicates("Store").set_index("Store")["StoreCluster"].dropna()
+            store_sets.update({name: sorted(group.index) for name, group in clusters.groupby(clusters)})
+        calendars = candidate_calendars(first, last, lengths, store_sets)
+
+    model = load_model(model_name, os.path.join(models_dir, f"{model_name}.{MODEL_EXTENSIONS[model_name]}"))
+    scenarios = simulate_promotions(sales_b, promos, calendars, model, config.FEATURES, period=period,
+                                    model_name=model_name, batch_rows=config.SIMULATE_BATCH_ROWS)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    scenarios.to_csv(output_path, index=False)
+    print(scenarios.head(10).to_string(index=False))
+    print(f"   💾 {len(scenarios):,} scenarios saved to {output_path}")
+    return scenarios
+
+# Pipeline subcommands run the stage DAG up to (or only) these stages
+COMMANDS = {
+    "load": ("Load, expand, tag and cluster the sales data", {"until": "cluster"}),
+    "features": ("Everything up to engineered features", {"until": "features"}),
+    "train": ("Everything up to the trained model", {"until": "train"}),
+    "plot": ("Regenerate figures from cached stage outputs", {"only": ["visualize"]}),
+}
+
+def parse_args():
+    names = [stage.name for stage in STAGES]
+    parser = argparse.ArgumentParser(description="Promotion impact analysis pipeline. "
+                                                 "Without a subcommand the full pipeline runs.")
+    parser.add_argument("--from", dest="start", choices=names, help="Force this stage and every later one to rerun")
+    parser.add_argument("--until", choices=names, help="Stop after this stage")
+    parser.add_argument("--only", nargs="+", choices=names, help="Force just these stages to rerun")
+    parser.add_argument("--quiet", action="store_true", help="One line per instrumented stage instead of banners")
+    parser.add_argument("--profile", metavar="FUNCTION", help="Run this instrumented function (e.g. "
+                        "engineer_features) under cProfile")
+    parser.add_argument("--trace", metavar="PATH", help="Stage trace output (.json or .csv)")
+    commands = parser.add_subparsers(dest="command")
+    for name, (help_text, _) in COMMANDS.items():
+        sub = commands.add_parser(name, help=help_text)
+        if name == "train":
+            sub.add_argument("--model", choices=sorted(config.MODEL_SAVE_FORMATS), help="Override MODEL_NAME")
+        if name == "plot":
+            sub.add_argument("--figures", nargs="+", help="Render only these (see src.visualizer.FIGURES)")
+    sub = commands.add_parser("score", help="Score a CSV with a saved model (no pipeline run)")
+    sub.add_argument("input", help="CSV with Store, Item and the model's feature columns")
+    sub.add_argument("-o", "--output", default=None, help="Defaults to <input>_scored.csv")
+    sub.add_argument("--model", default=config.MODEL_NAME, choices=sorted(config.MODEL_SAVE_FORMATS))
+    sub.add_argument("--models-dir", default=config.MODELS_DIR)
+    sub = commands.add_parser("simulate", help="Project the lift of candidate promotion calendars with a saved model")
+    sub.add_argument("calendars", nargs="?", help="CSV with Scenario, StartDate, EndDate and optional Store "
+                     "(NaN = all stores); without it a grid of start days and lengths is simulated")
+    sub.add_argument("--period", default=config.SIMULATE_PERIOD, help="Promotion being planned")
+    sub.add_argument("--starts", nargs=2, metavar=("FIRST", "LAST"), help="Grid start-day range")
+    sub.add_argument("--lengths", nargs="+", type=int, help="Grid window lengths in days")
+    sub.add_argument("--by-cluster", action="store_true", help="Grid also runs each StoreCluster on its own")
+    sub.add_argument("-o", "--output", default=os.path.join(config.RESULTS_DIR, "promotion_scenarios.csv"))
+    sub.add_argument("--model", default=config.MODEL_NAME, choices=sorted(config.MODEL_SAVE_FORMATS))
+    sub.add_argument("--models-dir", default=config.MODELS_DIR)
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    warnings.filterwarnings("ignore")
+    args = parse_args()
+    if args.command == "score":
+        output = args.output or args.input.rsplit(".", 1)[0] + "_scored.csv"
+        score(args.input, output, args.model, args.models_dir)
+    elif args.command == "simulate":
+        simulate(args.calendars, args.output, args.model, args.models_dir, args.period,
+                 starts=args.starts, lengths=args.lengths, by_cluster=args.by_cluster)
+    else:
+        config.QUIET = args.quiet or config.QUIET
+        config.PROFILE_STAGE = args.profile or config.PROFILE_STAGE
+        config.TRACE_PATH = args.trace or config.TRACE_PATH
+        controls = {"start": args.start, "until": args.until, "only": args.only}
+        if args.command:
+            if getattr(args, "model", None):
+                config.MODEL_NAME = args.model
+            if getattr(args, "figures", None):
+                config.VIS_FIGURES = args.figures
+            controls.update(COMMANDS[args.command][1])
+        main(**controls)
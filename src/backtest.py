@@ -0,0 +1,166 @@
+# src/backtest.py
+import io
+import os
+import tempfile
+import contextlib
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+from src.data_loader import cluster_by_avg, assign_clusters
+from src.feature_engineering import SORT_KEYS, group_starts
+from src.forecaster import forecast_promotion5
+from src.lift_cube import build_lift_cube
+from src.sales_stats import SalesStats
+from src.metrics import SegmentMetrics
+from src.model import prepare_splits, build_model
+
+NAIVE = "NAIVE"
+METRIC_LEVELS = ["ItemCluster", "StoreCluster"]
+WINDOWS = {"Last7Avg": 7, "Last30Avg": 30}
+
+# Feature table loaded once per worker process by init_worker
+FEATURE_TABLE = None
+
+def init_worker(path):
+    global FEATURE_TABLE
+    df = pd.read_feather(path) if path.endswith(".feather") else pd.read_parquet(path)
+    FEATURE_TABLE = shift_windows(df)
+
+def shift_windows(df):
+    """Recompute the rolling means over each row's previous rows only (shift(1) before rolling).
+
+    engineer_features' windows include the row's own Quantity, so a fold's test rows would carry
+    their target; a Store-Item's first row has no history and gets NaN.
+    """
+    windows = {col: w for col, w in WINDOWS.items() if col in df.columns}
+    if not windows:
+        return df
+    df = df.sort_values(by=SORT_KEYS, kind="stable")
+    pos = np.arange(len(df))
+    start_pos = np.maximum.accumulate(np.where(group_starts(df), pos, 0))
+    csum = np.concatenate([[0.0], np.cumsum(df["Quantity"].to_numpy(dtype=np.float64))])
+    for col, window in windows.items():
+        lo = np.maximum(start_pos, pos - window)
+        with np.errstate(invalid="ignore"):
+            df[col] = (csum[pos] - csum[lo]) / (pos - lo)
+    return df
+
+def fold_frames(sales, promo):
+    """Rows strictly before the promotion (train) and rows inside its window (test)."""
+    train = sales[sales["Date"] < promo["StartDate"]].copy()
+    test = sales[(sales["Date"] >= promo["StartDate"]) & (sales["Date"] <= promo["EndDate"])].copy()
+    return train, test
+
+def fold_clusters(train, test, stats=None):
+    """Item/Store clusters from the fold's training rows only, assigned to both of its frames.
+
+    Clusters from the whole history would leak each fold's future sales into its training rows.
+    """
+    item_clusters = cluster_by_avg(train, "Item", "Item", stats=stats)
+    store_clusters = cluster_by_avg(train, "Store", "Store", stats=stats)
+    train, test = assign_clusters(train, test, item_clusters, store_clusters)
+    return train, test, item_clusters, store_clusters
+
+def naive_forecast(train, test, promos, period, item_clusters, store_clusters, product_groups=None,
+                   lift_levels=None, min_count=1, stats=None):
+    if product_groups is not None:
+        stats = stats if stats is not None else SalesStats().update(train)
+        cube = build_lift_cube(stats, product_groups, item_clusters, store_clusters)
+        test, _ = forecast_promotion5(train, test, promos, None, item_clusters, store_clusters,
+                                      holdout_period=period, lift_cube=cube, lift_levels=lift_levels,
+                                      min_count=min_count)
+        return test["ExpectedQuantity"].to_numpy()
+    item_cluster_lift = train.groupby(["ItemCluster", "Promotion"])["Quantity"].mean().unstack()
+    if True not in item_cluster_lift.columns:
+        item_cluster_lift[True] = np.nan
+    item_cluster_lift = item_cluster_lift.assign(Lift=lambda x: x[True] - x[False])
+    test, _ = forecast_promotion5(train, test, promos, item_cluster_lift, item_clusters, store_clusters,
+                                  holdout_period=period)
+    return test["ExpectedQuantity"].to_numpy()
+
+def model_forecast(train, test, FEATURES, model_name, n_jobs):
+    splits = prepare_splits(train, test, test, FEATURES)
+    (X_train, y_train), (X_val, y_val) = splits["train"], splits["val"]
+    model = build_model(model_name, n_jobs=n_jobs)
+    model.fit(X_train, y_train, eval_set=[(X_val, y_val)])
+    return model.predict(splits["promo5"][0])
+
+def segment_metrics(test, pred, period, method):
+    """MAE/RMSE overall and per ItemCluster/StoreCluster for one fold and method."""
+    metrics = SegmentMetrics(METRIC_LEVELS).update(test.assign(Prediction=pred), y_pred="Prediction")
+    table = metrics.table().rename(columns={"segment": "cluster"})
+    return [{"period": period, "method": method, **row}
+            for row in table[["level", "cluster", "n", "mae", "rmse"]].to_dict("records")]
+
+def fold_stats(sales, promos):
+    """SalesStats of each fold's training rows, built incrementally in StartDate order.
+
+    Folds train on everything before their promotion, so each one only adds the rows between the
+    previous fold's start and its own instead of rescanning the whole prefix.
+    """
+    stats, cutoff, per_fold = SalesStats(), None, {}
+    for _, promo in promos.sort_values("StartDate").iterrows():
+        new = sales["Date"] < promo["StartDate"]
+        if cutoff is not None:
+            new &= sales["Date"] >= cutoff
+        stats.update(sales[new])
+        cutoff = promo["StartDate"]
+        per_fold[promo["Period"]] = stats.copy()
+    return per_fold
+
+def run_fold(task):
+    promo, method, promos, FEATURES, n_jobs, naive_options = task
+    train, test = fold_frames(FEATURE_TABLE, promo)
+    if train.empty or test.empty:
+        return []
+    # Clustering and forecast_promotion5 print their banners per call; keep worker output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        train, test, item_clusters, store_clusters = fold_clusters(train, test, naive_options["stats"])
+        if method == NAIVE:
+            pred = naive_forecast(train, test, promos, promo["Period"], item_clusters, store_clusters,
+                                  **naive_options)
+        else:
+            pred = model_forecast(train, test, FEATURES, method, n_jobs)
+    return segment_metrics(test, pred, promo["Period"], method)
+
+def backtest(sales_full, promos, FEATURES, results_dir, methods=(NAIVE, "LGBM"), n_workers=None,
+             product_groups=None, lift_levels=None, min_count=1, table_path=None):
+    """Rolling-origin backtest: for each promotion, fit on earlier rows and score its window.
+
+    Item and store clusters are recomputed per fold from its training rows, and the rolling means
+    from earlier rows only (shift_windows). With `product_groups` the naive method forecasts from
+    a per-fold lift cube over `lift_levels`. Workers read `sales_full` from `table_path` (the
+    feature cache's table) when it exists, else from a temporary Parquet copy."""
+    print("\n" + "="*50)
+    print("   🔙 Backtesting Over Promotion Periods...   ")
+    print("="*50 + "\n")
+    in_range = promos[(promos["StartDate"] > sales_full["Date"].min()) &
+                      (promos["StartDate"] <= sales_full["Date"].max())]
+    tasks_spec = [(promo, method) for _, promo in in_range.iterrows() for method in methods]
+    n_cpus = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers or n_cpus, len(tasks_spec)))
+    n_jobs = max(1, n_cpus // n_workers)
+    naive_options = {"product_groups": product_groups, "lift_levels": lift_levels, "min_count": min_count}
+    stats = fold_stats(sales_full, in_range)
+    tasks = [(promo, method, promos, FEATURES, n_jobs,
+              {**naive_options, "stats": stats.get(promo["Period"])})
+             for promo, method in tasks_spec]
+
+    with tempfile.TemporaryDirectory(prefix="backtest_") as tmp:
+        # One shared feature table on disk; each worker reads it once instead of per fold
+        path = table_path
+        if not path or not os.path.exists(path):
+            path = os.path.join(tmp, "features.parquet")
+            sales_full.to_parquet(path)
+        with mp.get_context("spawn").Pool(n_workers, initializer=init_worker, initargs=(path,)) as pool:
+            results = pool.map(run_fold, tasks)
+
+    metrics = pd.DataFrame([row for rows in results for row in rows])
+    os.makedirs(results_dir, exist_ok=True)
+    metrics.to_csv(os.path.join(results_dir, "backtest_metrics.csv"), index=False)
+
+    summary = metrics[metrics["level"] == "All"].pivot(index="period", columns="method", values="rmse")
+    print(f"   RMSE per fold ({len(in_range)} folds x {len(methods)} methods, {n_workers} workers):")
+    print(summary.to_string(float_format=lambda x: f"{x:.4f}"))
+    print("="*50 + "\n")
+    return metrics
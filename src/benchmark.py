@@ -0,0 +1,292 @@
+# src/benchmark.py
+import io
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import warnings
+import contextlib
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+from src import config
+
+PROMO_DAYS = 8
+EXPAND_METHODS = ["numpy", "merge"]  # expand_sales methods timed side by side
+
+def parse_scale(scale):
+    """'STORESxITEMSxDAYS' -> (n_stores, n_items, n_days)."""
+    try:
+        n_stores, n_items, n_days = (int(part) for part in scale.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Scale must look like 'STORESxITEMSxDAYS', got '{scale}'")
+    if n_days < 60:
+        raise ValueError(f"Need at least 60 days to place six promotions, got {n_days}")
+    return n_stores, n_items, n_days
+
+def synthetic_promotions(dates):
+    """Six 8-day promotions: four in the first two thirds (train), Promo5/Promo6 in the last third."""
+    split = len(dates) * 2 // 3
+    train_starts = np.linspace(0, split - PROMO_DAYS - 1, 6)[1:5].astype(int)
+    test_starts = np.linspace(split, len(dates) - PROMO_DAYS - 1, 4)[1:3].astype(int)
+    starts = np.concatenate([train_starts, test_starts])
+    return pd.DataFrame({"Period": [f"Promo{i + 1}" for i in range(6)],
+                         "StartDate": dates[starts], "EndDate": dates[starts + PROMO_DAYS - 1]}), split
+
+def generate_data(data_dir, n_stores, n_items, n_days, density=0.3, return_rate=0.02,
+                  promo_lift=1.5, seed=0, days_per_block=30):
+    """Write assignment4.1a/b/c and PromotionDates CSVs with the real files' schema.
+
+    Only (Store, Item, Day) cells with a sale are written, about `density` of the grid; a
+    `return_rate` share of them are returns (negative quantities). Item and store popularity
+    are log-normal, weekends sell more and promotions multiply demand by `promo_lift`.
+    Rows are generated and appended `days_per_block` days at a time to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    dates = pd.date_range("2015-01-01", periods=n_days, freq="D")
+    promos, split = synthetic_promotions(dates)
+
+    # Density is per cell; the Poisson rate is scaled so it roughly holds on average
+    item_rate = rng.lognormal(0.0, 0.6, n_items)
+    store_rate = rng.lognormal(0.0, 0.3, n_stores)
+    base = np.outer(store_rate, item_rate)
+    base *= -np.log1p(-density) / base.mean()
+    in_promo = np.zeros(n_days, dtype=bool)
+    for _, promo in promos.iterrows():
+        in_promo |= (dates >= promo["StartDate"]) & (dates <= promo["EndDate"])
+    day_factor = np.where(dates.dayofweek >= 5, 1.3, 1.0) * np.where(in_promo, promo_lift, 1.0)
+
+    paths = {"a": os.path.join(data_dir, "assignment4.1a.csv"), "b": os.path.join(data_dir, "assignment4.1b.csv")}
+    for path in paths.values():
+        pd.DataFrame(columns=["Date", "Store", "Item", "Quantity"]).to_csv(path, index=False)
+    n_rows = 0
+    for lo in range(0, n_days, days_per_block):
+        hi = min(lo + days_per_block, n_days)
+        lam = base[None, :, :] * day_factor[lo:hi, None, None]
+        qty = rng.poisson(lam)
+        day, store, item = np.nonzero(qty)
+        q = qty[day, store, item]
+        q[rng.random(q.size) < return_rate] *= -1
+        block = pd.DataFrame({"Date": dates[lo + day].strftime("%Y-%m-%d"),
+                              "Store": store + 1, "Item": item + 1, "Quantity": q})
+        for part, mask in (("a", lo + day < split), ("b", lo + day >= split)):
+            if mask.any():
+                block[mask].to_csv(paths[part], mode="a", header=False, index=False)
+        n_rows += len(block)
+
+    # PromotionDates.csv mixes date orders like the shipped file: M/D/Y for Promo1-4, D/M/Y for Promo5-6
+    with open(os.path.join(data_dir, "PromotionDates.csv"), "w") as f:
+        f.write("Period,StartDate,EndDate\n")
+        for i, promo in promos.iterrows():
+            fmt = "%-m/%-d/%Y" if i < 4 else "%-d/%-m/%Y"
+            f.write(f"{promo['Period']},{promo['StartDate'].strftime(fmt)},{promo['EndDate'].strftime(fmt)}\n")
+
+    groups = pd.DataFrame({"ProductCode": np.arange(1, n_items + 1),
+                           "ProductGroup1": rng.choice(list("ABCDEF"), n_items),
+                           "ProductGroup2": rng.integers(1, 20, n_items)})
+    groups.to_csv(os.path.join(data_dir, "assignment4.1c.csv"), index=False)
+    return n_rows
+
+@contextlib.contextmanager
+def working_dir(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def measure(func, *args, repeats=1, memory=True, **kwargs):
+    """(result, best wall seconds over `repeats` calls, peak traced MB or None).
+
+    Timed calls run without tracemalloc, which slows allocation-heavy Python code several
+    times over; peak memory comes from one extra traced call. tracemalloc sees numpy/pandas
+    buffers but not allocations made inside native libraries such as LightGBM.
+    """
+    best = None
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    if not memory:
+        return result, best, None
+
+    del result
+    gc.collect()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    if not tracing:
+        tracemalloc.stop()
+    return result, best, (peak - base) / 1024**2
+
+def benchmark_scale(scale, work_dir, model_name="LGBM", repeats=1, seed=0, memory=True):
+    """Generate one synthetic dataset and time/memory-profile each pipeline stage on it."""
+    from src.data_loader import load_data, expand_sales, tag_promotions, cluster_by_avg, assign_clusters
+    from src.feature_engineering import engineer_features
+    from src.forecaster import forecast_promotion5
+    from src.model import train_model
+
+    n_stores, n_items, n_days = parse_scale(scale)
+    start = time.perf_counter()
+    n_rows = generate_data(os.path.join(work_dir, "data"), n_stores, n_items, n_days, seed=seed)
+    print(f"   {scale}: generated {n_rows:,} rows in {time.perf_counter() - start:.1f}s")
+    records = []
+
+    def record(stage, rows_in, seconds, peak_mb, rows_out):
+        records.append({"scale": scale, "n_stores": n_stores, "n_items": n_items, "n_days": n_days,
+                        "stage": stage, "rows_in": int(rows_in), "rows_out": int(rows_out),
+                        "seconds": round(seconds, 4), "peak_mb": None if peak_mb is None else round(peak_mb, 1)})
+        mb = "" if peak_mb is None else f"{peak_mb:8.1f} MB"
+        print(f"      {stage:<20} {seconds:8.3f}s  {mb:>11}  {rows_in:>12,} -> {rows_out:,} rows")
+
+    with working_dir(work_dir):
+        (sales_a, sales_b, promos, _), seconds, peak = measure(load_data, repeats=repeats, memory=memory)
+        record("load_data", n_rows, seconds, peak, len(sales_a) + len(sales_b))
+
+        # Always time the dense expansion with both methods; downstream stages follow config.EXPAND_SALES
+        expanded, timings = {}, {}
+        for method in EXPAND_METHODS:
+            expanded[method], seconds, peak = measure(expand_sales, sales_a, expand=True, method=method,
+                                                      repeats=repeats, memory=memory)
+            timings[method] = seconds
+            record(f"expand_sales[{method}]", len(sales_a), seconds, peak, len(expanded[method]))
+        same = expanded["numpy"].equals(expanded["merge"])
+        print(f"      expand numpy vs merge: {timings['numpy']:.3f}s vs {timings['merge']:.3f}s "
+              f"({timings['merge'] / max(timings['numpy'], 1e-9):.1f}x), identical output: {same}")
+        sales_full = expanded[config.EXPAND_METHOD] if config.EXPAND_SALES else sales_a.copy()
+        del expanded
+
+        (sales_full, sales_b, _), seconds, peak = measure(
+            lambda: tag_promotions(sales_full.copy(), sales_b.copy(), promos,
+                                   holdout_period=config.HOLDOUT_PERIOD), repeats=repeats, memory=memory)
+        record("tag_promotions", len(sales_full) + len(sales_b), seconds, peak, len(sales_full))
+
+        (item_clusters, store_clusters), seconds, peak = measure(
+            lambda: (cluster_by_avg(sales_full, "Item", "Item"), cluster_by_avg(sales_full, "Store", "Store")),
+            repeats=repeats, memory=memory)
+        record("cluster_by_avg", len(sales_full), seconds, peak, len(item_clusters) + len(store_clusters))
+        sales_full, sales_b = assign_clusters(sales_full, sales_b, item_clusters, store_clusters)
+
+        (sales_full, sales_b), seconds, peak = measure(
+            lambda: engineer_features(sales_full.copy(), sales_b.copy(), enable=True,
+                                      engine=config.FEATURE_ENGINE), repeats=repeats, memory=memory)
+        record("engineer_features", len(sales_full) + len(sales_b), seconds, peak, len(sales_full))
+
+        lift = sales_full.groupby(["ItemCluster", "Promotion"])["Quantity"].mean().unstack() \
+            .assign(Lift=lambda x: x[True] - x[False])
+        (sales_b, sales_b_promo5), seconds, peak = measure(
+            lambda: forecast_promotion5(sales_full, sales_b.copy(), promos, lift, item_clusters, store_clusters,
+                                        holdout_period=config.HOLDOUT_PERIOD), repeats=repeats, memory=memory)
+        record("forecast_promotion5", len(sales_b), seconds, peak, len(sales_b_promo5))
+
+        _, seconds, peak = measure(
+            lambda: train_model(sales_full, sales_b.copy(), sales_b_promo5.copy(), config.FEATURES,
+                                model_name=model_name),
+            repeats=repeats, memory=memory)
+        record(f"train_model[{model_name}]", len(sales_full), seconds, peak, len(sales_b))
+    return records
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(scales, output, model_name="LGBM", repeats=1, seed=0, data_dir=None, memory=True):
+    """Benchmark every scale and write a JSON report; `data_dir` keeps the generated data."""
+    print("\n" + "="*50)
+    print("   ⏱️  Benchmarking Pipeline Stages...   ")
+    print("="*50 + "\n")
+    records = []
+    for scale in scales:
+        if data_dir:
+            records += benchmark_scale(scale, os.path.join(data_dir, scale), model_name, repeats, seed, memory)
+        else:
+            with tempfile.TemporaryDirectory(prefix="benchmark_") as tmp:
+                records += benchmark_scale(scale, tmp, model_name, repeats, seed, memory)
+
+    report = {
+        "meta": {
+            "commit": git_commit(), "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "model": model_name, "repeats": repeats, "seed": seed, "memory": memory,
+            "settings": {name: getattr(config, name) for name in
+                         ["EXPAND_SALES", "EXPAND_METHOD", "FEATURE_ENGINE", "HOLDOUT_PERIOD"]},
+        },
+        "results": records,
+    }
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n   💾 Benchmark report saved to {output}")
+    return report
+
+def compare_reports(baseline, current, tolerance=0.25, min_seconds=0.05):
+    """Per (scale, stage) ratios of `current` to `baseline`; a regression is slower by more than
+    `tolerance` (and by at least `min_seconds`) or uses more than `tolerance` extra peak memory."""
+    def load(report):
+        if isinstance(report, str):
+            with open(report) as f:
+                report = json.load(f)
+        results = pd.DataFrame(report["results"]).astype({"seconds": float, "peak_mb": float})
+        return results.set_index(["scale", "stage"]), report["meta"]
+
+    (old, old_meta), (new, new_meta) = load(baseline), load(current)
+    table = old[["seconds", "peak_mb"]].join(new[["seconds", "peak_mb"]], lsuffix="_base", rsuffix="_new", how="inner")
+    table["time_ratio"] = table["seconds_new"] / table["seconds_base"]
+    table["mem_ratio"] = table["peak_mb_new"] / table["peak_mb_base"]
+    slower = (table["time_ratio"] > 1 + tolerance) & (table["seconds_new"] - table["seconds_base"] > min_seconds)
+    bigger = table["mem_ratio"] > 1 + tolerance
+    table["regression"] = slower | bigger
+
+    print("\n" + "="*50)
+    print(f"   ⚖️  Benchmark: {old_meta.get('commit')} -> {new_meta.get('commit')}")
+    print("="*50)
+    print(table.to_string(float_format=lambda x: f"{x:.3f}"))
+    print(f"\n   {int(table['regression'].sum())} regression(s) beyond {tolerance:.0%}")
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic-data benchmarks for the pipeline stages.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Generate synthetic data and profile each stage")
+    run.add_argument("--scales", nargs="+", default=config.BENCHMARK_SCALES, help="STORESxITEMSxDAYS")
+    run.add_argument("--output", default=os.path.join(config.RESULTS_DIR, "benchmark.json"))
+    run.add_argument("--model", default=config.MODEL_NAME, choices=sorted(config.MODEL_SAVE_FORMATS))
+    run.add_argument("--repeats", type=int, default=1, help="Report the fastest of this many runs")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--data-dir", default=None, help="Keep the generated data here instead of a temp dir")
+    run.add_argument("--no-memory", dest="memory", action="store_false", help="Skip the traced peak-memory pass")
+    compare = commands.add_parser("compare", help="Compare two reports; exits 1 on regressions")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--tolerance", type=float, default=0.25)
+    compare.add_argument("--min-seconds", type=float, default=0.05)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    if args.command == "run":
+        run_benchmarks(args.scales, args.output, args.model, args.repeats, args.seed, args.data_dir, args.memory)
+    else:
+        table = compare_reports(args.baseline, args.current, args.tolerance, args.min_seconds)
+        sys.exit(1 if table["regression"].any() else 0)
+
+if __name__ == "__main__":
+    main()
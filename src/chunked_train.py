@@ -0,0 +1,242 @@
+# src/chunked_train.py
+import os
+import time
+import numpy as np
+from src.feature_cache import digest
+from src.instrument import instrumented, peak_rss_mb
+from src.model import CAT_FEATURES, compute_metrics, report_metrics, scoring_features
+
+# Same boosting setup as build_model's LGBMRegressor/XGBRegressor defaults
+LGBM_PARAMS = {"objective": "regression", "learning_rate": 0.1, "num_leaves": 31, "verbose": -1}
+XGB_PARAMS = {"objective": "reg:squarederror", "eval_metric": "rmse", "verbosity": 0}
+N_ROUNDS = 100
+EARLY_STOPPING_ROUNDS = 10
+
+def design_matrix(df, FEATURES):
+    """float64 matrix of scoring_features(df), clusters as CLUSTER_LEVELS codes (NaN when unknown)."""
+    X = scoring_features(df, FEATURES)
+    for col in CAT_FEATURES:
+        X[col] = X[col].cat.codes.replace(-1, np.nan)
+    return X.to_numpy(dtype=np.float64), list(X.columns)
+
+class TableChunks:
+    """Sequential batches of the feature columns of a Parquet/Feather table, one in memory at a time.
+
+    get(i) is served from the current batch, by reading forward, or by restarting the scan, so
+    passes that visit chunks in order (LightGBM sampling and row pushing, XGBoost iterators) each
+    read the file once.
+    """
+
+    def __init__(self, path, columns, chunk_rows):
+        self.path = path
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.reader, self.index, self.batch = None, -1, None
+        self.matrix_key, self.matrix = None, None
+
+    def _batches(self):
+        if self.path.endswith(".feather"):
+            from pyarrow import feather
+            # Memory-mapped Arrow IPC: slicing into batches copies nothing until converted
+            table = feather.read_table(self.path, columns=self.columns, memory_map=True)
+            return iter(table.to_batches(max_chunksize=self.chunk_rows))
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(self.path).iter_batches(batch_size=self.chunk_rows, columns=self.columns)
+
+    def get(self, i):
+        if i < self.index or self.reader is None:
+            self.reader, self.index = self._batches(), -1
+        while self.index < i:
+            self.batch = next(self.reader).to_pandas()
+            self.index += 1
+        return self.batch
+
+    def rows(self, i, split, mask, FEATURES):
+        """design_matrix of chunk i's `split` rows; only the latest one is kept."""
+        if self.matrix_key != (i, split):
+            self.matrix_key, self.matrix = (i, split), design_matrix(self.get(i)[mask], FEATURES)[0]
+        return self.matrix
+
+    def release(self):
+        self.reader = self.batch = self.matrix = self.matrix_key = None
+        self.index = -1
+
+    def __iter__(self):
+        self.reader, self.index = self._batches(), -1
+        for batch in self.reader:
+            self.index += 1
+            self.batch = batch.to_pandas()
+            yield self.batch
+
+def split_masks(chunks, val_fraction, seed):
+    """Per-chunk train/val row masks and labels from one pass over the cluster and target columns.
+
+    Rows without clusters are dropped and a seeded draw per chunk holds out `val_fraction`, the
+    chunked counterpart of prepare_splits' train_test_split.
+    """
+    masks, labels = [], {"train": [], "val": []}
+    for i, df in enumerate(chunks):
+        keep = np.logical_and.reduce([df[col].notna().to_numpy() for col in CAT_FEATURES])
+        val = np.random.default_rng([seed, i]).random(len(df)) < val_fraction
+        masks.append({"train": keep & ~val, "val": keep & val})
+        y = df["Quantity"].to_numpy(dtype=np.float64)
+        for split in labels:
+            labels[split].append(y[masks[-1][split]])
+    return masks, {split: np.concatenate(parts) if parts else np.empty(0) for split, parts in labels.items()}
+
+def lgb_sequences(chunks, masks, split, FEATURES):
+    """One lightgbm.Sequence per chunk, each materializing its rows of `split` only when read."""
+    import lightgbm as lgb
+
+    class ChunkSequence(lgb.Sequence):
+        def __init__(self, i, mask):
+            self.i, self.mask, self.batch_size = i, mask, chunks.chunk_rows
+
+        def __len__(self):
+            return int(self.mask.sum())
+
+        def __getitem__(self, idx):
+            return chunks.rows(self.i, split, self.mask, FEATURES)[idx]
+
+    return [ChunkSequence(i, m[split]) for i, m in enumerate(masks) if m[split].any()]
+
+def build_lgb_datasets(chunks, masks, labels, FEATURES, feature_names, cache_dir):
+    """Binned train/val Datasets built from chunks, saved as LightGBM binaries under `cache_dir`."""
+    import lightgbm as lgb
+    paths = {split: os.path.join(cache_dir, f"{split}.bin") for split in ("train", "val")}
+    categorical = [feature_names.index(col) for col in CAT_FEATURES]
+    if all(os.path.exists(p) for p in paths.values()):
+        print(f"   📂 Reusing binned datasets in {cache_dir}")
+        train = lgb.Dataset(paths["train"])
+        return train, lgb.Dataset(paths["val"], reference=train)
+
+    options = dict(feature_name=feature_names, categorical_feature=categorical, params={"verbose": -1})
+    train = lgb.Dataset(lgb_sequences(chunks, masks, "train", FEATURES), label=labels["train"], **options)
+    val = lgb.Dataset(lgb_sequences(chunks, masks, "val", FEATURES), label=labels["val"], reference=train, **options)
+    os.makedirs(cache_dir, exist_ok=True)
+    for split, ds in (("train", train), ("val", val)):
+        ds.construct()
+        ds.save_binary(paths[split])
+    print(f"   💾 Binned datasets saved to {cache_dir}")
+    return train, val
+
+def xgb_matrices(chunks, masks, FEATURES, feature_names):
+    """QuantileDMatrix train/val built batch by batch; only the quantized matrix stays in memory."""
+    import xgboost as xgb
+
+    class ChunkIter(xgb.DataIter):
+        def __init__(self, split):
+            self.split, self.i = split, 0
+            super().__init__()
+
+        def next(self, input_data):
+            while self.i < len(masks) and not masks[self.i][self.split].any():
+                self.i += 1
+            if self.i == len(masks):
+                return False
+            mask = masks[self.i][self.split]
+            y = chunks.get(self.i)["Quantity"].to_numpy(dtype=np.float64)[mask]
+            input_data(data=chunks.rows(self.i, self.split, mask, FEATURES), label=y,
+                       feature_names=feature_names, feature_types=types)
+            self.i += 1
+            return True
+
+        def reset(self):
+            self.i = 0
+
+    # With an iterator, names and types travel with every batch rather than the constructor
+    types = ["c" if name in CAT_FEATURES else "q" for name in feature_names]
+    train = xgb.QuantileDMatrix(ChunkIter("train"), enable_categorical=True)
+    return train, xgb.QuantileDMatrix(ChunkIter("val"), ref=train, enable_categorical=True)
+
+def lgb_val_matrix(chunks, masks, FEATURES):
+    """Raw validation rows for scoring (the held-out tenth, small next to the training rows)."""
+    parts = [design_matrix(chunks.get(i)[m["val"]], FEATURES)[0] for i, m in enumerate(masks) if m["val"].any()]
+    return np.concatenate(parts) if parts else np.empty((0, 0))
+
+@instrumented(rows_from=("df",))
+def write_feature_table(df, FEATURES, dataset_dir):
+    """Parquet table of the training columns of `df` under `dataset_dir`, named by content so a
+    rerun reuses it (and the binned datasets keyed on it)."""
+    columns = [f for f in FEATURES if f != "Date"]
+    path = os.path.join(dataset_dir, f"features-{digest(df[columns])[:16]}.parquet")
+    if not os.path.exists(path):
+        os.makedirs(dataset_dir, exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        df[columns].to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        print(f"   💾 Feature table written to {path}")
+    return path
+
+@instrumented(rows_from=("sales_full", "sales_b"))
+def train_model_chunked(table_path, sales_b, sales_b_promo5, FEATURES, dataset_dir, model_name="LGBM",
+                        chunk_rows=250_000, val_fraction=0.1, seed=42, sales_full=None):
+    """Train from the cached feature table chunk by chunk, never holding its raw rows in memory.
+
+    When the table is missing (FEATURE_CACHE off, or the entry evicted since the features stage
+    ran) it is rebuilt from `sales_full`. Returns the booster, metrics and scored frames; the
+    caller writes its files (save_training_outputs).
+    """
+    print("\n" + "="*50)
+    print("   🤖 Training Out-of-Core Model from Chunks...   ")
+    print("="*50 + "\n")
+    if model_name not in ("LGBM", "XGB"):
+        raise ValueError(f"Unsupported model for chunked training: {model_name}. Options: LGBM, XGB")
+    if not table_path or not os.path.exists(table_path):
+        if sales_full is None:
+            raise ValueError(f"Feature table {table_path} is missing and no sales_full was given to rebuild it")
+        table_path = write_feature_table(sales_full, FEATURES, dataset_dir)
+
+    rss_start = peak_rss_mb()
+    columns = [f for f in FEATURES if f != "Date"]
+    chunks = TableChunks(table_path, columns, chunk_rows)
+    masks, labels = split_masks(TableChunks(table_path, CAT_FEATURES + ["Quantity"], chunk_rows), val_fraction, seed)
+    feature_names = design_matrix(sales_b.head(0), FEATURES)[1]
+    print(f"   {len(masks)} chunks of <= {chunk_rows:,} rows: "
+          f"{len(labels['train']):,} train / {len(labels['val']):,} val rows")
+
+    start = time.perf_counter()
+    if model_name == "LGBM":
+        import lightgbm as lgb
+        key = digest((os.path.abspath(table_path), os.path.getmtime(table_path), os.path.getsize(table_path)),
+                     FEATURES, val_fraction, seed, lgb.__version__)
+        train, val = build_lgb_datasets(chunks, masks, labels, FEATURES, feature_names,
+                                        os.path.join(dataset_dir, key[:16]))
+    else:
+        train, val = xgb_matrices(chunks, masks, FEATURES, feature_names)
+    # Release the last raw batch; from here on only binned data is held
+    chunks.release()
+    rss_built = peak_rss_mb()
+    print(f"   Datasets ready in {time.perf_counter() - start:.2f}s, peak RSS {rss_built:.0f} MB "
+          f"(+{rss_built - rss_start:.0f} MB)")
+
+    start = time.perf_counter()
+    if model_name == "LGBM":
+        import lightgbm as lgb
+        booster = lgb.train(LGBM_PARAMS, train, num_boost_round=N_ROUNDS, valid_sets=[val],
+                            callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        y_val_pred = booster.predict(lgb_val_matrix(chunks, masks, FEATURES))
+    else:
+        import xgboost as xgb
+        booster = xgb.train(XGB_PARAMS, train, num_boost_round=N_ROUNDS, evals=[(val, "val")], verbose_eval=False)
+        y_val_pred = booster.predict(val)
+    rss_trained = peak_rss_mb()
+    print(f"   Boosted in {time.perf_counter() - start:.2f}s, peak RSS {rss_trained:.0f} MB")
+
+    X_test, X_promo5 = design_matrix(sales_b, FEATURES)[0], design_matrix(sales_b_promo5, FEATURES)[0]
+    if model_name == "XGB":
+        X_test = xgb.DMatrix(X_test, feature_names=feature_names, feature_types=train.feature_types,
+                             enable_categorical=True)
+        X_promo5 = xgb.DMatrix(X_promo5, feature_names=feature_names, feature_types=train.feature_types,
+                               enable_categorical=True)
+    y_test_pred = booster.predict(X_test)
+    y_promo5_pred = booster.predict(X_promo5) if len(sales_b_promo5) else np.full(0, np.nan)
+    metrics = compute_metrics(labels["val"], y_val_pred, sales_b["Quantity"], y_test_pred,
+                              sales_b_promo5["Quantity"], y_promo5_pred)
+    report_metrics(metrics, model_name)
+
+    sales_b["PredictedQuantity"] = y_test_pred
+    sales_b_promo5["PredictedQuantity"] = y_promo5_pred
+    print(f"   📏 Peak RSS: {rss_start:.0f} MB at start, {rss_built:.0f} MB after binning, "
+          f"{rss_trained:.0f} MB after boosting")
+    return booster, metrics, sales_b, sales_b_promo5
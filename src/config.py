@@ -1,28 +1,22 @@
 # src/config.py
 import os
-import matplotlib as mpl
-import warnings
 
-# Suppress warnings
-warnings.filterwarnings("ignore")
+# Constants only: importing config must stay cheap and side-effect free. Output directories
+# are created by the functions that write to them, and PLOT_STYLE is applied by the visualizer.
 
 # Directory paths
 FIGS_DIR = "figures"
 MODELS_DIR = "models"
 RESULTS_DIR = "results"
 
-os.makedirs(FIGS_DIR, exist_ok=True)
-os.makedirs(MODELS_DIR, exist_ok=True)
-os.makedirs(RESULTS_DIR, exist_ok=True)
-
 # Plotting config
-mpl.rcParams.update({
+PLOT_STYLE = {
     'font.family': 'DejaVu Serif',
     'font.size': 20,
     'axes.titlesize': 20,
     'axes.labelsize': 20,
     'legend.fontsize': 20
-})
+}
 
 # Plot color palette
 COLOR_ORANGE = '#d95f02'
@@ -32,7 +26,56 @@ COLOR_GOLD = 'goldenrod'
 
 # Global flags
 EXPAND_SALES = False
+EXPAND_METHOD = 'numpy'  # Options: 'numpy' (pre-sized grid), 'merge' (cartesian merge + reindex)
+
+# Promotion period held out as the test window (rows may be scoped via optional Store/Item columns)
+HOLDOUT_PERIOD = 'Promo5'
+
+# Ingestion (None reads each sales CSV whole; an int streams it in chunks of that many rows)
+LOAD_CHUNKSIZE = None
+LOAD_ID_DTYPE = 'int32'  # Options: 'int32', 'category'
+LOAD_AGGREGATE_DUPLICATES = True  # Sum duplicate (Date, Store, Item) rows while streaming
 FEATURE_ENGINEERING = True
+FEATURE_ENGINE = 'vectorized'  # Options: 'vectorized', 'groupby'
+
+# Data backend for clustering, lift, feature and daily-total aggregations: 'frame' (long pandas
+# frames) or 'tensor' (dense Store x Item x Day arrays, memory-mapped from TENSOR_DIR)
+DATA_BACKEND = 'frame'
+TENSOR_DIR = os.path.join("data", "sales_tensor")
+
+# Pipeline stage outputs, keyed by each stage's inputs, config values and code
+PIPELINE_CACHE_DIR = os.path.join("data", "pipeline_cache")
+
+# Stage instrumentation: per-call wall/CPU time, rows and peak RSS written to TRACE_PATH (.json or .csv)
+TRACE_PATH = os.path.join(RESULTS_DIR, "stage_trace.json")
+QUIET = False  # Replace the stages' banners with one line per stage
+PROFILE_STAGE = None  # e.g. 'engineer_features': run that stage under cProfile, stats saved to RESULTS_DIR
+
+# Store-sharded feature engineering, lift lookups and model scoring: rows are split into SHARDS
+# partitions by a hash of Store and run in a process pool ('pool') or as separate
+# `python -m src.sharding` worker processes ('processes'). The merged outputs equal the
+# single-process ones, so these settings do not invalidate cached stages.
+SHARDS = 1  # 1 = single-process
+SHARD_WORKERS = None  # None = one per shard, capped at the CPU count
+SHARD_MODE = 'pool'  # Options: 'pool', 'processes'
+SHARD_DIR = None  # Parent of the per-call shard file directories; None = system temp dir
+
+# Feature cache (content-addressed; keyed on inputs, promotions, FEATURES and feature-code version)
+FEATURE_CACHE = True
+FEATURE_CACHE_DIR = os.path.join("data", "feature_cache")
+FEATURE_CACHE_FORMAT = 'parquet'  # Options: 'parquet', 'feather' (memory-mapped on read)
+FEATURE_CACHE_MAX_BYTES = 2 * 1024**3  # LRU eviction above this size; None = unbounded
+
+# Online feature store: per-(Store, Item) rolling/lag state updated event by event
+# (`python -m src.feature_store build|check`), snapshotted to FEATURE_STORE_DIR
+FEATURE_STORE_DIR = os.path.join("data", "feature_store")
+
+# Naive forecast: baseline and lift from the finest level of the lift cube with at least
+# LIFT_MIN_COUNT rows (per side). The default is the original cluster-only forecaster; for
+# fine-first fallback use e.g. ['ItemStore', 'Item', 'ProductGroup2', 'ProductGroup1', 'ClusterPair',
+# 'ItemCluster'] with LIFT_MIN_COUNT = 20
+LIFT_LEVELS = ['ItemCluster']
+LIFT_MIN_COUNT = 1
 
 # Feature list for modeling
 FEATURES = [
@@ -44,8 +87,56 @@ FEATURES = [
 CATEGORICAL_FEATURES = ["ItemCluster", "StoreCluster"]
 
 MODEL_NAME = 'LGBM'
+MODEL_TYPE = 'static'  # Options: 'static' (full refit), 'stream' (warm-start from latest checkpoint), 'chunked'
+TRAIN_CHUNK_ROWS = 250_000  # 'chunked': LGBM/XGB datasets built from the feature table in chunks this size
+TRAIN_DATASET_DIR = os.path.join("data", "train_datasets")  # Saved LightGBM binary datasets (and the feature table when FEATURE_CACHE is off), reused across runs
+STREAM_ROUNDS = 20  # Boosting rounds added per stream update
+STREAM_LEARNING_RATE = 0.02  # Shrinkage for update rounds (the base fit uses 0.1)
+STREAM_BENCHMARK = False  # Also replay recent days comparing warm-start updates with full refits
+
+# Prediction and naive-forecast exports: 'parquet' writes RESULTS_DIR/<name>/ as a compressed
+# dataset partitioned by Period (Date at PREDICTION_PERIOD_FREQ) and Store, read back with
+# src.prediction_store.read_predictions; 'csv' writes RESULTS_DIR/<name>.csv
+PREDICTION_FORMAT = 'parquet'  # Options: 'parquet', 'csv'
+PREDICTION_COLUMNS = ['Date', 'Store', 'Item', 'Quantity', 'Promotion', 'PromoPeriod', 'PromoDay', 'ItemCluster',
+                      'StoreCluster', 'ExpectedQuantity', 'BaselineLevel', 'LiftLevel',
+                      'PredictedQuantity']  # Columns missing from a frame are skipped; None = all
+PREDICTION_MODE = 'overwrite'  # 'append' adds each run's rows to the existing export (daily runs)
+PREDICTION_PERIOD_FREQ = 'M'  # pandas period alias for the Period partition
+PREDICTION_COMPRESSION = 'zstd'
+
+# Error breakdowns written next to the overall metrics (results/*_segment_metrics.csv); product
+# groups are looked up from Item
+METRIC_SEGMENTS = ['ItemCluster', 'StoreCluster', 'Store', 'ProductGroup1', 'ProductGroup2', 'PromoDay']
+
+# Leaderboard: backends (or {'name', 'model', 'params'} dicts) trained concurrently; empty = disabled
+LEADERBOARD_MODELS = []
+LEADERBOARD_WORKERS = None  # None = one per entry, capped at the CPU count
 SAMPLE_SIZE = -1
 
+# Rolling-origin backtest over training promotions ('NAIVE' = cluster baseline + lift)
+BACKTEST = False
+BACKTEST_METHODS = ['NAIVE', 'LGBM']
+BACKTEST_WORKERS = None  # None = one per fold/method task, capped at the CPU count
+
+# Scoring service (python -m src.serving)
+SERVE_PORT = 8765
+SERVE_BATCH_SIZE = 4096  # Max rows per predict() call
+SERVE_MAX_WAIT_MS = 5.0  # Max time a request waits for its batch to fill
+
+# Promotion what-if simulator (python main.py simulate): candidate calendars for SIMULATE_PERIOD
+# replace it on the test rows, and blocks of scenarios are scored together with the saved model
+SIMULATE_PERIOD = 'Promo6'
+SIMULATE_BATCH_ROWS = 1_000_000  # Max [scenario x row] cells per block, and rows per predict() call
+
+# Figures: rendered on the Agg backend in a process pool from pre-aggregated inputs
+VIS_FIGURES = None  # Subset of src.visualizer.FIGURES to render; None = all
+VIS_WORKERS = None  # None = one per figure, capped at the CPU count; 1 = render in-process
+VIS_MAX_POINTS = 2000  # Daily series longer than this are min/max-downsampled
+
+# Synthetic-data benchmarks (python -m src.benchmark run), as STORESxITEMSxDAYS
+BENCHMARK_SCALES = ['20x50x240', '50x100x240', '100x300x240']
+
 # Save format (optional utility)
 MODEL_SAVE_FORMATS = {
     'LGBM': 'txt',
@@ -1,30 +1,94 @@
 # src/data_loader.py
+import os
+import tracemalloc
+import numpy as np
 import pandas as pd
+from src.instrument import instrumented
 
-def load_data():
+SALES_COLUMNS = ["Date", "Store", "Item", "Quantity"]
+SALES_KEYS = ["Date", "Store", "Item"]
+# PromotionDates.csv writes Promo1-4 month-first and Promo5 onwards day-first
+DAYFIRST_FROM_PERIOD = 5
+
+@instrumented()
+def load_data(chunksize=None, id_dtype="int32", aggregate=True):
     print("\n" + "="*30)
     print("       Loading Data...       ")
     print("="*30 + "\n")
-    sales_a = pd.read_csv("data/assignment4.1a.csv", parse_dates=["Date"])
-    sales_b = pd.read_csv("data/assignment4.1b.csv", parse_dates=["Date"])
-    promos1to4 = pd.read_csv("data/PromotionDates.csv", parse_dates=["StartDate", "EndDate"], nrows=4)
-    promos5to6 = pd.read_csv("data/PromotionDates.csv", skiprows=range(1, 5), header=0,
-                             parse_dates=["StartDate", "EndDate"], dayfirst=True)
-    promos = pd.concat([promos1to4, promos5to6], ignore_index=True)
-
-    # Add promo period names (assumed based on assignment)
-    promos["Period"] = ["Promo1", "Promo2", "Promo3", "Promo4", "Promo5", "Promo6"]
+    if chunksize:
+        sales_a = read_sales_chunked("data/assignment4.1a.csv", chunksize, id_dtype, aggregate)
+        sales_b = read_sales_chunked("data/assignment4.1b.csv", chunksize, id_dtype, aggregate)
+    else:
+        sales_a = pd.read_csv("data/assignment4.1a.csv", parse_dates=["Date"])
+        sales_b = pd.read_csv("data/assignment4.1b.csv", parse_dates=["Date"])
+    promos = read_promotions("data/PromotionDates.csv")
 
     sales_a.columns = sales_b.columns = ["Date", "Store", "Item", "Quantity"]
     product_groups = pd.read_csv("data/assignment4.1c.csv")
     return sales_a, sales_b, promos, product_groups
 
-def expand_sales(sales_a, expand=False):
+def read_promotions(path):
+    """Promotion calendar with each row's dates parsed in its period's format (any number of rows
+    per period, e.g. store- or item-scoped ones)."""
+    promos = pd.read_csv(path, dtype={"StartDate": str, "EndDate": str})
+    promos["Period"] = promos["Period"].str.strip()
+    number = pd.to_numeric(promos["Period"].str.extract(r"(\d+)$")[0], errors="coerce")
+    dayfirst = (number >= DAYFIRST_FROM_PERIOD).to_numpy()
+    for col in ["StartDate", "EndDate"]:
+        parts = [pd.to_datetime(promos.loc[mask, col], dayfirst=first)
+                 for mask, first in ((~dayfirst, False), (dayfirst, True)) if mask.any()]
+        promos[col] = pd.concat(parts).sort_index() if parts else pd.to_datetime(promos[col])
+    return promos
+
+def read_sales_chunked(path, chunksize, id_dtype="int32", aggregate=True):
+    """Stream a sales CSV in chunks with compact dtypes, summing duplicate (Date, Store, Item) rows."""
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    # Category codes are assigned once at the end so every chunk shares the same categories
+    read_dtype = {"Store": id_dtype, "Item": id_dtype} if id_dtype != "category" else None
+    parts = []
+    n_rows = 0
+    reader = pd.read_csv(path, header=0, names=SALES_COLUMNS, dtype=read_dtype,
+                         parse_dates=["Date"], chunksize=chunksize)
+    for chunk in reader:
+        n_rows += len(chunk)
+        if aggregate:
+            chunk = chunk.groupby(SALES_KEYS, as_index=False, sort=False)["Quantity"].sum()
+        chunk["Quantity"] = pd.to_numeric(chunk["Quantity"], downcast="integer")
+        parts.append(chunk)
+
+    sales = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=SALES_COLUMNS)
+    del parts
+    if aggregate:
+        # Duplicates can straddle chunk boundaries, so fold the (much smaller) partials once more
+        sales = sales.groupby(SALES_KEYS, as_index=False, sort=True)["Quantity"].sum()
+    # Downcast after summing so aggregated totals can never overflow the chosen width
+    sales["Quantity"] = pd.to_numeric(sales["Quantity"], downcast="integer")
+    if id_dtype == "category":
+        sales["Store"] = sales["Store"].astype("category")
+        sales["Item"] = sales["Item"].astype("category")
+
+    _, peak = tracemalloc.get_traced_memory()
+    if not tracing:
+        tracemalloc.stop()
+    print(f"   📥 {path}: {n_rows:,} rows read -> {len(sales):,} rows kept "
+          f"({sales.memory_usage(deep=True).sum() / 1024**2:.1f} MB, peak {peak / 1024**2:.1f} MB)")
+    return sales
+
+@instrumented(rows_from=("sales_a",))
+def expand_sales(sales_a, expand=False, method="numpy"):
     if not expand:
         return sales_a.copy()
     print("\n" + "-"*40)
     print("   📂 Expanding Sales Data...   ")
     print("-"*40 + "\n")
+    if method == "numpy":
+        return densify_sales(sales_a)
+    if method != "merge":
+        raise ValueError(f"Unsupported expansion method: {method}")
     observed_pairs = sales_a[["Store", "Item"]].drop_duplicates()
     all_dates = pd.date_range(sales_a["Date"].min(), sales_a["Date"].max())
     full_index = pd.MultiIndex.from_frame(
@@ -32,29 +96,134 @@ def expand_sales(sales_a, expand=False):
     )
     return sales_a.groupby(["Store", "Item", "Date"])["Quantity"].sum().reindex(full_index, fill_value=0).reset_index()
 
-def tag_promotions(sales_full, sales_b, promos):
+def densify_sales(sales_a):
+    """Pre-sized Store-Item x Date grid filled by flat index arithmetic (same rows as the merge path)."""
+    # Pair codes follow first appearance, matching drop_duplicates() in the merge path
+    pair_codes = sales_a.groupby(["Store", "Item"], sort=False).ngroup().to_numpy()
+    first_rows = np.unique(pair_codes, return_index=True)[1]
+    n_pairs = len(first_rows)
+
+    dates = sales_a["Date"].to_numpy()
+    start = dates.min() if len(dates) else np.datetime64("NaT")
+    all_dates = pd.date_range(start, dates.max()).to_numpy().astype(dates.dtype) if len(dates) else dates[:0]
+    n_days = len(all_dates)
+    day_codes = (dates - start) // np.timedelta64(1, "D")
+
+    qty = sales_a["Quantity"].to_numpy()
+    quantity = np.zeros(n_pairs * n_days, dtype=np.result_type(qty.dtype, np.int64))
+    np.add.at(quantity, pair_codes * n_days + day_codes, qty)
+
+    return pd.DataFrame({
+        "Store": np.repeat(sales_a["Store"].to_numpy()[first_rows], n_days),
+        "Item": np.repeat(sales_a["Item"].to_numpy()[first_rows], n_days),
+        "Date": np.tile(all_dates, n_pairs),
+        "Quantity": quantity,
+    }, copy=False)
+
+@instrumented(rows_from=("sales_full", "sales_b"))
+def tag_promotions(sales_full, sales_b, promos, holdout_period="Promo5"):
     print("\n" + "-"*40)
     print("   🚀 Tagging Promotions in Sales Data...   ")
     print("-"*40 + "\n")
-    sales_full["Promotion"] = False
-    for _, row in promos.head(4).iterrows():
-        sales_full.loc[(sales_full["Date"] >= row["StartDate"]) & (sales_full["Date"] <= row["EndDate"]), "Promotion"] = True
+    sales_full = attach_promotions(sales_full, promos)
 
-    promo5 = promos[promos["Period"] == "Promo5"].iloc[0]
-    sales_b["Promotion5"] = (sales_b["Date"] >= promo5["StartDate"]) & (sales_b["Date"] <= promo5["EndDate"])
+    holdout = promos[promos["Period"] == holdout_period]
+    sales_b["Promotion5"] = match_promotions(sales_b, holdout)[0] >= 0
     sales_b_promo5 = sales_b[sales_b["Promotion5"]].copy()
 
-    sales_b["Promotion"] = False
-    for _, row in promos.tail(2).iterrows():
-        sales_b.loc[(sales_b["Date"] >= row["StartDate"]) & (sales_b["Date"] <= row["EndDate"]), "Promotion"] = True
+    sales_b = attach_promotions(sales_b, promos)
 
     return sales_full, sales_b, sales_b_promo5
 
-def cluster_by_avg(df, group_col, label):
+def attach_promotions(df, promos):
+    """Add Promotion, PromoID, PromoPeriod and PromoDay (days since that promo started, -1 outside)."""
+    promo_idx, promo_day = match_promotions(df, promos)
+    df["Promotion"] = promo_idx >= 0
+    df["PromoID"] = promo_idx.astype(np.int32)
+    periods = pd.Categorical(promos["Period"].astype(str).to_numpy())
+    df["PromoPeriod"] = pd.Categorical.from_codes(
+        np.where(promo_idx >= 0, periods.codes[np.maximum(promo_idx, 0)], -1), periods.categories
+    )
+    df["PromoDay"] = promo_day.astype(np.int32)
+    return df
+
+# Scope classes from most to least specific; a row takes the promotion of the most specific class that covers it
+PROMO_SCOPES = [["Store", "Item"], ["Item"], ["Store"], []]
+
+def match_promotions(df, promos):
+    """Positional promo index (-1 if none) and day-within-promo for every row, via sorted interval lookup.
+
+    Promotions may carry optional Store/Item columns (NaN = all). Overlaps within a scope
+    class resolve to the promotion that started most recently.
+    """
+    n = len(df)
+    promo_idx = np.full(n, -1, dtype=np.int64)
+    promo_day = np.full(n, -1, dtype=np.int64)
+    if n == 0 or len(promos) == 0:
+        return promo_idx, promo_day
+
+    row_days = df["Date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    starts = promos["StartDate"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    ends = promos["EndDate"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    scoped = {col: promos[col].notna().to_numpy() if col in promos.columns else np.zeros(len(promos), bool)
+              for col in ["Store", "Item"]}
+
+    # Composite key = scope code * span + day, so intervals of different scopes never overlap
+    offset = min(row_days.min(), starts.min())
+    span = max(row_days.max(), ends.max()) - offset + 2
+
+    for cols in PROMO_SCOPES:
+        in_class = np.ones(len(promos), dtype=bool)
+        for col in ["Store", "Item"]:
+            in_class &= scoped[col] == (col in cols)
+        sel = np.flatnonzero(in_class)
+        if len(sel) == 0:
+            continue
+        if cols:
+            keys = pd.MultiIndex.from_frame(promos.iloc[sel][cols]) if len(cols) > 1 else pd.Index(promos.iloc[sel][cols[0]])
+            uniq = keys.unique()
+            promo_code = uniq.get_indexer(keys)
+            rows = pd.MultiIndex.from_frame(df[cols]) if len(cols) > 1 else pd.Index(df[cols[0]])
+            row_code = uniq.get_indexer(rows)
+        else:
+            promo_code = np.zeros(len(sel), dtype=np.int64)
+            row_code = np.zeros(n, dtype=np.int64)
+
+        lo = promo_code * span + (starts[sel] - offset)
+        hi = promo_code * span + (ends[sel] - offset) + 1  # half-open
+        bounds = np.unique(np.concatenate([lo, hi]))
+
+        # Winner per elementary segment: highest (start, row order) rank among covering promos
+        seg_lo = np.searchsorted(bounds, lo)
+        seg_hi = np.searchsorted(bounds, hi)
+        lengths = seg_hi - seg_lo
+        rank = np.empty(len(sel), dtype=np.int64)
+        rank[np.lexsort((sel, starts[sel]))] = np.arange(len(sel))
+        seg_idx = np.repeat(seg_lo - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        best = np.full(len(bounds), -1, dtype=np.int64)
+        np.maximum.at(best, seg_idx, np.repeat(rank, lengths))
+        winner = np.full(len(bounds) + 1, -1, dtype=np.int64)
+        winner[1:] = np.where(best >= 0, sel[np.argsort(rank)][np.maximum(best, 0)], -1)
+
+        todo = (promo_idx < 0) & (row_code >= 0)
+        composite = row_code[todo] * span + (row_days[todo] - offset)
+        hit = winner[np.searchsorted(bounds, composite, side="right")]
+        rows_todo = np.flatnonzero(todo)
+        promo_idx[rows_todo] = hit
+        found = rows_todo[hit >= 0]
+        promo_day[found] = row_days[found] - starts[promo_idx[found]]
+
+    return promo_idx, promo_day
+
+@instrumented(rows_from=("df",))
+def cluster_by_avg(df, group_col, label, stats=None):
     print("\n" + "*"*50)
     print(f"   📊 Clustering {label.lower()}s by Average Sales Quantity...   ")
     print("*"*50 + "\n")
-    avg = df[df["Promotion"] == False].groupby(group_col)["Quantity"].mean()
+    if stats is not None:
+        avg = stats.means(group_col, promotion=False)
+    else:
+        avg = df[df["Promotion"] == False].groupby(group_col)["Quantity"].mean()
     q33, q66 = avg.quantile([0.33, 0.66])
     cluster = avg.apply(lambda x: "Slow" if x <= q33 else "Medium" if x <= q66 else "Fast")
     print("\n" + "="*50)
@@ -72,4 +241,22 @@ def assign_clusters(sales_full, sales_b, item_clusters, store_clusters):
     sales_full["StoreCluster"] = sales_full["Store"].map(store_clusters)
     sales_b["ItemCluster"] = sales_b["Item"].map(item_clusters)
     sales_b["StoreCluster"] = sales_b["Store"].map(store_clusters)
-    return sales_full, sales_b
\ No newline at end of file
+    return sales_full, sales_b
+
+def save_clusters(item_clusters, store_clusters, models_dir):
+    os.makedirs(models_dir, exist_ok=True)
+    item_clusters.rename("ItemCluster").to_csv(os.path.join(models_dir, "item_clusters.csv"))
+    store_clusters.rename("StoreCluster").to_csv(os.path.join(models_dir, "store_clusters.csv"))
+
+def load_clusters(models_dir):
+    item_clusters = pd.read_csv(os.path.join(models_dir, "item_clusters.csv"), index_col=0)["ItemCluster"]
+    store_clusters = pd.read_csv(os.path.join(models_dir, "store_clusters.csv"), index_col=0)["StoreCluster"]
+    return item_clusters, store_clusters
+
+def map_clusters(df, item_clusters, store_clusters):
+    """Fill ItemCluster/StoreCluster from saved cluster maps when the rows do not carry them."""
+    if "ItemCluster" not in df.columns:
+        df["ItemCluster"] = df["Item"].map(item_clusters)
+    if "StoreCluster" not in df.columns:
+        df["StoreCluster"] = df["Store"].map(store_clusters)
+    return df
@@ -0,0 +1,130 @@
+# src/feature_cache.py
+import os
+import shutil
+import hashlib
+import pandas as pd
+
+FORMATS = {"parquet": "parquet", "feather": "feather"}
+INDEX_COL = "__row__"
+
+def digest(*parts):
+    """SHA-256 over frames (by content), file paths (by bytes) and plain values (by repr)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            frame = part.to_frame() if isinstance(part, pd.Series) else part
+            h.update(repr([(str(c), str(t)) for c, t in frame.dtypes.items()]).encode())
+            h.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+        elif isinstance(part, str) and os.path.isfile(part):
+            with open(part, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+        else:
+            h.update(repr(part).encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+class FeatureCache:
+    """Content-addressed store of engineered frames with LRU eviction by total size."""
+
+    def __init__(self, cache_dir, max_bytes=None, fmt="parquet"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported cache format: {fmt}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self.last_key = None  # entry last read or written, for table_path()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _path(self, key, name):
+        return os.path.join(self._entry_dir(key), f"{name}.{FORMATS[self.fmt]}")
+
+    def get(self, key, names):
+        entry = self._entry_dir(key)
+        paths = [self._path(key, name) for name in names]
+        if not all(os.path.exists(p) for p in paths):
+            self.stats["misses"] += 1
+            return None
+        frames = [self._read(p) for p in paths]
+        os.utime(entry)  # mark as recently used
+        self.stats["hits"] += 1
+        self.last_key = key
+        return frames
+
+    def put(self, key, names, frames):
+        entry = self._entry_dir(key)
+        tmp = f"{entry}.tmp-{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        for name, df in zip(names, frames):
+            self._write(df, os.path.join(tmp, f"{name}.{FORMATS[self.fmt]}"))
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+        self.stats["writes"] += 1
+        self.last_key = key
+        self.evict(keep=key)
+
+    def _write(self, df, path):
+        df = df.reset_index(names=INDEX_COL)
+        if self.fmt == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_feather(path)
+
+    def _read(self, path):
+        if self.fmt == "parquet":
+            df = pd.read_parquet(path)
+        else:
+            # Arrow IPC files are memory-mapped rather than copied into RAM up front
+            from pyarrow import feather
+            df = feather.read_table(path, memory_map=True).to_pandas()
+        df = df.set_index(INDEX_COL)
+        df.index.name = None
+        return df
+
+    def table_path(self, name):
+        """On-disk path of table `name` in the entry last read or written (None if there is none)."""
+        if self.last_key is None:
+            return None
+        path = self._path(self.last_key, name)
+        return path if os.path.exists(path) else None
+
+    def entries(self):
+        """(key, size_bytes, last_used) for every complete entry, least recently used first."""
+        out = []
+        for key in os.listdir(self.cache_dir):
+            entry = self._entry_dir(key)
+            if ".tmp-" in key or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+            out.append((key, size, os.path.getmtime(entry)))
+        return sorted(out, key=lambda e: e[2])
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+            self.stats["evictions"] += 1
+
+    def report(self):
+        print("\n" + "-"*50)
+        print("   🗄️  Feature Cache Stats:")
+        print("-"*50)
+        for name, value in self.stats.items():
+            print(f"   {name:<10} = {value}")
+        print(f"   {'size':<10} = {self.size_bytes() / 1024**2:.1f} MB")
+        print("-"*50 + "\n")
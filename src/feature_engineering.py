@@ -1,10 +1,17 @@
 # src/feature_engineering.py
-import os
-import pandas as pd
+import numpy as np
+from src.feature_cache import digest
+from src.instrument import instrumented
 
-DATA_DIR = "data"
+# Bump whenever feature logic changes so cached feature tables are invalidated
+FEATURE_CODE_VERSION = 3
+CACHE_NAMES = ["sales_full", "sales_b"]
+GROUP_KEYS = ["Store", "Item"]
+SORT_KEYS = ["Store", "Item", "Date"]
 
-def engineer_features(sales_full, sales_b, enable=True):
+@instrumented(rows_from=("sales_full", "sales_b"))
+def engineer_features(sales_full, sales_b, enable=True, engine="vectorized", cache=None, key_parts=(),
+                      tensor=None, shards=None):
     if not enable:
         print("\n" + "~"*50)
         print("   ⚙️  Skipping Feature Engineering as per Settings   ")
@@ -14,53 +21,186 @@ def engineer_features(sales_full, sales_b, enable=True):
     print("\n" + "="*50)
     print("   ⚙️  Performing Feature Engineering...   ")
     print("="*50 + "\n")
-    full_path = os.path.join(DATA_DIR, "sales_full_enhanced.csv")
-    b_path = os.path.join(DATA_DIR, "sales_b_enhanced.csv")
+    if cache is not None:
+        key = digest(sales_full, sales_b, *key_parts, FEATURE_CODE_VERSION)
+        cached = cache.get(key, CACHE_NAMES)
+        if cached is not None:
+            print("\n" + "-"*60)
+            print(f"   📂 Enhanced Sales Data Found in Cache ({key[:12]}). Loading...   ")
+            print("-"*60 + "\n")
+            sales_full, sales_b = cached
+            return sales_full, sales_b
 
-    if os.path.exists(full_path) and os.path.exists(b_path):
-        print("\n" + "-"*60)
-        print("   📂 Enhanced Sales Data Already Exists. Loading from CSV Files...   ")
-        print("-"*60 + "\n")
-        sales_full = pd.read_csv(full_path, parse_dates=["Date"])
-        sales_b = pd.read_csv(b_path, parse_dates=["Date"])
+    for df in [sales_full, sales_b]:
+        if "Promotion" not in df.columns:
+            raise ValueError("Expected 'Promotion' column to be present. Did you forget to call tag_promotions()?")
 
-        # ensure proper sorting even when loading
-        sales_full.sort_values(by=["Store", "Item", "Date"], inplace=True)
-        sales_b.sort_values(by=["Store", "Item", "Date"], inplace=True)
+    if engine not in FEATURE_ENGINES:
+        raise ValueError(f"Unsupported feature engine: {engine}")
+    if shards:
+        from src.sharding import map_shards
+        # Every feature is computed within a (Store, Item) group, so store shards never interact;
+        # with the tensor engine each shard builds its own transient tensor
+        sales_full = map_shards("features", sales_full, {"engine": engine}, **shards)
+        sales_b = map_shards("features", sales_b, {"engine": engine}, **shards)
+    elif engine == "vectorized":
+        sales_full = add_features_vectorized(sales_full)
+        sales_b = add_features_vectorized(sales_b)
+    elif engine == "tensor":
+        # `tensor` holds sales_full already; sales_b gets a transient in-memory one
+        sales_full = add_features_tensor(sales_full, tensor)
+        sales_b = add_features_tensor(sales_b)
+    else:
+        sales_full = add_features_groupby(sales_full)
+        sales_b = add_features_groupby(sales_b)
 
-        return sales_full, sales_b
+    if cache is not None:
+        cache.put(key, CACHE_NAMES, [sales_full, sales_b])
+
+    return sales_full, sales_b
+
+def add_features_groupby(df):
+    """Original per-group lambda implementation, kept as the reference path."""
+    # Sort by Store-Item-Date first: the rolling and shift features below read rows in frame order
+    df = df.sort_values(by=SORT_KEYS, kind="stable")
 
     # Day of week
-    sales_full["DayOfWeek"] = sales_full["Date"].dt.dayofweek
-    sales_b["DayOfWeek"] = sales_b["Date"].dt.dayofweek
+    df["DayOfWeek"] = df["Date"].dt.dayofweek
 
     # Rolling averages
-    sales_full["Last7Avg"] = sales_full.groupby(["Store", "Item"])["Quantity"].transform(lambda x: x.rolling(7, 1).mean())
-    sales_b["Last7Avg"] = sales_b.groupby(["Store", "Item"])["Quantity"].transform(lambda x: x.rolling(7, 1).mean())
-    sales_full["Last30Avg"] = sales_full.groupby(["Store", "Item"])["Quantity"].transform(lambda x: x.rolling(30, 1).mean())
-    sales_b["Last30Avg"] = sales_b.groupby(["Store", "Item"])["Quantity"].transform(lambda x: x.rolling(30, 1).mean())
+    df["Last7Avg"] = df.groupby(GROUP_KEYS)["Quantity"].transform(lambda x: x.rolling(7, 1).mean())
+    df["Last30Avg"] = df.groupby(GROUP_KEYS)["Quantity"].transform(lambda x: x.rolling(30, 1).mean())
 
     # Days since last sale
-    sales_full["LastSaleDayDiff"] = sales_full.groupby(["Store", "Item"])["Date"].transform(lambda x: (x - x.shift()).dt.days.fillna(0))
-    sales_b["LastSaleDayDiff"] = sales_b.groupby(["Store", "Item"])["Date"].transform(lambda x: (x - x.shift()).dt.days.fillna(0))
+    df["LastSaleDayDiff"] = df.groupby(GROUP_KEYS)["Date"].transform(lambda x: (x - x.shift()).dt.days.fillna(0))
+
+    # PromoStart-related features
+    df["PromoStart"] = df.groupby(GROUP_KEYS)["Promotion"].transform(lambda x: (x == 1) & (x.shift().fillna(0) != 1))
+    df["LastPromoStartDate"] = df["Date"].where(df["PromoStart"])
+    df["LastPromoStartDate"] = df.groupby(GROUP_KEYS)["LastPromoStartDate"].ffill()
+    df["PromoStartLag"] = (df["Date"] - df["LastPromoStartDate"]).dt.days.fillna(0)
+    df["isWeekend"] = df["DayOfWeek"].isin([5, 6]).astype(int)
+    return df
+
+def group_starts(df):
+    """Boolean mask marking the first row of every Store-Item run in a sorted frame."""
+    starts = np.zeros(len(df), dtype=bool)
+    if len(df) == 0:
+        return starts
+    starts[0] = True
+    for col in GROUP_KEYS:
+        values = df[col].to_numpy()
+        starts[1:] |= values[1:] != values[:-1]
+    return starts
+
+def segmented_rolling_mean(values, start_pos, window):
+    """Trailing mean over at most `window` rows, never crossing a group start (min_periods=1)."""
+    pos = np.arange(len(values))
+    csum = np.concatenate([[0], np.cumsum(values)])
+    lo = np.maximum(start_pos, pos - window + 1)
+    return (csum[pos + 1] - csum[lo]) / (pos - lo + 1)
+
+def add_features_vectorized(df):
+    """Sort once, then compute every lag/rolling feature with NumPy over group boundaries."""
+    df = df.sort_values(by=SORT_KEYS, kind="stable")
+    n = len(df)
+    pos = np.arange(n)
+    starts = group_starts(df)
+    # Position of each row's group start, propagated forward from the boundary mask
+    start_pos = np.maximum.accumulate(np.where(starts, pos, 0))
+
+    dates = df["Date"].to_numpy()
+    day = np.timedelta64(1, "D")
 
-    # Sort by Store-Item-Date for reliable transformations
-    sales_full.sort_values(by=["Store", "Item", "Date"], inplace=True)
-    sales_b.sort_values(by=["Store", "Item", "Date"], inplace=True)
+    # Day of week
+    df["DayOfWeek"] = df["Date"].dt.dayofweek
+
+    # Rolling averages (integer cumsums are exact, so the window differences are too)
+    qty = df["Quantity"].to_numpy()
+    qty = qty.astype(np.int64) if np.issubdtype(qty.dtype, np.integer) else qty.astype(np.float64)
+    df["Last7Avg"] = segmented_rolling_mean(qty, start_pos, 7)
+    df["Last30Avg"] = segmented_rolling_mean(qty, start_pos, 30)
+
+    # Days since last sale
+    diff = np.zeros(n, dtype=np.float64)
+    if n > 1:
+        diff[1:] = (dates[1:] - dates[:-1]) // day
+    diff[starts] = 0
+    df["LastSaleDayDiff"] = diff
 
     # PromoStart-related features
-    for df in [sales_full, sales_b]:
-        if "Promotion" not in df.columns:
-            raise ValueError("Expected 'Promotion' column to be present. Did you forget to call tag_promotions()?")
+    promo = df["Promotion"].to_numpy() == 1
+    prev_promo = np.zeros(n, dtype=bool)
+    prev_promo[1:] = promo[:-1]
+    prev_promo[starts] = False
+    promo_start = promo & ~prev_promo
+    df["PromoStart"] = promo_start
+
+    # Forward-fill the last promo start within each group by carrying its row position
+    last_start = np.maximum.accumulate(np.where(promo_start, pos, -1))
+    has_start = last_start >= start_pos
+    start_dates = dates[np.maximum(last_start, 0)]
+    df["LastPromoStartDate"] = np.where(has_start, start_dates, np.datetime64("NaT")).astype(dates.dtype)
+    df["PromoStartLag"] = np.where(has_start, (dates - start_dates) // day, 0).astype(np.float64)
+    df["isWeekend"] = df["DayOfWeek"].isin([5, 6]).astype(int)
+    return df
+
+def add_features_tensor(df, tensor=None):
+    """Same features as add_features_vectorized, from day-axis scans of a Store x Item x Day SalesTensor."""
+    from src.sales_tensor import build_sales_tensor
+    df = df.sort_values(by=SORT_KEYS, kind="stable")
+    if tensor is None:
+        tensor = build_sales_tensor(df)
+    cells = tensor.cells(df)
+    if (cells < 0).any():
+        raise ValueError("Rows fall outside the sales tensor; rebuild it from this frame")
+    observed = np.asarray(tensor.observed)
+    n_days = tensor.shape[2]
+    day = np.arange(n_days)
 
-        df["PromoStart"] = df.groupby(["Store", "Item"])["Promotion"].transform(lambda x: (x == 1) & (x.shift().fillna(0) != 1))
-        df["LastPromoStartDate"] = df["Date"].where(df["PromoStart"])
-        df["LastPromoStartDate"] = df.groupby(["Store", "Item"])["LastPromoStartDate"].ffill()
-        df["PromoStartLag"] = (df["Date"] - df["LastPromoStartDate"]).dt.days.fillna(0)
-        df["isWeekend"] = df["DayOfWeek"].isin([5, 6]).astype(int)
+    df["DayOfWeek"] = df["Date"].dt.dayofweek
 
-    # Save enhanced data
-    sales_full.to_csv(full_path, index=False)
-    sales_b.to_csv(b_path, index=False)
+    # Rolling windows count rows, not days: cumulative sums along the day axis when every cell is
+    # observed, otherwise over the observed cells in (store, item, day) order
+    qty = np.asarray(tensor.quantity)
+    qty = qty.astype(np.int64) if np.issubdtype(qty.dtype, np.integer) else qty.astype(np.float64)
+    if observed.all():
+        csum = np.concatenate([np.zeros(qty.shape[:2] + (1,), dtype=qty.dtype), np.cumsum(qty, axis=2)], axis=2)
+    else:
+        flat = np.flatnonzero(observed)
+        pair = flat // n_days
+        starts = np.ones(len(flat), dtype=bool)
+        starts[1:] = pair[1:] != pair[:-1]
+        start_pos = np.maximum.accumulate(np.where(starts, np.arange(len(flat)), 0))
+        # A cell's position among the observed cells is its running count of observed cells
+        rank = np.cumsum(observed.reshape(-1))[cells] - 1
+    for window, col in [(7, "Last7Avg"), (30, "Last30Avg")]:
+        if observed.all():
+            lo = np.maximum(day - window + 1, 0)
+            avg = (csum[:, :, day + 1] - csum[:, :, lo]) / (day - lo + 1)
+            df[col] = avg.reshape(-1)[cells]
+        else:
+            df[col] = segmented_rolling_mean(qty.reshape(-1)[flat], start_pos, window)[rank]
+
+    # Previous observed day of every cell, carried forward along the day axis
+    last_seen = np.maximum.accumulate(np.where(observed, day, -1), axis=2)
+    prev_day = np.concatenate([np.full(last_seen.shape[:2] + (1,), -1), last_seen[:, :, :-1]], axis=2)
+    has_prev = prev_day >= 0
+    df["LastSaleDayDiff"] = np.where(has_prev, day - prev_day, 0).astype(np.float64).reshape(-1)[cells]
+
+    # PromoStart-related features
+    promo = np.asarray(tensor.promotion) & observed
+    prev_promo = np.take_along_axis(promo, np.maximum(prev_day, 0), axis=2) & has_prev
+    promo_start = promo & ~prev_promo
+    df["PromoStart"] = promo_start.reshape(-1)[cells]
+    last_start = np.maximum.accumulate(np.where(promo_start, day, -1), axis=2).reshape(-1)[cells]
+    has_start = last_start >= 0
+    dates = df["Date"].to_numpy()
+    start_dates = tensor.dates.to_numpy().astype(dates.dtype)[np.maximum(last_start, 0)]
+    df["LastPromoStartDate"] = np.where(has_start, start_dates, np.datetime64("NaT")).astype(dates.dtype)
+    df["PromoStartLag"] = np.where(has_start, (dates - start_dates) // np.timedelta64(1, "D"), 0).astype(np.float64)
+    df["isWeekend"] = df["DayOfWeek"].isin([5, 6]).astype(int)
+    return df
 
-    return sales_full, sales_b
\ No newline at end of file
+FEATURE_ENGINES = {"vectorized": add_features_vectorized, "tensor": add_features_tensor,
+                   "groupby": add_features_groupby}
@@ -0,0 +1,234 @@
+# src/feature_store.py
+import os
+import json
+import shutil
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+from src import config
+
+WINDOWS = {"Last7Avg": 7, "Last30Avg": 30}
+RING = max(WINDOWS.values())
+NO_DAY = np.iinfo(np.int64).min  # "never" in the day-number arrays
+STATE_ARRAYS = ["ring", "count", "sums", "last_day", "last_promo", "promo_start_day"]
+EVENT_COLUMNS = ["Store", "Item", "Date", "Quantity", "Promotion"]
+FEATURE_COLUMNS = ["DayOfWeek", "Last7Avg", "Last30Avg", "LastSaleDayDiff", "PromoStart",
+                   "LastPromoStartDate", "PromoStartLag", "isWeekend"]
+
+class FeatureStore:
+    """Per-(Store, Item) state behind the engineer_features lag and rolling features, updated one
+    sale event at a time.
+
+    Each pair owns one row of compact arrays: a ring buffer of its last RING quantities with a
+    running sum per window, its row count, last sale day, previous promotion flag and last promo
+    start day (days since the epoch). An event reads and writes only its own row, so replaying a
+    history produces the same features as add_features_vectorized on the whole frame.
+    """
+
+    def __init__(self, stores=None, items=None, arrays=None):
+        self.keys = pd.MultiIndex.from_arrays([np.asarray([] if stores is None else stores),
+                                               np.asarray([] if items is None else items)],
+                                              names=["Store", "Item"])
+        self.n = len(self.keys)
+        if arrays is None:
+            arrays = self._empty(self.n)
+        for name in STATE_ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @staticmethod
+    def _empty(n):
+        return {"ring": np.zeros((n, RING)), "count": np.zeros(n, dtype=np.int64),
+                "sums": np.zeros((n, len(WINDOWS))), "last_day": np.full(n, NO_DAY),
+                "last_promo": np.zeros(n, dtype=bool), "promo_start_day": np.full(n, NO_DAY)}
+
+    def _grow(self, n):
+        """Make room for `n` pairs, doubling the capacity so growth stays amortized O(1) per pair."""
+        capacity = len(self.count)
+        if n <= capacity:
+            return
+        fresh = self._empty(max(n, 2 * capacity))
+        for name in STATE_ARRAYS:
+            fresh[name][:capacity] = getattr(self, name)
+            setattr(self, name, fresh[name])
+
+    def slots(self, stores, items):
+        """State row of every (store, item), allocating rows for pairs not seen before."""
+        pairs = pd.MultiIndex.from_arrays([stores, items], names=["Store", "Item"])
+        slot = self.keys.get_indexer(pairs) if self.n else np.full(len(pairs), -1)
+        new = slot < 0
+        if new.any():
+            fresh = pairs[new].unique()
+            self._grow(self.n + len(fresh))
+            self.keys = fresh if not self.n else self.keys.append(fresh)
+            self.n = len(self.keys)
+            slot[new] = self.keys.get_indexer(pairs[new])
+        return slot
+
+    def update(self, events):
+        """Apply sale events (EVENT_COLUMNS) and return their feature rows, indexed like `events`.
+
+        Events apply in Date order (input order among equal dates). A batch holding several events
+        of one pair applies them in passes by occurrence, so every pass writes distinct rows with
+        vectorized O(1)-per-event updates.
+        """
+        missing = [col for col in EVENT_COLUMNS if col not in events.columns]
+        if missing:
+            raise ValueError(f"Sale events need columns {missing}")
+        n = len(events)
+        slot = self.slots(events["Store"].to_numpy(), events["Item"].to_numpy())
+        dates = events["Date"].to_numpy()
+        day = dates.astype("datetime64[D]").astype(np.int64)
+        late = (day < self.last_day[slot]).nonzero()[0]
+        if len(late):
+            first = events.iloc[late[0]]
+            raise ValueError(f"Event for Store {first['Store']}, Item {first['Item']} on {first['Date']} is older "
+                             "than the last one applied; the store only moves forward in time")
+        qty = events["Quantity"].to_numpy(dtype=np.float64)
+        promo = events["Promotion"].to_numpy() == 1
+
+        out = {"LastSaleDayDiff": np.zeros(n), "PromoStart": np.zeros(n, dtype=bool),
+               "PromoStartLag": np.zeros(n), "start_day": np.full(n, NO_DAY),
+               **{col: np.zeros(n) for col in WINDOWS}}
+        order = np.argsort(day, kind="stable")
+        rank = pd.Series(slot[order]).groupby(slot[order]).cumcount().to_numpy()
+        by_rank = order[np.argsort(rank, kind="stable")]
+        bounds = np.searchsorted(np.sort(rank), np.arange(rank.max() + 2)) if n else [0]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            idx = by_rank[lo:hi]
+            self._apply(slot[idx], day[idx], qty[idx], promo[idx], idx, out)
+
+        features = pd.DataFrame(index=events.index)
+        features["DayOfWeek"] = events["Date"].dt.dayofweek
+        for col in WINDOWS:
+            features[col] = out[col]
+        features["LastSaleDayDiff"] = out["LastSaleDayDiff"]
+        features["PromoStart"] = out["PromoStart"]
+        has_start = out["start_day"] != NO_DAY
+        start_dates = np.where(has_start, out["start_day"], 0).astype("datetime64[D]").astype(dates.dtype)
+        features["LastPromoStartDate"] = np.where(has_start, start_dates, np.datetime64("NaT")).astype(dates.dtype)
+        features["PromoStartLag"] = out["PromoStartLag"]
+        features["isWeekend"] = features["DayOfWeek"].isin([5, 6]).astype(int)
+        return features
+
+    def _apply(self, s, day, qty, promo, idx, out):
+        """One event per distinct slot in `s`; writes the events' features into `out` at `idx`."""
+        prev_day = self.last_day[s]
+        seen = prev_day != NO_DAY
+        out["LastSaleDayDiff"][idx] = np.where(seen, day - np.where(seen, prev_day, 0), 0)
+
+        # Rolling means over the last `window` rows, this one included
+        count = self.count[s]
+        pos = count % RING
+        for k, (col, window) in enumerate(WINDOWS.items()):
+            leaving = np.where(count >= window, self.ring[s, (pos - window) % RING], 0.0)
+            self.sums[s, k] += qty - leaving
+            out[col][idx] = self.sums[s, k] / np.minimum(count + 1, window)
+        self.ring[s, pos] = qty
+        self.count[s] = count + 1
+
+        start = promo & ~self.last_promo[s]
+        start_day = np.where(start, day, self.promo_start_day[s])
+        self.promo_start_day[s] = start_day
+        self.last_promo[s] = promo
+        self.last_day[s] = day
+        has_start = start_day != NO_DAY
+        out["PromoStart"][idx] = start
+        out["start_day"][idx] = start_day
+        out["PromoStartLag"][idx] = np.where(has_start, day - np.where(has_start, start_day, 0), 0)
+
+    def save(self, path):
+        """Snapshot the state under `path` (.npy per array plus the keys), replacing it atomically."""
+        tmp = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        for name in STATE_ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name)[:self.n])
+        np.save(os.path.join(tmp, "stores.npy"), self.keys.get_level_values("Store").to_numpy())
+        np.save(os.path.join(tmp, "items.npy"), self.keys.get_level_values("Item").to_numpy())
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"pairs": self.n, "windows": WINDOWS}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+        return path
+
+def load_feature_store(path):
+    """FeatureStore from a save() snapshot."""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["windows"] != WINDOWS:
+        raise ValueError(f"Snapshot at {path} was built for windows {meta['windows']}, not {WINDOWS}")
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy")) for name in STATE_ARRAYS}
+    return FeatureStore(np.load(os.path.join(path, "stores.npy"), allow_pickle=True),
+                        np.load(os.path.join(path, "items.npy"), allow_pickle=True), arrays)
+
+def replay(store, sales, batch_days=1):
+    """Feed `sales` through `store` in batches of `batch_days` days; returns the features in row order."""
+    days = sales["Date"].dt.normalize()
+    edges = pd.date_range(days.min(), days.max() + pd.Timedelta(days=batch_days), freq=f"{batch_days}D")
+    batch = np.searchsorted(edges.to_numpy(), days.to_numpy(), side="right")
+    parts = [store.update(sales[batch == b]) for b in np.unique(batch)]
+    return pd.concat(parts).loc[sales.index] if parts else pd.DataFrame(columns=FEATURE_COLUMNS)
+
+def replay_check(sales, batch_days=1, snapshot_dir=None):
+    """Max difference per feature between replaying `sales` through a FeatureStore and
+    add_features_vectorized on the whole frame (all zero when they agree). With `snapshot_dir`
+    the store is saved and reloaded halfway, so snapshots are checked too."""
+    from src.feature_engineering import add_features_vectorized
+    sales = sales.sort_values("Date", kind="stable").reset_index(drop=True)
+    expected = add_features_vectorized(sales.copy()).loc[sales.index]
+
+    store = FeatureStore()
+    if snapshot_dir is None:
+        got = replay(store, sales, batch_days)
+    else:
+        half = sales["Date"] < sales["Date"].min() + (sales["Date"].max() - sales["Date"].min()) / 2
+        first = replay(store, sales[half], batch_days)
+        store = load_feature_store(store.save(snapshot_dir))
+        got = pd.concat([first, replay(store, sales[~half], batch_days)]).loc[sales.index]
+
+    diffs = {}
+    for col in FEATURE_COLUMNS:
+        a, b = expected[col], got[col]
+        if col == "LastPromoStartDate":
+            diffs[col] = float((a.ne(b) & ~(a.isna() & b.isna())).sum())  # mismatched rows
+        else:
+            diffs[col] = float(np.nanmax(np.abs(a.to_numpy(dtype=np.float64) - b.to_numpy(dtype=np.float64)),
+                                         initial=0.0))
+    return pd.Series(diffs, name="max_diff")
+
+def load_history():
+    """Tagged sales history, loaded and expanded with the pipeline's settings."""
+    from src.data_loader import load_data, expand_sales, tag_promotions
+    sales_a, sales_b, promos, _ = load_data(chunksize=config.LOAD_CHUNKSIZE, id_dtype=config.LOAD_ID_DTYPE,
+                                            aggregate=config.LOAD_AGGREGATE_DUPLICATES)
+    sales_full = expand_sales(sales_a, expand=config.EXPAND_SALES, method=config.EXPAND_METHOD)
+    sales_full, sales_b, _ = tag_promotions(sales_full, sales_b, promos, holdout_period=config.HOLDOUT_PERIOD)
+    return sales_full, sales_b
+
+def main():
+    parser = argparse.ArgumentParser(description="Online per-(Store, Item) feature state.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Replay the training history into a snapshot")
+    build.add_argument("--output", default=config.FEATURE_STORE_DIR)
+    check = commands.add_parser("check", help="Compare replayed features with engineer_features")
+    check.add_argument("--batch-days", type=int, default=1)
+    check.add_argument("--snapshot-dir", default=None, help="Also save and reload the store halfway")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    sales_full, sales_b = load_history()
+    if args.command == "build":
+        store = FeatureStore()
+        replay(store, sales_full)
+        print(f"   💾 {store.n:,} (Store, Item) states saved to {store.save(args.output)}")
+    else:
+        for name, sales in (("train", sales_full), ("test", sales_b)):
+            diffs = replay_check(sales, args.batch_days, args.snapshot_dir)
+            print(f"\n   {name}: {len(sales):,} events, max difference per feature")
+            print(diffs.to_string())
+            if (diffs > 1e-9).any():
+                raise SystemExit(f"Replayed {name} features differ from engineer_features")
+        print("\n   ✅ Replayed features match engineer_features")
+
+if __name__ == "__main__":
+    main()
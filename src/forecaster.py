@@ -1,10 +1,14 @@
 # src/forecaster.py
-import os
-import numpy as np
+import sys
 import pandas as pd
-from sklearn.metrics import mean_absolute_error, root_mean_squared_error
+from src.instrument import instrumented
 
-def forecast_promotion5(sales_full, sales_b, promos, item_cluster_lift, item_clusters, store_clusters):
+@instrumented(rows_from=("sales_full", "sales_b"))
+def forecast_promotion5(sales_full, sales_b, promos, item_cluster_lift, item_clusters, store_clusters,
+                        holdout_period="Promo5", lift_cube=None, lift_levels=None, min_count=1, shards=None):
+    """Naive forecast: baseline + lift. With a `lift_cube`, both come from the finest of `lift_levels`
+    with at least `min_count` rows (see LiftCube.lookup), over store shards of sales_b when
+    `shards` (map_shards options) is given; otherwise from `item_cluster_lift`."""
     print("\n" + "="*40)
     print("   📈 Forecasting Promotion 5...   ")
     print("="*40 + "\n")
@@ -14,9 +18,22 @@ def forecast_promotion5(sales_full, sales_b, promos, item_cluster_lift, item_clu
     sales_b["StoreCluster"] = sales_b["Store"].map(store_clusters)
 
     # Identify Promotion 5 period
-    promo5 = promos[promos["Period"] == "Promo5"].iloc[0]
+    promo5 = promos[promos["Period"] == holdout_period].iloc[0]
     sales_b["Promotion5"] = (sales_b["Date"] >= promo5["StartDate"]) & (sales_b["Date"] <= promo5["EndDate"])
 
+    if lift_cube is not None:
+        if shards:
+            from src.sharding import map_shards
+            forecast = map_shards("lift_forecast", sales_b, {"lift_cube": lift_cube, "levels": lift_levels,
+                                                             "min_count": min_count}, **shards)
+        else:
+            forecast = lift_forecast(sales_b, lift_cube, lift_levels, min_count)
+        for col in forecast.columns:
+            sales_b[col] = forecast[col].array
+        print("   Rows per lift level:")
+        print(pd.Series(forecast["LiftLevel"].array).value_counts(sort=False).to_string())
+        return sales_b, sales_b[sales_b["Promotion5"]].copy()
+
     # Compute baseline and lift
     baseline_by_item_cluster = sales_full[sales_full["Promotion"] == False].groupby("ItemCluster")["Quantity"].mean()
     if "ItemCluster" not in item_cluster_lift.columns:
@@ -26,7 +43,8 @@ def forecast_promotion5(sales_full, sales_b, promos, item_cluster_lift, item_clu
     # Warn if any cluster is missing
     missing_clusters = set(sales_b["ItemCluster"].unique()) - set(lift_by_item_cluster.index)
     if missing_clusters:
-        print(f"⚠️ Warning: Missing lift values for clusters: {missing_clusters}. Defaulting lift to 0.")
+        print(f"⚠️ Warning: Missing lift values for clusters: {missing_clusters}. Defaulting lift to 0.",
+              file=sys.stderr)
 
     # Forecast
     sales_b["ExpectedQuantity"] = (
@@ -37,21 +55,26 @@ def forecast_promotion5(sales_full, sales_b, promos, item_cluster_lift, item_clu
 
     return sales_b, sales_b_promo5
 
-def evaluate_forecast(sales_b, sales_b_promo5):
+def lift_forecast(df, lift_cube, levels=None, min_count=1):
+    """ExpectedQuantity (baseline + lift) and the levels that served it, for every row of `df`."""
+    baseline, lift, baseline_level, lift_level = lift_cube.lookup(df, levels, min_count)
+    return pd.DataFrame({"ExpectedQuantity": baseline + lift, "BaselineLevel": baseline_level,
+                         "LiftLevel": lift_level}, index=df.index)
+
+def evaluate_forecast(sales_b, sales_b_promo5, product_groups=None, segment_levels=None):
+    """Naive-forecast error on the test rows and Promo5 rows, and the per-segment breakdown
+    (written to naive_segment_metrics.csv by the caller)."""
+    from src.metrics import SEGMENT_LEVELS, segment_metrics
     print("\n" + "="*50)
     print("   📊 Evaluating Forecast for Promotion 5...   ")
     print("="*50 + "\n")
     y_true = sales_b_promo5["Quantity"]
-    y_pred = sales_b_promo5["ExpectedQuantity"]
-    y_true_all = sales_b["Quantity"]
-    y_pred_all = sales_b["ExpectedQuantity"]
-
-    mae = mean_absolute_error(y_true, y_pred)
-    rmse = root_mean_squared_error(y_true, y_pred)
-    mae_all = mean_absolute_error(y_true_all, y_pred_all)
-    rmse_all = root_mean_squared_error(y_true_all, y_pred_all)
-    mape = np.mean(np.abs((y_true - y_pred) / (y_true + 1e-9))) * 100
-    nrmse = rmse / (y_true.max() - y_true.min())
+    segments = segment_metrics({"test": sales_b, "promo5": sales_b_promo5}, y_pred="ExpectedQuantity",
+                               levels=SEGMENT_LEVELS if segment_levels is None else segment_levels,
+                               product_groups=product_groups)
+    promo5, test = segments["promo5"].overall(), segments["test"].overall()
+    mae, rmse, mape, nrmse = promo5["mae"], promo5["rmse"], promo5["mape"], promo5["nrmse"]
+    mae_all, rmse_all = test["mae"], test["rmse"]
 
     print("\n" + "="*50)
     print("   📊 Forecast Evaluation on Promotion 5:")
@@ -75,19 +98,19 @@ def evaluate_forecast(sales_b, sales_b_promo5):
 
     return {
         "mae": mae, "rmse": rmse, "mae_all": mae_all, "rmse_all": rmse_all, "mape": mape, "nrmse": nrmse
-    }
-
-def summarize_clusters(df, dataset_name="Train"):
-    print("\n" + "="*50)
-    print(f"   📊 {dataset_name} Item Cluster Summary:")
-    print("="*50)
-    print(df.groupby("ItemCluster")["Quantity"].agg(["count", "mean", "std"]))
+    }, segments
 
-    print("\n" + "="*50)
-    print(f"   📊 {dataset_name} Store Cluster Summary:")
-    print("="*50)
-    print(df.groupby("StoreCluster")["Quantity"].agg(["count", "mean", "std"]))
+def summarize_clusters(df, dataset_name="Train", stats=None, item_clusters=None, store_clusters=None):
+    """Quantity count/mean/std per Item and Store cluster, from `stats` (a SalesStats of `df`) when given."""
+    for label, col, clusters in [("Item", "ItemCluster", item_clusters), ("Store", "StoreCluster", store_clusters)]:
+        print("\n" + "="*50)
+        print(f"   📊 {dataset_name} {label} Cluster Summary:")
+        print("="*50)
+        if stats is not None:
+            print(stats.summary(**{label.lower(): clusters.rename(col)}))
+        else:
+            print(df.groupby(col)["Quantity"].agg(["count", "mean", "std"]))
 
-def export_forecast(sales_b_promo5, results_dir="results"):
-    os.makedirs(results_dir, exist_ok=True)
-    sales_b_promo5.to_csv(os.path.join(results_dir, "promotion5_forecast_naive.csv"), index=False)
\ No newline at end of file
+def export_forecast(sales_b_promo5, results_dir="results", export=None):
+    from src.prediction_store import export_predictions
+    export_predictions(sales_b_promo5, results_dir, "promotion5_forecast_naive", **(export or {}))
\ No newline at end of file
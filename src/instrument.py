@@ -0,0 +1,133 @@
+# src/instrument.py
+import os
+import sys
+import csv
+import json
+import time
+import pstats
+import inspect
+import cProfile
+import functools
+import contextlib
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Process-wide switches, set once by the entry point through configure()
+SETTINGS = {"quiet": False, "profile": None, "profile_dir": "results", "stream": None}
+TRACE = []
+TRACE_FIELDS = ["stage", "pid", "started", "ended", "wall_s", "cpu_s", "rows_in", "rows_out",
+                "rows_per_s", "peak_rss_mb", "peak_rss_delta_mb"]
+
+def configure(quiet=None, profile=None, profile_dir=None):
+    """quiet: hide the stages' own prints; profile: stage name to run under cProfile."""
+    for key, value in (("quiet", quiet), ("profile", profile), ("profile_dir", profile_dir)):
+        if value is not None:
+            SETTINGS[key] = value
+    # Stage lines still reach the real stdout while quieted() has redirected it
+    SETTINGS["stream"] = sys.stdout
+
+def quieted():
+    """Context that swallows stdout in quiet mode (a no-op otherwise). stderr, where warnings and
+    errors go, is left alone."""
+    if not SETTINGS["quiet"]:
+        return contextlib.nullcontext()
+    stack = contextlib.ExitStack()
+    stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+    return stack
+
+def peak_rss_mb():
+    if resource is None:
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+def count_rows(obj):
+    """Rows across DataFrames/Series/arrays, including inside tuples, lists and dicts."""
+    if hasattr(obj, "shape") and getattr(obj, "ndim", 0) >= 1:
+        return int(obj.shape[0])
+    if isinstance(obj, (tuple, list)):
+        return sum(count_rows(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(count_rows(item) for item in obj.values())
+    return 0
+
+@contextlib.contextmanager
+def stage(name, rows_in=0):
+    """Time a block and append a record to TRACE; set record["rows_out"] inside the block.
+
+    CPU time covers every thread of the process, so cpu_s / wall_s shows how parallel a stage
+    ran. peak_rss_delta_mb is how far the stage raised the process's peak RSS. The record's
+    pid and unix start/end times line it up with an external `py-spy record --pid` capture.
+    """
+    record = {"stage": name, "pid": os.getpid(), "rows_in": rows_in, "rows_out": 0}
+    profiler = cProfile.Profile() if SETTINGS["profile"] == name else None
+    rss_before = peak_rss_mb()
+    record["started"] = time.time()
+    wall, cpu = time.perf_counter(), time.process_time()
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(quieted())
+        if profiler is not None:
+            profiler.enable()
+            stack.callback(profiler.disable)
+        yield record
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    record["ended"] = time.time()
+    rows = record["rows_in"] or record["rows_out"]
+    rss_after = peak_rss_mb()
+    record.update(wall_s=round(wall, 4), cpu_s=round(cpu, 4), rows_per_s=round(rows / wall) if wall else 0,
+                  peak_rss_mb=round(rss_after, 1), peak_rss_delta_mb=round(rss_after - rss_before, 1))
+    TRACE.append(record)
+
+    stream = SETTINGS["stream"] or sys.stdout
+    if SETTINGS["quiet"]:
+        print(f"   {name:<20} {wall:8.2f}s wall {cpu:8.2f}s cpu  {record['rows_in']:>11,} -> "
+              f"{record['rows_out']:<11,} {record['rows_per_s']:>11,} rows/s  "
+              f"+{record['peak_rss_delta_mb']} MB", file=stream)
+    if profiler is not None:
+        os.makedirs(SETTINGS["profile_dir"], exist_ok=True)
+        path = os.path.join(SETTINGS["profile_dir"], f"profile_{name}.prof")
+        profiler.dump_stats(path)
+        print(f"   🔬 cProfile of {name} saved to {path} (open with snakeviz or pstats)", file=stream)
+        if not SETTINGS["quiet"]:
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(15)
+
+def instrumented(name=None, rows_from=None):
+    """Decorator form of stage(). Rows in are counted from the arguments named in `rows_from`
+    (the primary frames; every argument when None) and rows out from the return value."""
+    def decorate(func):
+        label = name or func.__name__
+        signature = inspect.signature(func)
+        unknown = [arg for arg in rows_from or () if arg not in signature.parameters]
+        if unknown:
+            raise ValueError(f"{label} has no arguments {unknown} to count rows from")
+
+        def rows_in(args, kwargs):
+            if rows_from is None:
+                return count_rows(args) + count_rows(kwargs)
+            bound = signature.bind_partial(*args, **kwargs).arguments
+            return sum(count_rows(bound[arg]) for arg in rows_from if arg in bound)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(label, rows_in=rows_in(args, kwargs)) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = count_rows(result)
+            return result
+        return wrapper
+    return decorate
+
+def write_trace(path, records=None):
+    """Write the trace as JSON or CSV, chosen by the file extension."""
+    records = TRACE if records is None else records
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=TRACE_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(path, "w") as f:
+            json.dump([{field: record.get(field) for field in TRACE_FIELDS} for record in records], f, indent=2)
+    return path
@@ -0,0 +1,103 @@
+# src/leaderboard.py
+import os
+import time
+import tempfile
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+from src.model import prepare_splits, build_model, compute_metrics, save_model, CAT_FEATURES
+from src.instrument import peak_rss_mb
+
+SPLITS = ["train", "val", "test", "promo5"]
+
+def parse_specs(specs):
+    """Normalize 'LGBM' or {'name', 'model', 'params'} entries into dicts."""
+    parsed = []
+    for spec in specs:
+        if isinstance(spec, str):
+            spec = {"model": spec}
+        spec = {"name": spec.get("name", spec["model"]), "model": spec["model"], "params": spec.get("params", {})}
+        parsed.append(spec)
+    names = [spec["name"] for spec in parsed]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Leaderboard entry names must be unique: {names}")
+    return parsed
+
+def share_splits(splits, data_dir):
+    """Write every split once as a float64 .npy that workers memory-map read-only."""
+    categories = {}
+    for col in CAT_FEATURES:
+        values = pd.concat([splits[name][0][col].astype(object) for name in SPLITS])
+        categories[col] = sorted(values.dropna().unique().tolist())
+
+    columns = list(splits["train"][0].columns)
+    for name in SPLITS:
+        X, y = splits[name]
+        values = np.empty((len(X), len(columns)), dtype=np.float64)
+        for i, col in enumerate(columns):
+            if col in categories:
+                codes = pd.Categorical(X[col].astype(object), categories=categories[col]).codes
+                values[:, i] = np.where(codes >= 0, codes, np.nan)
+            else:
+                values[:, i] = X[col].to_numpy(dtype=np.float64)
+        np.save(os.path.join(data_dir, f"X_{name}.npy"), values)
+        np.save(os.path.join(data_dir, f"y_{name}.npy"), y.to_numpy(dtype=np.float64))
+    return {"data_dir": data_dir, "columns": columns, "categories": categories}
+
+def load_split(meta, name):
+    values = np.load(os.path.join(meta["data_dir"], f"X_{name}.npy"), mmap_mode="r")
+    y = pd.Series(np.load(os.path.join(meta["data_dir"], f"y_{name}.npy"), mmap_mode="r"))
+    X = pd.DataFrame(values, columns=meta["columns"], copy=False)
+    for col, cats in meta["categories"].items():
+        codes = np.nan_to_num(X[col].to_numpy(), nan=-1).astype(np.int64)
+        X[col] = pd.Categorical.from_codes(codes, categories=cats)
+    return X, y
+
+def train_entry(task):
+    spec, meta, n_jobs, models_dir = task
+    start = time.perf_counter()
+    (X_train, y_train), (X_val, y_val) = load_split(meta, "train"), load_split(meta, "val")
+    (X_test, y_test), (X_promo5, y_promo5) = load_split(meta, "test"), load_split(meta, "promo5")
+
+    model = build_model(spec["model"], n_jobs=n_jobs, **spec["params"])
+    model.fit(X_train, y_train, eval_set=[(X_val, y_val)])
+    metrics = compute_metrics(
+        y_val, model.predict(X_val), y_test, model.predict(X_test), y_promo5, model.predict(X_promo5)
+    )
+    save_model(model, spec["model"], models_dir, tag=spec["name"])
+    return {
+        "name": spec["name"], "model": spec["model"], "n_jobs": n_jobs, **metrics,
+        "wall_time_s": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb(),
+    }
+
+def train_leaderboard(sales_full, sales_b, sales_b_promo5, FEATURES, results_dir, models_dir,
+                      specs, n_workers=None):
+    print("\n" + "="*50)
+    print("   🏁 Training Model Leaderboard...   ")
+    print("="*50 + "\n")
+    specs = parse_specs(specs)
+    n_cpus = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers or n_cpus, len(specs)))
+    n_jobs = max(1, n_cpus // n_workers)
+
+    splits = prepare_splits(sales_full, sales_b, sales_b_promo5, FEATURES)
+    with tempfile.TemporaryDirectory(prefix="leaderboard_") as data_dir:
+        meta = share_splits(splits, data_dir)
+        del splits
+        # A subdirectory, so entries named after a backend never replace the pipeline's models/{MODEL_NAME} file
+        tasks = [(spec, meta, n_jobs, os.path.join(models_dir, "leaderboard")) for spec in specs]
+        # Fresh process per entry so each peak RSS belongs to exactly one model
+        with mp.get_context("spawn").Pool(n_workers, maxtasksperchild=1) as pool:
+            rows = list(pool.imap_unordered(train_entry, tasks))
+
+    board = pd.DataFrame(rows).sort_values("promo5_rmse").reset_index(drop=True)
+    os.makedirs(results_dir, exist_ok=True)
+    board.to_csv(os.path.join(results_dir, "leaderboard.csv"), index=False)
+
+    print("\n" + "="*50)
+    print(f"   🏆 Leaderboard ({n_workers} workers x {n_jobs} threads):")
+    print("="*50)
+    print(board[["name", "val_rmse", "test_rmse", "promo5_mae", "promo5_rmse", "wall_time_s", "peak_rss_mb"]]
+          .to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    print("="*50 + "\n")
+    return board
@@ -0,0 +1,153 @@
+# src/lift_cube.py
+import numpy as np
+import pandas as pd
+from src.instrument import instrumented
+
+# Item-side dimensions are functions of Item and store-side ones of Store, so every level is a
+# roll-up of the Item x Store x Promotion cell sums
+ITEM_DIMS = ["Item", "ProductGroup1", "ProductGroup2", "ItemCluster"]
+STORE_DIMS = ["Store", "StoreCluster"]
+LIFT_LEVELS = {
+    "ItemStore": ("Item", "Store"),
+    "Item": ("Item",),
+    "Store": ("Store",),
+    "ProductGroup2": ("ProductGroup2",),
+    "ProductGroup1": ("ProductGroup1",),
+    "ClusterPair": ("ItemCluster", "StoreCluster"),
+    "ItemCluster": ("ItemCluster",),
+    "StoreCluster": ("StoreCluster",),
+}
+# Default lookup order, finest first; rows no level can serve fall back to the global means
+FALLBACK_LEVELS = ["ItemStore", "Item", "ProductGroup2", "ProductGroup1", "ClusterPair", "ItemCluster"]
+
+class LiftCube:
+    """Non-promotion (baseline) and promotion Quantity sums and counts for every LIFT_LEVELS level.
+
+    Each level is a dense (n_cells, 2) sum/count array over the product of its dimensions'
+    categories; column 0 is non-promotion rows, column 1 promotion rows.
+    """
+
+    def __init__(self, categories, item_groups, sums, counts, total_sum, total_count):
+        self.categories = categories
+        self.item_groups = item_groups
+        self.sums = sums
+        self.counts = counts
+        self.total_sum = total_sum
+        self.total_count = total_count
+
+    def codes(self, df, dim):
+        """Per-row category codes of `dim` (-1 when unknown or missing)."""
+        if dim in df.columns:
+            values = df[dim]
+        elif dim in self.item_groups.columns:
+            values = df["Item"].map(self.item_groups[dim])
+        else:
+            raise ValueError(f"Rows need a '{dim}' column for this lift level")
+        return self.categories[dim].get_indexer(values)
+
+    def cells(self, df, level):
+        """Per-row flat cell index into `level` (-1 when any of its dimensions is unknown)."""
+        dims = LIFT_LEVELS[level]
+        codes = [self.codes(df, dim) for dim in dims]
+        known = np.logical_and.reduce([c >= 0 for c in codes])
+        cell = np.full(len(df), -1, dtype=np.int64)
+        shape = tuple(len(self.categories[dim]) for dim in dims)
+        cell[known] = np.ravel_multi_index(tuple(c[known] for c in codes), shape)
+        return cell
+
+    def stats(self, level):
+        """Baseline/promo means, lift and counts per cell of `level`, indexed by its dimensions."""
+        dims = LIFT_LEVELS[level]
+        index = pd.MultiIndex.from_product([self.categories[dim] for dim in dims], names=list(dims))
+        if len(dims) == 1:
+            index = index.get_level_values(0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = self.sums[level] / self.counts[level]
+        return pd.DataFrame({"BaselineMean": means[:, 0], "PromoMean": means[:, 1],
+                             "Lift": means[:, 1] - means[:, 0], "BaselineCount": self.counts[level][:, 0],
+                             "PromoCount": self.counts[level][:, 1]}, index=index)
+
+    def means(self, level):
+        """Mean Quantity per cell with columns False (non-promotion) and True (promotion)."""
+        stats = self.stats(level)
+        return pd.DataFrame({False: stats["BaselineMean"], True: stats["PromoMean"]})
+
+    def lookup(self, df, levels=None, min_count=1):
+        """Vectorized (baseline, lift, baseline level, lift level) for every row of `df`.
+
+        A row takes its baseline from the first level whose cell has at least `min_count`
+        non-promotion rows, and its lift from the first level with at least `min_count` rows
+        on both sides; anything left falls back to the global means.
+        """
+        levels = FALLBACK_LEVELS if levels is None else list(levels)
+        unknown = sorted(set(levels) - set(LIFT_LEVELS))
+        if unknown:
+            raise ValueError(f"Unknown lift levels {unknown}. Options: {', '.join(LIFT_LEVELS)}")
+        n = len(df)
+        baseline, lift = np.full(n, np.nan), np.full(n, np.nan)
+        base_level, lift_level = np.full(n, len(levels), dtype=np.int8), np.full(n, len(levels), dtype=np.int8)
+        for k, level in enumerate(levels):
+            cell = self.cells(df, level)
+            known = cell >= 0
+            sums, counts = np.zeros((n, 2)), np.zeros((n, 2), dtype=np.int64)
+            sums[known], counts[known] = self.sums[level][cell[known]], self.counts[level][cell[known]]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = sums / counts
+            take = np.isnan(baseline) & (counts[:, 0] >= min_count) & (counts[:, 0] > 0)
+            baseline[take], base_level[take] = means[take, 0], k
+            take = np.isnan(lift) & (counts.min(axis=1) >= min_count) & (counts.min(axis=1) > 0)
+            lift[take], lift_level[take] = means[take, 1] - means[take, 0], k
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            global_means = self.total_sum / self.total_count
+        baseline[np.isnan(baseline)] = global_means[0]
+        global_lift = global_means[1] - global_means[0]
+        lift[np.isnan(lift)] = global_lift if np.isfinite(global_lift) else 0.0
+        names = levels + ["Global"]
+        return (baseline, lift, pd.Categorical.from_codes(base_level, names),
+                pd.Categorical.from_codes(lift_level, names))
+
+@instrumented(rows_from=())
+def build_lift_cube(stats, product_groups, item_clusters, store_clusters):
+    """Roll the Item x Store x Promotion cells of a SalesStats up to every lift level."""
+    print("\n" + "="*50)
+    print("   🧊 Building Lift Cube...   ")
+    print("="*50 + "\n")
+    item_groups = product_groups.set_index("ProductCode")[["ProductGroup1", "ProductGroup2"]]
+    items, stores = stats.items, stats.stores
+    clusters = pd.Index(sorted(set(item_clusters.dropna()) | set(store_clusters.dropna())))
+    categories = {
+        "Item": items, "Store": stores,
+        "ProductGroup1": pd.Index(np.sort(item_groups["ProductGroup1"].unique())),
+        "ProductGroup2": pd.Index(np.sort(item_groups["ProductGroup2"].unique())),
+        "ItemCluster": clusters, "StoreCluster": clusters,
+    }
+    fine_counts = stats.cells[..., 0].reshape(-1, 2)
+    fine_sums = stats.cells[..., 1].reshape(-1, 2)
+
+    # Every coarser level is a roll-up of the fine cells through per-item/per-store attribute codes
+    item_attr = {"Item": np.arange(len(items)), "ItemCluster": clusters.get_indexer(item_clusters.reindex(items))}
+    for dim in ["ProductGroup1", "ProductGroup2"]:
+        item_attr[dim] = categories[dim].get_indexer(item_groups[dim].reindex(items))
+    store_attr = {"Store": np.arange(len(stores)), "StoreCluster": clusters.get_indexer(store_clusters.reindex(stores))}
+    item_of_cell = np.repeat(np.arange(len(items)), len(stores))
+    store_of_cell = np.tile(np.arange(len(stores)), len(items))
+
+    sums, counts = {}, {}
+    for level, dims in LIFT_LEVELS.items():
+        codes = [item_attr[dim][item_of_cell] if dim in ITEM_DIMS else store_attr[dim][store_of_cell]
+                 for dim in dims]
+        shape = tuple(len(categories[dim]) for dim in dims)
+        known = np.logical_and.reduce([c >= 0 for c in codes])
+        target = np.ravel_multi_index(tuple(c[known] for c in codes), shape)
+        size = int(np.prod(shape))
+        sums[level] = np.stack([np.bincount(target, weights=fine_sums[known, p], minlength=size)
+                                for p in (0, 1)], axis=1)
+        counts[level] = np.stack([np.bincount(target, weights=fine_counts[known, p], minlength=size)
+                                  for p in (0, 1)], axis=1).astype(np.int32)
+
+    cube = LiftCube(categories, item_groups, sums, counts, fine_sums.sum(axis=0), fine_counts.sum(axis=0))
+    for level in LIFT_LEVELS:
+        filled = (cube.counts[level].min(axis=1) > 0).sum()
+        print(f"   {level:<14} {len(cube.counts[level]):>8,} cells, {filled:>8,} with baseline and promo rows")
+    return cube
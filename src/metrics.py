@@ -0,0 +1,145 @@
+# src/metrics.py
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Per-segment accumulator columns and how two partial accumulators combine
+STAT_AGGS = {"count": "sum", "sum_abs": "sum", "sum_sq": "sum", "sum_ape": "sum",
+             "y_min": "min", "y_max": "max", "err_min": "min", "err_max": "max"}
+SEGMENT_LEVELS = ["ItemCluster", "StoreCluster", "Store", "ProductGroup1", "ProductGroup2", "PromoDay"]
+TABLE_COLUMNS = ["level", "segment", "n", "mae", "rmse", "mape", "nrmse", "err_min", "err_max"]
+
+def merge_stats(a, b):
+    """Combine two accumulator frames indexed by segment."""
+    return pd.concat([a, b]).groupby(level=0, dropna=False, sort=True).agg(STAT_AGGS)
+
+class SegmentMetrics:
+    """Mergeable error accumulators (count, sums of absolute/squared/percentage errors, min/max)
+    overall and per segment of each of `levels`.
+
+    update() computes the per-row errors once and reduces them with one groupby per level, so
+    predictions can be fed whole or chunk by chunk; merge() combines accumulators built apart
+    (chunks, shards, workers). Errors are actual minus predicted. Rows without a finite actual and
+    prediction are left out of every metric and counted in `dropped`.
+    """
+
+    def __init__(self, levels=SEGMENT_LEVELS, product_groups=None):
+        self.levels = list(levels)
+        self.item_groups = None
+        if product_groups is not None:
+            self.item_groups = product_groups.set_index("ProductCode")[["ProductGroup1", "ProductGroup2"]]
+        self.stats = {}  # "All" and every level -> accumulator frame indexed by segment
+        self.dropped = 0
+
+    def keys(self, df, level):
+        """Segment of every row for `level`; product groups are looked up from Item when absent."""
+        if level in df.columns:
+            keys = df[level]
+        elif self.item_groups is not None and level in self.item_groups.columns:
+            keys = df["Item"].map(self.item_groups[level])
+        else:
+            raise ValueError(f"Rows need a '{level}' column for this segment level")
+        if pd.api.types.is_float_dtype(keys) and (keys.dropna() % 1 == 0).all():
+            keys = keys.astype("Int64")  # e.g. PromoDay, float only because of its missing values
+        return keys.to_numpy()
+
+    def update(self, df, y_true="Quantity", y_pred="PredictedQuantity"):
+        """Add the rows of `df` to the accumulators."""
+        y = df[y_true].to_numpy(dtype=np.float64)
+        pred = df[y_pred].to_numpy(dtype=np.float64)
+        # pandas sums skip NaN while the row count would not, which understates the errors
+        finite = np.isfinite(y) & np.isfinite(pred)
+        if not finite.all():
+            self.dropped += int((~finite).sum())
+            df, y, pred = df[finite], y[finite], pred[finite]
+        err = y - pred
+        abs_err = np.abs(err)
+        rows = pd.DataFrame({
+            "count": np.ones(len(y), dtype=np.int64), "sum_abs": abs_err, "sum_sq": err ** 2,
+            "sum_ape": np.abs(err / (y + 1e-9)), "y_min": y, "y_max": y, "err_min": err, "err_max": err,
+        })
+        parts = {"All": rows.groupby(np.full(len(rows), "All")).agg(STAT_AGGS)}
+        for level in self.levels:
+            parts[level] = rows.groupby(self.keys(df, level), dropna=False, sort=True).agg(STAT_AGGS)
+        for level, part in parts.items():
+            self.stats[level] = part if level not in self.stats else merge_stats(self.stats[level], part)
+        return self
+
+    def merge(self, other):
+        """Fold another accumulator over the same levels into this one."""
+        self.dropped += other.dropped
+        for level, part in other.stats.items():
+            self.stats[level] = part if level not in self.stats else merge_stats(self.stats[level], part)
+        return self
+
+    def table(self):
+        """Tidy level/segment/n/mae/rmse/mape/nrmse/err_min/err_max table; missing segments are 'Unknown'."""
+        frames = []
+        for level in ["All"] + self.levels:
+            stats = self.stats.get(level)
+            if stats is None or stats.empty:
+                continue
+            count = stats["count"].to_numpy(dtype=np.float64)
+            rmse = np.sqrt(stats["sum_sq"].to_numpy() / count)
+            spread = (stats["y_max"] - stats["y_min"]).to_numpy(dtype=np.float64)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                nrmse = np.where(spread > 0, rmse / spread, np.nan)
+            segment = pd.Series(stats.index.to_numpy(dtype=object)).fillna("Unknown")
+            frames.append(pd.DataFrame({
+                "level": level, "segment": segment.to_numpy(), "n": stats["count"].to_numpy(),
+                "mae": stats["sum_abs"].to_numpy() / count, "rmse": rmse,
+                "mape": stats["sum_ape"].to_numpy() / count * 100, "nrmse": nrmse,
+                "err_min": stats["err_min"].to_numpy(), "err_max": stats["err_max"].to_numpy(),
+            }))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=TABLE_COLUMNS)
+
+    def overall(self):
+        """The 'All' row of table() as a dict (NaN metrics when no rows were added)."""
+        table = self.table()
+        rows = table[table["level"] == "All"]
+        if rows.empty:
+            return {"level": "All", "segment": "All", "n": 0, **{c: np.nan for c in TABLE_COLUMNS[3:]}}
+        return rows.iloc[0].to_dict()
+
+def report_dropped(metrics, label):
+    if metrics.dropped:
+        print(f"   ⚠️  {label}: {metrics.dropped:,} rows without a finite actual or prediction left out of the metrics",
+              file=sys.stderr)
+
+def error_metrics(y_true, y_pred):
+    """Overall mae/rmse/mape/nrmse of two aligned arrays, over the rows where both are finite."""
+    frame = pd.DataFrame({"Quantity": np.asarray(y_true), "PredictedQuantity": np.asarray(y_pred)})
+    metrics = SegmentMetrics(levels=[]).update(frame)
+    report_dropped(metrics, "Error metrics")
+    return metrics.overall()
+
+def metrics_table(segments):
+    """One tidy table from {split: SegmentMetrics}, with the split as its first column."""
+    tables = [m.table().assign(split=split) for split, m in segments.items()]
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=TABLE_COLUMNS + ["split"])
+    return table[["split"] + TABLE_COLUMNS]
+
+def segment_metrics(splits, y_pred="PredictedQuantity", levels=SEGMENT_LEVELS, product_groups=None):
+    """{split: SegmentMetrics} of {split: frame}, one update per frame."""
+    return {split: SegmentMetrics(levels, product_groups).update(df, y_pred=y_pred) for split, df in splits.items()}
+
+def write_segment_metrics(segments, path):
+    """metrics_table(segments) written as one CSV at `path`; returns the table."""
+    for split, metrics in segments.items():
+        report_dropped(metrics, f"Segment metrics ({split})")
+    table = metrics_table(segments)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table.to_csv(path, index=False)
+    print(f"   📐 Segment metrics ({len(table):,} rows) saved to {path}")
+    return table
+
+def dataset_segment_metrics(path, y_pred="PredictedQuantity", levels=SEGMENT_LEVELS, product_groups=None,
+                            batch_rows=1_000_000):
+    """SegmentMetrics of an exported prediction dataset, accumulated one batch at a time."""
+    from src.prediction_store import iter_predictions
+    metrics = SegmentMetrics(levels, product_groups)
+    columns = ["Item", "Quantity", y_pred] + list(levels)
+    for batch in iter_predictions(path, columns=columns, batch_rows=batch_rows):
+        metrics.update(batch, y_pred=y_pred)
+    return metrics
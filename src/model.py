@@ -1,22 +1,21 @@
 import os
+import sys
 import numpy as np
 import pandas as pd
-import lightgbm as lgb
-from xgboost import XGBRegressor
-from catboost import CatBoostRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error, root_mean_squared_error
-
-def train_model(
-    sales_full, sales_b, sales_b_promo5,
-    FEATURES, results_dir, models_dir, figs_dir,
-    promos1to4, promo5,
-    model_name='LGBM'
-):
-    print("\n" + "="*50)
-    print("   🤖 Training and Evaluating Model...   ")
-    print("="*50 + "\n")
+from src.instrument import instrumented
+from src.metrics import error_metrics, write_segment_metrics
+
+# Boosting backends and scikit-learn each take about a second to import, so they are
+# imported inside the functions that use them and a caller only pays for its backend
+
+CAT_FEATURES = ["ItemCluster", "StoreCluster"]
+# Fixed category order so codes agree between a saved model and any later data fed to it
+CLUSTER_LEVELS = ["Fast", "Medium", "Slow"]
+MODEL_EXTENSIONS = {"LGBM": "txt", "XGB": "json", "CATBOOST": "cbm"}
 
+def prepare_splits(sales_full, sales_b, sales_b_promo5, FEATURES):
+    """Train/val/test/Promo5 design matrices with clusters cast to categoricals."""
+    from sklearn.model_selection import train_test_split
     # Prepare train/val/test
     X = sales_full[FEATURES].drop(columns=["Quantity", "Date"])
     y = sales_full["Quantity"]
@@ -28,8 +27,7 @@ def train_model(
     y_test_promo5 = sales_b_promo5["Quantity"]
 
     # Cast categoricals and handle missing clusters
-    cat_features = ["ItemCluster", "StoreCluster"]
-    for col in cat_features:
+    for col in CAT_FEATURES:
         X_train = X_train[X_train[col].notnull()]
         y_train = y_train.loc[X_train.index]
         X_val = X_val[X_val[col].notnull()]
@@ -41,50 +39,104 @@ def train_model(
         for col in df.select_dtypes(include=["object"]).columns:
             df[col] = df[col].astype("category")
 
-    # Train model
+    return {
+        "train": (X_train, y_train), "val": (X_val, y_val),
+        "test": (X_test, y_test), "promo5": (X_test_promo5, y_test_promo5),
+    }
+
+def build_model(model_name, n_jobs=None, **params):
+    """Unfitted regressor for a backend; `params` override the defaults below."""
     if model_name == "LGBM":
-        model = lgb.LGBMRegressor(
+        import lightgbm as lgb
+        defaults = dict(
             objective="regression", n_estimators=100, learning_rate=0.1,
             early_stopping_rounds=10, verbose=0, num_leaves=31,
             num_iterations=100
         )
-    elif model_name == "XGB":
-        model = XGBRegressor(
+        if n_jobs:
+            defaults["n_jobs"] = n_jobs
+        return lgb.LGBMRegressor(**{**defaults, **params})
+    if model_name == "XGB":
+        from xgboost import XGBRegressor
+        defaults = dict(
             objective="reg:squarederror", n_estimators=100,
             enable_categorical=True, eval_metric="rmse", verbosity=0
         )
-    elif model_name == "CATBOOST":
-        model = CatBoostRegressor(
+        if n_jobs:
+            defaults["n_jobs"] = n_jobs
+        return XGBRegressor(**{**defaults, **params})
+    if model_name == "CATBOOST":
+        from catboost import CatBoostRegressor
+        defaults = dict(
             iterations=100, learning_rate=0.1, depth=6,
             loss_function='RMSE', verbose=0, early_stopping_rounds=10,
-            cat_features=cat_features
+            cat_features=CAT_FEATURES
         )
+        if n_jobs:
+            defaults["thread_count"] = n_jobs
+        return CatBoostRegressor(**{**defaults, **params})
+    raise ValueError(f"Unsupported model: {model_name}")
+
+def compute_metrics(y_val, y_val_pred, y_test, y_test_pred, y_test_promo5, y_test_promo5_pred):
+    val = error_metrics(y_val, y_val_pred)
+    test = error_metrics(y_test, y_test_pred)
+    promo5 = error_metrics(y_test_promo5, y_test_promo5_pred)
+    return {
+        "val_mae": val["mae"], "val_rmse": val["rmse"],
+        "test_mae": test["mae"], "test_rmse": test["rmse"], "test_nrmse": test["nrmse"],
+        "promo5_mae": promo5["mae"], "promo5_rmse": promo5["rmse"], "promo5_nrmse": promo5["nrmse"],
+    }
+
+def save_model(model, model_name, models_dir, tag=None):
+    os.makedirs(models_dir, exist_ok=True)
+    path = os.path.join(models_dir, f"{tag or model_name}.{MODEL_EXTENSIONS[model_name]}")
+    if model_name == 'LGBM':
+        # LGBMRegressor or a Booster from lgb.train
+        getattr(model, "booster_", model).save_model(path)
     else:
-        raise ValueError(f"Unsupported model: {model_name}")
-
-    model.fit(X_train, y_train, eval_set=[(X_val, y_val)])
-
-    # Evaluate
-    y_val_pred = model.predict(X_val)
-    y_test_pred = model.predict(X_test)
-
-    if not X_test_promo5.empty:
-        y_test_promo5_pred = model.predict(X_test_promo5)
-    else:
-        print("\n" + "!"*60)
-        print("   ⚠️  Warning: Promo5 test set is empty. Skipping evaluation for Promo5.")
-        print("!"*60 + "\n")
-        y_test_promo5_pred = np.full(len(y_test_promo5), np.nan)
+        model.save_model(path)
+    return path
 
-    val_mae = mean_absolute_error(y_val, y_val_pred)
-    val_rmse = root_mean_squared_error(y_val, y_val_pred)
-    test_mae = mean_absolute_error(y_test, y_test_pred)
-    test_rmse = root_mean_squared_error(y_test, y_test_pred)
-    test_nrmse = test_rmse / (y_test.max() - y_test.min())
-
-    test_promo5_mae = mean_absolute_error(y_test_promo5, y_test_promo5_pred)
-    test_promo5_rmse = root_mean_squared_error(y_test_promo5, y_test_promo5_pred)
-    test_promo5_nrmse = test_promo5_rmse / (y_test_promo5.max() - y_test_promo5.min())
+def load_model(model_name, path):
+    """Saved model ready for predict(): a LightGBM Booster or the XGBoost/CatBoost regressor."""
+    if model_name == "LGBM":
+        import lightgbm as lgb
+        return lgb.Booster(model_file=path)
+    if model_name == "XGB":
+        from xgboost import XGBRegressor
+        model = XGBRegressor()
+        model.load_model(path)
+        return model
+    if model_name == "CATBOOST":
+        from catboost import CatBoostRegressor
+        return CatBoostRegressor().load_model(path)
+    raise ValueError(f"Unsupported model: {model_name}")
+
+def scoring_features(df, FEATURES, model_name=None):
+    """Design matrix for a saved model: FEATURES minus target/date, clusters on CLUSTER_LEVELS."""
+    X = df[[f for f in FEATURES if f not in ("Quantity", "Date")]].copy()
+    for col in CAT_FEATURES:
+        if model_name == "CATBOOST":
+            # CatBoost rejects missing categorical values but accepts unseen ones
+            X[col] = X[col].fillna("Unknown").astype(str)
+        else:
+            # Unknown clusters become missing values; XGBoost rejects categories it was not trained on
+            X[col] = pd.Categorical(X[col], categories=CLUSTER_LEVELS)
+    return X
+
+def predict_rows(model, X, shards=None):
+    """model.predict(X), over store shards of X in parallel when `shards` (map_shards options) is given."""
+    if not shards:
+        return model.predict(X)
+    from src.sharding import map_shards
+    return map_shards("predict", X, {"model": model}, **shards)["Prediction"].to_numpy()
+
+def report_metrics(metrics, model_name):
+    """Print the validation/test/Promo5 metrics."""
+    val_mae, val_rmse = metrics["val_mae"], metrics["val_rmse"]
+    test_mae, test_rmse, test_nrmse = metrics["test_mae"], metrics["test_rmse"], metrics["test_nrmse"]
+    test_promo5_mae, test_promo5_rmse = metrics["promo5_mae"], metrics["promo5_rmse"]
+    test_promo5_nrmse = metrics["promo5_nrmse"]
 
     print("\n" + "="*50)
     print(f"   📈 {model_name} Model Validation Results:")
@@ -104,14 +156,8 @@ def train_model(
     print(f"   Test Promo5 RMSE: {test_promo5_rmse:.4f}")
     print(f"   Test Promo5 NRMSE:{test_promo5_nrmse:.4f}")
 
-    # Save model
-    os.makedirs(models_dir, exist_ok=True)
-    if model_name == 'LGBM':
-        model.booster_.save_model(os.path.join(models_dir, f"{model_name}.txt"))
-    elif model_name == 'XGB':
-        model.save_model(os.path.join(models_dir, f"{model_name}.json"))
-
-    # Save results
+def write_metrics(metrics, model_name, results_dir):
+    """Write the report_metrics numbers to {model_name}_results.txt."""
     os.makedirs(results_dir, exist_ok=True)
     # Write model evaluation results to a file
     results_file = os.path.join(results_dir, f"{model_name}_results.txt")
@@ -119,22 +165,65 @@ def train_model(
         f.write("="*50 + "\n")
         f.write(f"📈 {model_name} Model Evaluation Results\n")
         f.write("="*50 + "\n")
-        f.write(f"Validation MAE:   {val_mae:.4f}\n")
-        f.write(f"Validation RMSE:  {val_rmse:.4f}\n")
+        f.write(f"Validation MAE:   {metrics['val_mae']:.4f}\n")
+        f.write(f"Validation RMSE:  {metrics['val_rmse']:.4f}\n")
         f.write("\n")
-        f.write(f"Test MAE:         {test_mae:.4f}\n")
-        f.write(f"Test RMSE:        {test_rmse:.4f}\n")
-        f.write(f"Test NRMSE:       {test_nrmse:.4f}\n")
+        f.write(f"Test MAE:         {metrics['test_mae']:.4f}\n")
+        f.write(f"Test RMSE:        {metrics['test_rmse']:.4f}\n")
+        f.write(f"Test NRMSE:       {metrics['test_nrmse']:.4f}\n")
         f.write("\n")
-        f.write(f"Promo5 MAE:       {test_promo5_mae:.4f}\n")
-        f.write(f"Promo5 RMSE:      {test_promo5_rmse:.4f}\n")
-        f.write(f"Promo5 NRMSE:     {test_promo5_nrmse:.4f}\n")
+        f.write(f"Promo5 MAE:       {metrics['promo5_mae']:.4f}\n")
+        f.write(f"Promo5 RMSE:      {metrics['promo5_rmse']:.4f}\n")
+        f.write(f"Promo5 NRMSE:     {metrics['promo5_nrmse']:.4f}\n")
         f.write("="*50 + "\n")
+    return results_file
+
+def publish_model(model, model_name, models_dir):
+    """Atomically replace models/{model_name}.{ext}, the file `main.py score` and src.serving load."""
+    tmp = save_model(model, model_name, models_dir, tag=f"{model_name}.tmp-{os.getpid()}")
+    path = os.path.join(models_dir, f"{model_name}.{MODEL_EXTENSIONS[model_name]}")
+    os.replace(tmp, path)
+    return path
+
+def save_training_outputs(model, metrics, segments, model_name, results_dir, models_dir):
+    """Publish the trained model and write its results txt (when `metrics` has the full set) and
+    {model_name}_segment_metrics.csv."""
+    if metrics is not None:
+        write_metrics(metrics, model_name, results_dir)
+    write_segment_metrics(segments, os.path.join(results_dir, f"{model_name}_segment_metrics.csv"))
+    return publish_model(model, model_name, models_dir)
+
+@instrumented(rows_from=("sales_full", "sales_b"))
+def train_model(sales_full, sales_b, sales_b_promo5, FEATURES, model_name='LGBM', shards=None):
+    """Fit and evaluate one backend; the caller writes its files (save_training_outputs)."""
+    print("\n" + "="*50)
+    print("   🤖 Training and Evaluating Model...   ")
+    print("="*50 + "\n")
+
+    splits = prepare_splits(sales_full, sales_b, sales_b_promo5, FEATURES)
+    (X_train, y_train), (X_val, y_val) = splits["train"], splits["val"]
+    (X_test, y_test), (X_test_promo5, y_test_promo5) = splits["test"], splits["promo5"]
+
+    # Train model
+    model = build_model(model_name)
+    model.fit(X_train, y_train, eval_set=[(X_val, y_val)])
+
+    # Evaluate
+    y_val_pred = predict_rows(model, X_val, shards)
+    y_test_pred = predict_rows(model, X_test, shards)
+
+    if not X_test_promo5.empty:
+        y_test_promo5_pred = predict_rows(model, X_test_promo5, shards)
+    else:
+        # Warnings go to stderr so they survive quiet mode
+        print("\n" + "!"*60, file=sys.stderr)
+        print("   ⚠️  Warning: Promo5 test set is empty. Skipping evaluation for Promo5.", file=sys.stderr)
+        print("!"*60 + "\n", file=sys.stderr)
+        y_test_promo5_pred = np.full(len(y_test_promo5), np.nan)
+
+    metrics = compute_metrics(y_val, y_val_pred, y_test, y_test_pred, y_test_promo5, y_test_promo5_pred)
+    report_metrics(metrics, model_name)
 
-    # Save predictions for future visualization
     sales_b["PredictedQuantity"] = y_test_pred
     sales_b_promo5["PredictedQuantity"] = y_test_promo5_pred
-    sales_b.to_csv(os.path.join(results_dir, f"{model_name}_test_predictions.csv"), index=False)
-    sales_b_promo5.to_csv(os.path.join(results_dir, f"{model_name}_promo5_predictions.csv"), index=False)
-
-    return model, sales_b, sales_b_promo5
\ No newline at end of file
+    return model, metrics, sales_b, sales_b_promo5
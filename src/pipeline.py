@@ -0,0 +1,132 @@
+# src/pipeline.py
+import os
+import time
+import pickle
+import inspect
+import importlib.util
+from src.feature_cache import digest
+from src.instrument import quieted
+
+class Stage:
+    """A named pipeline step.
+
+    `inputs` maps keyword arguments of `func` to "stage.output" references; `func` returns a
+    dict of named outputs. The stage key hashes its config values, input files, the source
+    of `func` and of its code modules (dotted names, located without importing them) and the
+    keys of every upstream stage it reads from.
+    """
+
+    def __init__(self, name, func, inputs=None, config=(), files=(), code=()):
+        self.name = name
+        self.func = func
+        self.inputs = inputs or {}
+        self.config = config
+        self.files = files
+        self.code = code
+
+    def upstream(self):
+        return sorted({ref.split(".")[0] for ref in self.inputs.values()})
+
+def stage_keys(stages, settings):
+    keys = {}
+    for stage in stages:
+        missing = [name for name in stage.upstream() if name not in keys]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' reads from {missing}, which must be declared before it")
+        keys[stage.name] = digest(
+            stage.name,
+            inspect.getsource(stage.func),
+            tuple((name, getattr(settings, name)) for name in stage.config),
+            *stage.files,
+            *[importlib.util.find_spec(module).origin for module in stage.code],
+            tuple((arg, ref, keys[ref.split(".")[0]]) for arg, ref in sorted(stage.inputs.items())),
+        )
+    return keys
+
+def select_stages(order, start=None, until=None, only=None):
+    """(selected, forced) stage names for the --from/--until/--only controls."""
+    for name in [start, until, *(only or [])]:
+        if name is not None and name not in order:
+            raise ValueError(f"Unknown stage '{name}'. Stages: {', '.join(order)}")
+    if only:
+        selected = [name for name in order if name in only]
+        return selected, set(selected)
+    lo = order.index(start) if start else 0
+    hi = order.index(until) + 1 if until else len(order)
+    selected = order[lo:hi]
+    return selected, set(selected) if start else set()
+
+def run_pipeline(stages, settings, cache_dir, start=None, until=None, only=None, keep=3, load=()):
+    """Run the selected stages, reusing persisted outputs whose key is unchanged.
+
+    Cached stages are only unpickled when a stage that actually runs needs their outputs, or
+    when they are listed in `load` (for callers that use the results themselves).
+    Stages outside the selection still run if a selected stage needs them and they are not cached.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    order = [stage.name for stage in stages]
+    keys = stage_keys(stages, settings)
+    selected, forced = select_stages(order, start, until, only)
+    results, summary = {}, {}
+
+    def cache_path(name):
+        return os.path.join(cache_dir, name, f"{keys[name]}.pkl")
+
+    def is_cached(name):
+        return name not in forced and os.path.exists(cache_path(name))
+
+    def outputs(name):
+        if name in results:
+            return results[name]
+        if is_cached(name):
+            start_time = time.perf_counter()
+            with open(cache_path(name), "rb") as f:
+                results[name] = pickle.load(f)
+            summary[name] = ("hit (loaded)", time.perf_counter() - start_time)
+            return results[name]
+        return execute(name)
+
+    def execute(name):
+        stage = by_name[name]
+        kwargs = {}
+        for arg, ref in stage.inputs.items():
+            source, output = ref.split(".")
+            kwargs[arg] = outputs(source)[output]
+        start_time = time.perf_counter()
+        with quieted():
+            results[name] = stage.func(**kwargs) or {}
+        summary[name] = ("run", time.perf_counter() - start_time)
+        persist(name)
+        return results[name]
+
+    def persist(name):
+        directory = os.path.dirname(cache_path(name))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{cache_path(name)}.tmp-{os.getpid()}"
+        with open(tmp, "wb") as f:
+            pickle.dump(results[name], f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_path(name))
+        # Keep the most recent `keep` variants so switching configs back and forth stays cached
+        pickles = sorted((os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".pkl")),
+                         key=os.path.getmtime, reverse=True)
+        for stale in pickles[keep:]:
+            os.remove(stale)
+
+    for name in selected:
+        if name in results:
+            continue
+        if is_cached(name):
+            summary.setdefault(name, ("hit", 0.0))
+        else:
+            execute(name)
+    for name in load:
+        outputs(name)
+
+    print("\n" + "="*50)
+    print("   ⏱️  Pipeline Stage Summary:")
+    print("="*50)
+    for name in order:
+        status, seconds = summary.get(name, ("skipped", 0.0))
+        print(f"   {name:<12} {status:<14} {seconds:8.2f}s   {keys[name][:12]}")
+    print("="*50 + "\n")
+    return results, summary
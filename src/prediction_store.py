@@ -0,0 +1,130 @@
+# src/prediction_store.py
+import os
+import time
+import uuid
+import shutil
+import pandas as pd
+from src.instrument import instrumented
+
+EXPORT_FORMATS = ["parquet", "csv"]
+EXPORT_MODES = ["overwrite", "append"]
+PARTITION_COLS = ["Period", "Store"]
+SORT_KEYS = ["Store", "Item", "Date"]
+METADATA_FILE = "_common_metadata"  # full schema; the leading underscore keeps it out of dataset scans
+
+def select_columns(df, columns):
+    """`columns` present in df (all columns when None), always keeping Date and Store."""
+    for col in ("Date", "Store"):
+        if col not in df.columns:
+            raise ValueError(f"Prediction exports need a '{col}' column")
+    if columns is None:
+        return list(df.columns)
+    return ["Date", "Store"] + [c for c in columns if c in df.columns and c not in ("Date", "Store")]
+
+@instrumented(rows_from=("df",))
+def write_predictions(df, path, columns=None, mode="overwrite", freq="M", compression="zstd"):
+    """Write rows of `df` as a Parquet dataset under `path`, hive-partitioned by Period (Date at `freq`) and Store.
+
+    mode="append" adds this call's rows as new files next to the existing ones, so daily runs
+    only write their own days; "overwrite" replaces the dataset.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"Unsupported export mode: {mode}. Options: {', '.join(EXPORT_MODES)}")
+    frame = df[select_columns(df, columns)].assign(Period=df["Date"].dt.to_period(freq).astype(str))
+    if isinstance(frame["Store"].dtype, pd.CategoricalDtype):
+        # Partition values are plain ids in the directory names
+        frame["Store"] = frame["Store"].astype(frame["Store"].cat.categories.dtype)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    schema = table.schema.with_metadata({**table.schema.metadata, b"period_freq": freq.encode()})
+
+    metadata_path = os.path.join(path, METADATA_FILE)
+    if mode == "append" and os.path.exists(metadata_path):
+        existing = pq.read_schema(metadata_path)
+        if existing.names != schema.names or existing.metadata.get(b"period_freq") != freq.encode():
+            raise ValueError(f"Appended columns or period differ from the dataset at {path}: "
+                             f"{existing.names} ({existing.metadata.get(b'period_freq')!r})")
+        # e.g. a column that is all-null in this batch takes the dataset's type
+        table, schema = table.cast(existing), existing
+    elif os.path.exists(path):
+        shutil.rmtree(path)
+
+    os.makedirs(path, exist_ok=True)
+    run_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    ds.write_dataset(table, path, format="parquet",
+                     partitioning=ds.partitioning(pa.schema([schema.field(c) for c in PARTITION_COLS]),
+                                                  flavor="hive"),
+                     basename_template=f"part-{run_id}-{{i}}.parquet",
+                     file_options=ds.ParquetFileFormat().make_write_options(compression=compression),
+                     existing_data_behavior="overwrite_or_ignore")
+    pq.write_metadata(schema, metadata_path)
+    return path
+
+def read_predictions(path, stores=None, start=None, end=None, columns=None):
+    """Rows of a write_predictions dataset for `stores` and Date in [start, end] (each optional).
+
+    Store and Period filters skip whole partition directories and the Date filter skips row
+    groups by their statistics, so a single store or date range never scans the full export.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    schema = pq.read_schema(os.path.join(path, METADATA_FILE))
+    freq = schema.metadata[b"period_freq"].decode()
+    dataset = ds.dataset(path, schema=schema, format="parquet",
+                         partitioning=ds.partitioning(pa.schema([schema.field(c) for c in PARTITION_COLS]),
+                                                      flavor="hive"))
+    filters = []
+    if stores is not None:
+        filters.append(ds.field("Store").isin(list(stores)))
+    date_type = schema.field("Date").type
+    if start is not None:
+        start = pd.Timestamp(start)
+        # Period strings sort like their dates, so they bound the partitions to open
+        filters += [ds.field("Period") >= str(start.to_period(freq)), ds.field("Date") >= pa.scalar(start, date_type)]
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters += [ds.field("Period") <= str(end.to_period(freq)), ds.field("Date") <= pa.scalar(end, date_type)]
+    expression = None
+    for f in filters:
+        expression = f if expression is None else expression & f
+
+    if columns is None:
+        columns = [c for c in schema.names if c != "Period"]
+    df = dataset.to_table(columns=list(columns), filter=expression).to_pandas()
+    keys = [c for c in SORT_KEYS if c in df.columns]
+    return df.sort_values(keys, kind="stable").reset_index(drop=True) if keys else df
+
+def iter_predictions(path, columns=None, batch_rows=1_000_000):
+    """Frames of at most `batch_rows` rows from a write_predictions dataset, one at a time.
+
+    Columns not in the dataset are skipped, so callers can ask for optional ones.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    schema = pq.read_schema(os.path.join(path, METADATA_FILE))
+    dataset = ds.dataset(path, schema=schema, format="parquet",
+                         partitioning=ds.partitioning(pa.schema([schema.field(c) for c in PARTITION_COLS]),
+                                                      flavor="hive"))
+    names = [c for c in schema.names if c != "Period"] if columns is None else \
+        [c for c in dict.fromkeys(columns) if c in schema.names]
+    for batch in dataset.to_batches(columns=names, batch_size=batch_rows):
+        yield pa.Table.from_batches([batch], schema=batch.schema.with_metadata(schema.metadata)).to_pandas()
+
+def export_predictions(df, results_dir, name, fmt="parquet", columns=None, mode="overwrite", freq="M",
+                       compression="zstd"):
+    """Write prediction rows to results_dir/name (a partitioned Parquet dataset) or results_dir/name.csv."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}. Options: {', '.join(EXPORT_FORMATS)}")
+    os.makedirs(results_dir, exist_ok=True)
+    if fmt == "parquet":
+        return write_predictions(df, os.path.join(results_dir, name), columns, mode, freq, compression)
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"Unsupported export mode: {mode}. Options: {', '.join(EXPORT_MODES)}")
+    path = os.path.join(results_dir, f"{name}.csv")
+    append = mode == "append" and os.path.exists(path)
+    df[select_columns(df, columns)].to_csv(path, mode="a" if append else "w", header=not append, index=False)
+    return path
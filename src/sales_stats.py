@@ -0,0 +1,123 @@
+# src/sales_stats.py
+import numpy as np
+import pandas as pd
+from src.instrument import instrumented
+
+STAT_COLUMNS = ["count", "sum", "sumsq"]
+
+class SalesStats:
+    """Count, sum and sum of squares of Quantity per (Item, Store, Promotion) cell.
+
+    Every per-key statistic the pipeline needs (non-promo means for clustering, lift-cube cells,
+    cluster summaries, plot averages) is a roll-up of these cells, so the sales rows are scanned
+    once; update() folds appended rows in without rescanning the old ones.
+    """
+
+    def __init__(self, items=None, stores=None, cells=None):
+        self.items = pd.Index([]) if items is None else items
+        self.stores = pd.Index([]) if stores is None else stores
+        # [item, store, promotion, stat] with stat in STAT_COLUMNS order
+        self.cells = np.zeros((len(self.items), len(self.stores), 2, 3)) if cells is None else cells
+
+    def copy(self):
+        return SalesStats(self.items, self.stores, self.cells.copy())
+
+    def _grow(self, items, stores):
+        """Re-embed the cells in the union of the current and new ids (kept sorted)."""
+        items = items if self.items.empty else self.items.union(items)
+        stores = stores if self.stores.empty else self.stores.union(stores)
+        if items.equals(self.items) and stores.equals(self.stores):
+            return
+        cells = np.zeros((len(items), len(stores), 2, 3))
+        cells[np.ix_(items.get_indexer(self.items), stores.get_indexer(self.stores))] = self.cells
+        self.items, self.stores, self.cells = items, stores, cells
+
+    def update(self, df):
+        """Add the rows of `df` (Item, Store, Promotion, Quantity) to the running statistics."""
+        if "Promotion" not in df.columns:
+            raise ValueError("Expected 'Promotion' column to be present. Did you forget to call tag_promotions()?")
+        if len(df) == 0:
+            return self
+        self._grow(pd.Index(np.sort(df["Item"].unique())), pd.Index(np.sort(df["Store"].unique())))
+        cell = (self.items.get_indexer(df["Item"]) * len(self.stores) + self.stores.get_indexer(df["Store"])) * 2 \
+            + df["Promotion"].to_numpy(dtype=bool)
+        qty = df["Quantity"].to_numpy(dtype=np.float64)
+        n_cells = self.cells.shape[0] * self.cells.shape[1] * 2
+        flat = self.cells.reshape(n_cells, 3)
+        flat[:, 0] += np.bincount(cell, minlength=n_cells)
+        flat[:, 1] += np.bincount(cell, weights=qty, minlength=n_cells)
+        flat[:, 2] += np.bincount(cell, weights=qty * qty, minlength=n_cells)
+        return self
+
+    def group(self, item=None, store=None, promotion=None):
+        """count/sum/sumsq rolled up to the given keys.
+
+        item/store: None drops that side, "Item"/"Store" keeps the ids, and a Series maps ids to
+        labels (e.g. item_clusters); ids it does not map are left out, like NaN keys in a groupby.
+        promotion: None sums both sides, False/True keeps one.
+        """
+        cells = self.cells.sum(axis=2) if promotion is None else self.cells[:, :, int(bool(promotion))]
+        keys = []
+        for axis, (spec, ids) in enumerate([(item, self.items), (store, self.stores)]):
+            if spec is None:
+                continue
+            if isinstance(spec, str):
+                codes, labels = None, ids.rename(spec)
+            else:
+                labels = pd.Index(np.sort(spec.dropna().unique()), name=spec.name)
+                codes = labels.get_indexer(spec.reindex(ids))
+            keys.append((axis, codes, labels))
+
+        if not keys:
+            return pd.DataFrame([cells.sum(axis=(0, 1))], columns=STAT_COLUMNS)
+        # Collapse each mapped side onto its labels
+        for axis, codes, labels in keys:
+            if codes is None:
+                continue
+            known = codes >= 0
+            moved = np.moveaxis(cells, axis, 0)[known]
+            out = np.zeros((len(labels),) + moved.shape[1:])
+            np.add.at(out, codes[known], moved)
+            cells = np.moveaxis(out, 0, axis)
+        dropped = tuple(axis for axis, spec in enumerate([item, store]) if spec is None)
+        cells = cells.sum(axis=dropped) if dropped else cells
+        if len(keys) == 1:
+            index = keys[0][2]
+        else:
+            index = pd.MultiIndex.from_product([keys[0][2], keys[1][2]])
+        return pd.DataFrame(cells.reshape(-1, 3), index=index, columns=STAT_COLUMNS)
+
+    def means(self, dim, promotion=None):
+        """Mean Quantity per `dim` ("Item" or "Store"), groups without rows dropped."""
+        if dim not in ("Item", "Store"):
+            raise ValueError(f"Unsupported stats dimension: {dim}. Options: Item, Store")
+        stats = self.group(**{dim.lower(): dim}, promotion=promotion)
+        stats = stats[stats["count"] > 0]
+        return (stats["sum"] / stats["count"]).rename("Quantity")
+
+    def summary(self, item=None, store=None, promotion=None):
+        """count/mean/std (ddof=1) per key, as groupby(...)["Quantity"].agg(["count", "mean", "std"])."""
+        stats = self.group(item=item, store=store, promotion=promotion)
+        stats = stats[stats["count"] > 0]
+        count = stats["count"]
+        mean = stats["sum"] / count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = ((stats["sumsq"] - stats["sum"] * mean) / (count - 1)).clip(lower=0)
+        return pd.DataFrame({"count": count.astype(np.int64), "mean": mean,
+                             "std": np.sqrt(var.where(count > 1))})
+
+@instrumented(rows_from=("sales_full",))
+def build_sales_stats(sales_full, tensor=None):
+    """SalesStats of `sales_full`, from one bincount pass (or day-axis sums of its SalesTensor)."""
+    if tensor is None:
+        return SalesStats().update(sales_full)
+    cells = np.zeros((len(tensor.items), len(tensor.stores), 2, 3))
+    squares = np.square(np.asarray(tensor.quantity, dtype=np.float64))
+    for flag in (False, True):
+        sums, counts = tensor.sums_counts(promotion=flag)
+        mask = np.asarray(tensor.observed) & (np.asarray(tensor.promotion) == flag)
+        # Tensor axes are [store, item, day]; the stats cells are [item, store]
+        cells[:, :, int(flag), 0] = counts.T
+        cells[:, :, int(flag), 1] = sums.T
+        cells[:, :, int(flag), 2] = np.where(mask, squares, 0).sum(axis=2).T
+    return SalesStats(tensor.items, tensor.stores, cells)
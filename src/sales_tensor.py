@@ -0,0 +1,127 @@
+# src/sales_tensor.py
+import os
+import json
+import numpy as np
+import pandas as pd
+from src.instrument import instrumented
+
+TENSOR_ARRAYS = ["quantity", "promotion", "observed"]
+DAY = np.timedelta64(1, "D")
+
+class SalesTensor:
+    """Quantity, promotion flag and observed mask as dense [store, item, day] arrays.
+
+    Stores and items are the sorted ids seen in the source frame and days run from its first to
+    its last date, so a long-format row maps to one cell by index arithmetic. Cells without a
+    source row have observed=False and zero quantity. Saved tensors are reopened memory-mapped
+    and pickle as their path only.
+    """
+
+    def __init__(self, quantity, promotion, observed, stores, items, dates, path=None):
+        self.quantity = quantity
+        self.promotion = promotion
+        self.observed = observed
+        self.stores = stores
+        self.items = items
+        self.dates = dates
+        self.path = path
+
+    @property
+    def shape(self):
+        return self.observed.shape
+
+    def __getstate__(self):
+        if self.path is not None:
+            return {"path": self.path}
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        if set(state) == {"path"}:
+            state = open_sales_tensor(state["path"]).__dict__
+        self.__dict__.update(state)
+
+    def cells(self, df):
+        """Flat cell index of every row of `df` (-1 when its Store, Item or Date is outside the tensor)."""
+        n_stores, n_items, n_days = self.shape
+        store = self.stores.get_indexer(df["Store"])
+        item = self.items.get_indexer(df["Item"])
+        day = np.full(len(df), -1, dtype=np.int64)
+        if n_days:
+            day = ((df["Date"].to_numpy() - self.dates[0].to_datetime64()) // DAY).astype(np.int64)
+        known = (store >= 0) & (item >= 0) & (day >= 0) & (day < n_days)
+        return np.where(known, (store.astype(np.int64) * n_items + item) * n_days + day, -1)
+
+    def to_frame(self):
+        """Long Store/Item/Date/Quantity/Promotion frame of the observed cells, sorted by Store, Item, Date."""
+        store, item, day = np.nonzero(self.observed)
+        return pd.DataFrame({
+            "Store": self.stores.to_numpy()[store],
+            "Item": self.items.to_numpy()[item],
+            "Date": self.dates.to_numpy()[day],
+            "Quantity": self.quantity[store, item, day],
+            "Promotion": self.promotion[store, item, day],
+        }, copy=False)
+
+    def save(self, path):
+        """Write the arrays and ids as .npy files under `path` and return the memory-mapped tensor."""
+        os.makedirs(path, exist_ok=True)
+        for name in TENSOR_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        np.save(os.path.join(path, "stores.npy"), self.stores.to_numpy())
+        np.save(os.path.join(path, "items.npy"), self.items.to_numpy())
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"start": str(self.dates[0].date()) if len(self.dates) else None,
+                       "days": len(self.dates)}, f)
+        return open_sales_tensor(path)
+
+    def daily_totals(self):
+        """Total Quantity per date that has at least one row (the long frame's groupby('Date').sum())."""
+        totals = self.quantity.sum(axis=(0, 1))
+        seen = self.observed.any(axis=(0, 1))
+        return pd.Series(totals[seen], index=self.dates[seen], name="Quantity")
+
+    def sums_counts(self, promotion=None):
+        """Quantity sums and row counts per (store, item), over all rows or only rows with that promotion flag."""
+        mask = self.observed if promotion is None else self.observed & (self.promotion == promotion)
+        sums = np.where(mask, self.quantity, 0).sum(axis=2, dtype=np.float64)
+        return sums, mask.sum(axis=2)
+
+@instrumented(rows_from=("df",))
+def build_sales_tensor(df, path=None):
+    """Scatter a long sales frame (one row per Store, Item, Date) into a SalesTensor, saved under `path` if given."""
+    stores = pd.Index(np.sort(df["Store"].unique()))
+    items = pd.Index(np.sort(df["Item"].unique()))
+    dates = pd.date_range(df["Date"].min(), df["Date"].max()) if len(df) else pd.DatetimeIndex([])
+    empty = SalesTensor(None, None, np.zeros((len(stores), len(items), len(dates)), dtype=bool),
+                        stores, items, dates)
+    cells = empty.cells(df)
+    observed = empty.observed
+    observed.reshape(-1)[cells] = True
+    # Fewer observed cells than rows means some rows share a cell
+    if observed.sum() != len(cells):
+        raise ValueError("The tensor backend needs one row per (Store, Item, Date); "
+                         "load with LOAD_AGGREGATE_DUPLICATES or aggregate first")
+
+    qty = df["Quantity"].to_numpy()
+    quantity = np.zeros(empty.shape, dtype=qty.dtype)
+    quantity.reshape(-1)[cells] = qty
+    promotion = np.zeros(empty.shape, dtype=bool)
+    if "Promotion" in df.columns:
+        promotion.reshape(-1)[cells] = df["Promotion"].to_numpy(dtype=bool)
+
+    tensor = SalesTensor(quantity, promotion, observed, stores, items, dates)
+    size = sum(getattr(tensor, name).nbytes for name in TENSOR_ARRAYS) / 1024**2
+    print(f"   🧱 Sales tensor {len(stores)} stores x {len(items)} items x {len(dates)} days "
+          f"({observed.mean():.1%} observed, {size:.1f} MB)")
+    return tensor.save(path) if path else tensor
+
+def open_sales_tensor(path, mmap_mode="r"):
+    """Open a saved SalesTensor with its arrays memory-mapped."""
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in TENSOR_ARRAYS}
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    dates = pd.date_range(meta["start"], periods=meta["days"]) if meta["days"] else pd.DatetimeIndex([])
+    return SalesTensor(arrays["quantity"], arrays["promotion"], arrays["observed"],
+                       pd.Index(np.load(os.path.join(path, "stores.npy"), allow_pickle=True)),
+                       pd.Index(np.load(os.path.join(path, "items.npy"), allow_pickle=True)),
+                       dates, path=path)
@@ -0,0 +1,216 @@
+# src/serving.py
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import warnings
+import threading
+import traceback
+import socketserver
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from src import config
+from src.data_loader import load_clusters, map_clusters
+from src.model import MODEL_EXTENSIONS, load_model, scoring_features
+
+class MicroBatcher:
+    """Coalesces concurrent submit() calls into one predict() of up to `batch_size` rows.
+
+    A batch is flushed when it reaches `batch_size` rows or `max_wait_ms` after its first
+    request arrived, whichever comes first. If the batched predict() fails, each request is
+    retried on its own so only the offending ones get the error.
+    """
+
+    def __init__(self, predict, batch_size=4096, max_wait_ms=5.0, latency_window=10000):
+        self.predict = predict
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=latency_window)
+        self.counts = {"requests": 0, "rows": 0, "batches": 0, "errors": 0}
+        self.started = time.perf_counter()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, X):
+        start = time.perf_counter()
+        job = {"X": X, "done": threading.Event()}
+        self.pending.put(job)
+        job["done"].wait()
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+            self.counts["requests"] += 1
+            self.counts["rows"] += len(X)
+        if "error" in job:
+            raise job["error"]
+        return job["result"]
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            rows = len(batch[0]["X"])
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    job = self.pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(job)
+                rows += len(job["X"])
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            preds = np.asarray(self.predict(pd.concat([job["X"] for job in batch], ignore_index=True)))
+            bounds = np.cumsum([0] + [len(job["X"]) for job in batch])
+            for job, lo, hi in zip(batch, bounds[:-1], bounds[1:]):
+                job["result"] = preds[lo:hi]
+        except Exception as exc:
+            if len(batch) == 1:
+                batch[0]["error"] = exc
+            else:
+                for job in batch:
+                    try:
+                        job["result"] = np.asarray(self.predict(job["X"]))
+                    except Exception as job_exc:
+                        job["error"] = job_exc
+        with self.lock:
+            self.counts["batches"] += 1
+            self.counts["errors"] += sum("error" in job for job in batch)
+        for job in batch:
+            job["done"].set()
+
+    def stats(self):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            counts = dict(self.counts)
+        elapsed = time.perf_counter() - self.started
+        return {
+            **counts,
+            "rows_per_batch": counts["rows"] / counts["batches"] if counts["batches"] else 0.0,
+            "rows_per_sec": counts["rows"] / elapsed if elapsed else 0.0,
+            "requests_per_sec": counts["requests"] / elapsed if elapsed else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+        }
+
+class Scorer:
+    """Saved model plus cluster maps, loaded once and shared by all request threads."""
+
+    def __init__(self, models_dir, model_name, FEATURES, batch_size=4096, max_wait_ms=5.0):
+        path = os.path.join(models_dir, f"{model_name}.{MODEL_EXTENSIONS[model_name]}")
+        self.model = load_model(model_name, path)
+        self.item_clusters, self.store_clusters = load_clusters(models_dir)
+        self.model_name = model_name
+        self.FEATURES = FEATURES
+        self.batcher = MicroBatcher(self.model.predict, batch_size, max_wait_ms)
+
+    def prepare(self, rows):
+        df = map_clusters(pd.DataFrame(rows), self.item_clusters, self.store_clusters)
+        return scoring_features(df, self.FEATURES, self.model_name)
+
+    def score(self, rows):
+        return self.batcher.submit(self.prepare(rows))
+
+def make_handler(scorer):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, scorer.batcher.stats())
+            else:
+                self._send(404, {"error": f"Unknown path: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send(404, {"error": f"Unknown path: {self.path}"})
+                return
+            # Only a malformed payload is the client's fault; anything raised by predict() is a 500
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                rows = payload["rows"] if isinstance(payload, dict) else payload
+                X = scorer.prepare(rows)
+            except (ValueError, KeyError, TypeError) as exc:
+                self._send(400, {"error": repr(exc)})
+                return
+            try:
+                preds = scorer.batcher.submit(X)
+            except Exception as exc:
+                # e.g. a backend error inside the batched predict(): log it and still answer the client
+                print(f"   ❌ /predict failed: {exc!r}", file=sys.stderr)
+                traceback.print_exc()
+                self._send(500, {"error": repr(exc)})
+                return
+            self._send(200, {"predictions": preds.tolist()})
+
+        def address_string(self):
+            return str(self.client_address[0]) if self.client_address else "unix"
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+# The socketserver default backlog of 5 resets connections under a concurrent load generator
+class TCPHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+def serve(scorer, host="127.0.0.1", port=8765, unix_socket=None):
+    handler = make_handler(scorer)
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = UnixHTTPServer(unix_socket, handler)
+        where = unix_socket
+    else:
+        server = TCPHTTPServer((host, port), handler)
+        where = f"http://{host}:{port}"
+    print("\n" + "="*50)
+    print(f"   🛰️  Serving predictions on {where}")
+    print(f"   POST /predict  |  GET /stats")
+    print("="*50 + "\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(scorer.batcher.stats(), indent=2))
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching scoring service for a saved model.")
+    parser.add_argument("--model", default=config.MODEL_NAME, choices=sorted(MODEL_EXTENSIONS))
+    parser.add_argument("--models-dir", default=config.MODELS_DIR)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=config.SERVE_PORT)
+    parser.add_argument("--unix-socket", default=None)
+    parser.add_argument("--batch-size", type=int, default=config.SERVE_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=config.SERVE_MAX_WAIT_MS)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    scorer = Scorer(args.models_dir, args.model, config.FEATURES, args.batch_size, args.max_wait_ms)
+    serve(scorer, args.host, args.port, args.unix_socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# src/sharding.py
+import io
+import os
+import sys
+import pickle
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from src.instrument import instrumented
+
+SHARD_MODES = ["pool", "processes"]
+SORT_KEYS = ["Store", "Item", "Date"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def shard_features(df, n_jobs, engine):
+    from src.feature_engineering import FEATURE_ENGINES
+    return FEATURE_ENGINES[engine](df)
+
+def shard_lift_forecast(df, n_jobs, lift_cube, levels=None, min_count=1):
+    from src.forecaster import lift_forecast
+    return lift_forecast(df, lift_cube, levels, min_count)
+
+def shard_predict(X, n_jobs, model):
+    # LGBM/XGB wrappers take a thread count; keep shards from oversubscribing the cores
+    if "n_jobs" in getattr(model, "get_params", dict)():
+        model.set_params(n_jobs=n_jobs)
+    return pd.DataFrame({"Prediction": model.predict(X)}, index=X.index)
+
+# Task name -> (function(df, n_jobs, **options), merge order). "sort" tasks return their shard
+# sorted by SORT_KEYS; "rows" tasks return one row per input row, in input order.
+SHARD_TASKS = {
+    "features": (shard_features, "sort"),
+    "lift_forecast": (shard_lift_forecast, "rows"),
+    "predict": (shard_predict, "rows"),
+}
+
+def shard_of(stores, n_shards):
+    """Shard number of every Store value, from a hash that is stable across processes and runs."""
+    uniques = pd.Index(pd.unique(pd.Series(stores)))
+    shards = (pd.util.hash_array(uniques.to_numpy()) % np.uint64(n_shards)).astype(np.int64)
+    return shards[uniques.get_indexer(stores)]
+
+def shard_path(shard_dir, kind, shard):
+    return os.path.join(shard_dir, f"{kind}_{shard:04d}.parquet")
+
+def run_shard(task):
+    """Run the pickled task of `shard_dir` on one shard's input file and write its output file."""
+    shard_dir, shard = task
+    with open(os.path.join(shard_dir, "task.pkl"), "rb") as f:
+        name, n_jobs, options = pickle.load(f)
+    df = pd.read_parquet(shard_path(shard_dir, "in", shard))
+    # Stage banners would print once per shard; keep worker output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = SHARD_TASKS[name][0](df, n_jobs, **options)
+    out.to_parquet(shard_path(shard_dir, "out", shard))
+    return len(out)
+
+def run_worker_process(task):
+    """Run one shard as a separate `python -m src.sharding` process, as a remote node would."""
+    shard_dir, shard = task
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    subprocess.run([sys.executable, "-m", "src.sharding", shard_dir, str(shard)], env=env, check=True)
+
+@instrumented(rows_from=("df",))
+def map_shards(task, df, options=None, n_shards=2, n_workers=None, mode="pool", shard_dir=None):
+    """Run SHARD_TASKS[task] on `df` split into `n_shards` partitions by a hash of Store.
+
+    Each shard's input and output go through Parquet files in a temporary directory under
+    `shard_dir`, so workers share nothing but the filesystem. Outputs are merged in a fixed
+    order, which makes the result equal to running the task on the whole frame as long as the
+    task treats every Store independently.
+    """
+    if task not in SHARD_TASKS:
+        raise ValueError(f"Unknown shard task: {task}. Options: {', '.join(SHARD_TASKS)}")
+    if mode not in SHARD_MODES:
+        raise ValueError(f"Unsupported shard mode: {mode}. Options: {', '.join(SHARD_MODES)}")
+    if "Store" not in df.columns:
+        raise ValueError("Sharding needs a 'Store' column")
+    func, order = SHARD_TASKS[task]
+    shard = shard_of(df["Store"], n_shards)
+    positions = [np.flatnonzero(shard == i) for i in range(n_shards)]
+    shards = [i for i, pos in enumerate(positions) if len(pos)]
+    n_cpus = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers or n_cpus, len(shards) or 1))
+    n_jobs = max(1, n_cpus // n_workers)
+
+    if shard_dir is not None:
+        os.makedirs(shard_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="shards_", dir=shard_dir) as tmp:
+        with open(os.path.join(tmp, "task.pkl"), "wb") as f:
+            pickle.dump((task, n_jobs, options or {}), f, protocol=pickle.HIGHEST_PROTOCOL)
+        for i in shards:
+            df.iloc[positions[i]].to_parquet(shard_path(tmp, "in", i))
+        tasks = [(tmp, i) for i in shards]
+        if mode == "processes":
+            with ThreadPoolExecutor(n_workers) as pool:
+                list(pool.map(run_worker_process, tasks))
+        elif n_workers == 1:
+            for t in tasks:
+                run_shard(t)
+        else:
+            with mp.get_context("spawn").Pool(n_workers) as pool:
+                pool.map(run_shard, tasks)
+        outputs = [pd.read_parquet(shard_path(tmp, "out", i)) for i in shards]
+
+    if not outputs:
+        return func(df, n_jobs, **(options or {}))
+    merged = pd.concat(outputs)
+    if order == "sort":
+        # Stores never span shards, so a stable sort restores the whole-frame order exactly
+        merged = merged.sort_values(by=SORT_KEYS, kind="stable")
+    else:
+        merged = merged.iloc[np.argsort(np.concatenate([positions[i] for i in shards]), kind="stable")]
+    print(f"   🧩 {task}: {len(df):,} rows in {len(shards)} store shards, "
+          f"{n_workers} {mode} worker(s) x {n_jobs} thread(s)")
+    return merged
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one shard of a map_shards task directory.")
+    parser.add_argument("shard_dir", help="Directory holding task.pkl and the shard input files")
+    parser.add_argument("shard", type=int)
+    args = parser.parse_args()
+    run_shard((args.shard_dir, args.shard))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# src/stream.py
+import os
+import time
+import numpy as np
+import pandas as pd
+from src.instrument import instrumented
+from src.model import CAT_FEATURES, MODEL_EXTENSIONS, load_model, scoring_features
+
+LGBM_PARAMS = {"objective": "regression", "num_leaves": 31, "verbose": -1}
+MANIFEST_COLUMNS = ["version", "path", "created", "last_date", "n_rows", "n_rounds",
+                    "fit_seconds", "test_mae", "test_rmse", "promo5_mae", "promo5_rmse"]
+
+def stream_features(df, FEATURES, model_name=None):
+    return scoring_features(df, FEATURES, model_name), df["Quantity"]
+
+def fit_rounds(model_name, X, y, n_rounds, init=None, learning_rate=0.1):
+    """Boost `n_rounds` trees on (X, y), continuing from checkpoint `init` (path or model) when given."""
+    if model_name == "LGBM":
+        import lightgbm as lgb
+        return lgb.train({**LGBM_PARAMS, "learning_rate": learning_rate},
+                         lgb.Dataset(X, y, categorical_feature=CAT_FEATURES),
+                         num_boost_round=n_rounds, init_model=init)
+    if model_name == "XGB":
+        from xgboost import XGBRegressor
+        model = XGBRegressor(objective="reg:squarederror", n_estimators=n_rounds, learning_rate=learning_rate,
+                             enable_categorical=True, verbosity=0)
+        return model.fit(X, y, xgb_model=init)
+    if model_name == "CATBOOST":
+        from catboost import CatBoostRegressor
+        model = CatBoostRegressor(iterations=n_rounds, learning_rate=learning_rate, depth=6,
+                                  loss_function='RMSE', verbose=0, cat_features=CAT_FEATURES)
+        return model.fit(X, y, init_model=init)
+    raise ValueError(f"Unsupported model: {model_name}")
+
+def stream_dir(models_dir, model_name):
+    return os.path.join(models_dir, "stream", model_name)
+
+def read_manifest(models_dir, model_name):
+    path = os.path.join(stream_dir(models_dir, model_name), "manifest.csv")
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=MANIFEST_COLUMNS)
+    return pd.read_csv(path, parse_dates=["last_date"])
+
+def save_checkpoint(model, model_name, models_dir, last_date, n_rows, n_rounds, fit_seconds, metrics):
+    """Write the next versioned checkpoint and append it to the manifest."""
+    directory = stream_dir(models_dir, model_name)
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(models_dir, model_name)
+    version = int(manifest["version"].max()) + 1 if len(manifest) else 0
+    path = os.path.join(directory, f"v{version:04d}.{MODEL_EXTENSIONS[model_name]}")
+    model.save_model(path)
+    row = {"version": version, "path": path, "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+           "last_date": last_date, "n_rows": n_rows, "n_rounds": n_rounds,
+           "fit_seconds": fit_seconds, **metrics}
+    manifest = pd.concat([manifest, pd.DataFrame([row])], ignore_index=True) if len(manifest) else pd.DataFrame([row])
+    manifest.to_csv(os.path.join(directory, "manifest.csv"), index=False)
+    return path
+
+def score(model, X, y):
+    from sklearn.metrics import mean_absolute_error, root_mean_squared_error
+    if len(y) == 0:
+        return np.full(0, np.nan), np.nan, np.nan
+    pred = model.predict(X)
+    return pred, mean_absolute_error(y, pred), root_mean_squared_error(y, pred)
+
+@instrumented(rows_from=("sales_full", "sales_b"))
+def stream_model(sales_full, sales_b, sales_b_promo5, FEATURES, models_dir,
+                 model_name="LGBM", n_rounds=20, base_rounds=100, learning_rate=0.02):
+    """Continue boosting the latest checkpoint on rows newer than it; full fit if none exists."""
+    print("\n" + "="*50)
+    print("   🔁 Updating Stream Model...   ")
+    print("="*50 + "\n")
+    manifest = read_manifest(models_dir, model_name)
+    X_test, y_test = stream_features(sales_b, FEATURES, model_name)
+    X_promo5, y_promo5 = stream_features(sales_b_promo5, FEATURES, model_name)
+    last_date = sales_full["Date"].max()
+
+    if len(manifest):
+        latest = manifest.iloc[-1]
+        new_rows = sales_full[sales_full["Date"] > latest["last_date"]]
+        if new_rows.empty:
+            print(f"   No rows after {latest['last_date']:%Y-%m-%d}; reusing v{int(latest['version']):04d}.")
+            model = load_model(model_name, latest["path"])
+            rounds, fit_seconds = 0, 0.0
+        else:
+            X_new, y_new = stream_features(new_rows, FEATURES, model_name)
+            start = time.perf_counter()
+            model = fit_rounds(model_name, X_new, y_new, n_rounds, init=latest["path"], learning_rate=learning_rate)
+            fit_seconds = time.perf_counter() - start
+            rounds = n_rounds
+            print(f"   +{n_rounds} rounds on {len(new_rows):,} new rows in {fit_seconds:.2f}s")
+    else:
+        new_rows = sales_full
+        X_all, y_all = stream_features(sales_full, FEATURES, model_name)
+        start = time.perf_counter()
+        model = fit_rounds(model_name, X_all, y_all, base_rounds)
+        fit_seconds = time.perf_counter() - start
+        rounds = base_rounds
+        print(f"   No checkpoint found; base fit of {base_rounds} rounds on {len(sales_full):,} rows "
+              f"in {fit_seconds:.2f}s")
+
+    y_test_pred, test_mae, test_rmse = score(model, X_test, y_test)
+    y_promo5_pred, promo5_mae, promo5_rmse = score(model, X_promo5, y_promo5)
+    metrics = {"test_mae": test_mae, "test_rmse": test_rmse, "promo5_mae": promo5_mae, "promo5_rmse": promo5_rmse}
+    if rounds:
+        path = save_checkpoint(model, model_name, models_dir, last_date, len(new_rows), rounds, fit_seconds, metrics)
+        print(f"   💾 Checkpoint saved to {path}")
+
+    print("\n" + "="*50)
+    print(f"   📈 {model_name} Stream Model Results:")
+    print("="*50)
+    print(f"   Test MAE:         {test_mae:.4f}")
+    print(f"   Test RMSE:        {test_rmse:.4f}")
+    print(f"   Test Promo5 MAE:  {promo5_mae:.4f}")
+    print(f"   Test Promo5 RMSE: {promo5_rmse:.4f}")
+    print("="*50 + "\n")
+
+    sales_b["PredictedQuantity"] = y_test_pred
+    sales_b_promo5["PredictedQuantity"] = y_promo5_pred
+    return model, sales_b, sales_b_promo5
+
+@instrumented(rows_from=("sales_full",))
+def benchmark_stream(sales_full, sales_b, FEATURES, results_dir, model_name="LGBM",
+                     n_days=7, n_rounds=20, base_rounds=100, learning_rate=0.02):
+    """Replay the last `n_days` of history one day at a time: warm-start update vs. full refit."""
+    print("\n" + "="*50)
+    print("   ⏱️  Benchmarking Incremental vs. Full Retrain...   ")
+    print("="*50 + "\n")
+    days = np.sort(sales_full["Date"].unique())[-n_days:]
+    X_test, y_test = stream_features(sales_b, FEATURES, model_name)
+    history = sales_full[sales_full["Date"] < days[0]]
+    X_hist, y_hist = stream_features(history, FEATURES, model_name)
+    incremental = fit_rounds(model_name, X_hist, y_hist, base_rounds)
+
+    rows = []
+    for day in days:
+        day_rows = sales_full[sales_full["Date"] == day]
+        X_day, y_day = stream_features(day_rows, FEATURES, model_name)
+
+        start = time.perf_counter()
+        incremental = fit_rounds(model_name, X_day, y_day, n_rounds, init=incremental, learning_rate=learning_rate)
+        inc_seconds = time.perf_counter() - start
+
+        X_all, y_all = stream_features(sales_full[sales_full["Date"] <= day], FEATURES, model_name)
+        start = time.perf_counter()
+        full = fit_rounds(model_name, X_all, y_all, base_rounds)
+        full_seconds = time.perf_counter() - start
+
+        _, inc_mae, inc_rmse = score(incremental, X_test, y_test)
+        _, full_mae, full_rmse = score(full, X_test, y_test)
+        rows.append({"date": pd.Timestamp(day), "new_rows": len(day_rows), "history_rows": len(y_all),
+                     "incremental_seconds": inc_seconds, "full_seconds": full_seconds,
+                     "incremental_test_mae": inc_mae, "full_test_mae": full_mae,
+                     "incremental_test_rmse": inc_rmse, "full_test_rmse": full_rmse})
+
+    report = pd.DataFrame(rows)
+    os.makedirs(results_dir, exist_ok=True)
+    report.to_csv(os.path.join(results_dir, f"{model_name}_stream_benchmark.csv"), index=False)
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    print(f"\n   Mean speed-up: {report['full_seconds'].mean() / report['incremental_seconds'].mean():.1f}x")
+    return report
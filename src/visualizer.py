@@ -1,105 +1,216 @@
 import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
-import pandas as pd
-import lightgbm as lgb
+from src.config import PLOT_STYLE
+from src.instrument import instrumented
+
+CLUSTER_ORDER = ["Slow", "Medium", "Fast"]
+RETURN_DAYS = 50
+FIGURES = [
+    "sales_over_time", "cluster_distribution", "return_rate",
+    "item_cluster_scatter", "store_cluster_scatter", "top_item_lift", "top_store_lift",
+    "item_cluster_lift", "store_cluster_lift", "feature_importance",
+]
+
+def downsample(series, max_points=2000):
+    """Keep each bucket's min and max so peaks survive; a no-op for series of <= max_points."""
+    if max_points is None or len(series) <= max_points:
+        return series
+    values = series.to_numpy()
+    bounds = np.linspace(0, len(values), max_points // 2 + 1).astype(int)
+    keep = set()
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if hi > lo:
+            keep.update((lo + int(np.argmin(values[lo:hi])), lo + int(np.argmax(values[lo:hi]))))
+    return series.iloc[sorted(keep)]
+
+def promo_means(df, col):
+    """Mean Quantity per `col` value, columns False (non-promotion) and True (promotion)."""
+    means = df.groupby([col, "Promotion"])["Quantity"].mean().unstack()
+    return means.reindex(columns=[False, True])
+
+def feature_importance(model):
+    """Split importance per feature of an LGBMRegressor or Booster, as plot_importance shows it."""
+    booster = getattr(model, "booster_", model)
+    return pd.Series(booster.feature_importance(importance_type="split"), index=booster.feature_name())
+
+def figure_inputs(names, sales_full, sales_b, promos1to4, promo5, item_clusters, store_clusters,
+                  model, model_name, FEATURE_ENGINEERING, max_points=2000, lift_cube=None, tensor=None,
+                  stats=None):
+    """Small, picklable per-figure inputs; each groupby over the full frames runs at most once,
+    and not at all when precomputed aggregates of sales_full are given: `lift_cube` for the
+    lift plots, `stats` (SalesStats) for the cluster counts and `tensor` for the daily totals."""
+    means = {}
+
+    def group_means(col):
+        if col not in means:
+            means[col] = lift_cube.means(col) if lift_cube is not None else promo_means(sales_full, col)
+        return means[col]
+
+    inputs = {}
+    for name in names:
+        if name == "sales_over_time":
+            test = sales_b.groupby("Date")[["Quantity", "PredictedQuantity"]].sum()
+            inputs[name] = {
+                "train": downsample(tensor.daily_totals() if tensor is not None
+                                    else sales_full.groupby("Date")["Quantity"].sum(), max_points),
+                "test": downsample(test["Quantity"], max_points),
+                "pred": downsample(test["PredictedQuantity"], max_points),
+                "promos": promos1to4[["StartDate", "EndDate"]].reset_index(drop=True),
+                "promo5": (promo5["StartDate"], promo5["EndDate"]),
+            }
+        elif name == "cluster_distribution":
+            if stats is not None:
+                train = stats.group(item=item_clusters.rename("ItemCluster"))["count"].astype(np.int64)
+            else:
+                train = sales_full["ItemCluster"].value_counts()
+            inputs[name] = {split: counts.reindex(CLUSTER_ORDER, fill_value=0)
+                            for split, counts in (("Train", train), ("Test", sales_b["ItemCluster"].value_counts()))}
+        elif name == "return_rate" and FEATURE_ENGINEERING:
+            returns = (-sales_full["Quantity"]).clip(lower=0)
+            inputs[name] = returns.groupby(sales_full["PromoStartLag"]).sum().iloc[:RETURN_DAYS]
+        elif name in ("item_cluster_scatter", "store_cluster_scatter"):
+            group = "Item" if name.startswith("item") else "Store"
+            cluster_map = item_clusters if group == "Item" else store_clusters
+            avg = group_means(group)[False].dropna().rename("Quantity").reset_index()
+            avg["Cluster"] = avg[group].map(cluster_map)
+            inputs[name] = (group, avg)
+        elif name in ("top_item_lift", "top_store_lift"):
+            col = "Item" if name == "top_item_lift" else "Store"
+            merged = group_means(col).dropna()
+            top = pd.DataFrame({col: merged.index, "PromotionLift": (merged[True] - merged[False]).to_numpy()})
+            inputs[name] = (col, top.sort_values("PromotionLift", ascending=False).head(20))
+        elif name in ("item_cluster_lift", "store_cluster_lift"):
+            col = "ItemCluster" if name.startswith("item") else "StoreCluster"
+            inputs[name] = group_means(col).assign(Lift=lambda x: x[True] - x[False])
+        elif name == "feature_importance" and model_name == "LGBM":
+            inputs[name] = (model_name, feature_importance(model))
+    return inputs
+
+def plot_sales_over_time(data, figs_dir):
+    plt.figure(figsize=(14, 6))
+    plt.plot(data["train"].index, data["train"].values, label="Train (Jan - Aug)", color="steelblue")
+    plt.plot(data["test"].index, data["test"].values, label="Test (Sept - Dec)", color="darkorange")
+    plt.plot(data["pred"].index, data["pred"].values, label="Predicted Test (Sept - Dec)", color="seagreen", linestyle='--')
+    for i, promo in data["promos"].iterrows():
+        plt.axvspan(promo["StartDate"], promo["EndDate"], color='blue', alpha=0.2,
+                    label="Promo 1-4 Period" if i == 0 else None)
+    plt.axvspan(*data["promo5"], color='red', alpha=0.2)
+    plt.title("Sales Quantity Over Time")
+    plt.xlabel("Date"); plt.ylabel("Total Quantity")
+    plt.legend(); plt.grid(True); plt.tight_layout()
+    return os.path.join(figs_dir, "sales_quantity_over_time.png")
 
-def visualize_all(sales_full, sales_b, promos1to4, promo5, product_groups, item_clusters, store_clusters, figs_dir, model, model_name, FEATURE_ENGINEERING):
+def plot_cluster_distribution(counts, figs_dir):
+    fig, axs = plt.subplots(1, 2, figsize=(14, 4))
+    for ax, (split, split_counts) in zip(axs, counts.items()):
+        sns.barplot(x=split_counts.index, y=split_counts.values, order=CLUSTER_ORDER, ax=ax)
+        ax.set_xlabel("ItemCluster"); ax.set_ylabel("count"); ax.set_title(split)
+    plt.tight_layout()
+    return os.path.join(figs_dir, "item_clusters_distribution.png")
+
+def plot_return_rate(total_return, figs_dir):
+    plt.figure(figsize=(12, 6)); total_return.plot(kind='bar', color='#d95f02')
+    plt.yscale("log"); plt.xlabel("Promo Start Lag (days)"); plt.ylabel("Total Return (log)")
+    plt.xticks(ticks=range(0, RETURN_DAYS - 1, 5), labels=range(0, RETURN_DAYS - 1, 5))
+    plt.tight_layout()
+    return os.path.join(figs_dir, "total_return_rate.png")
+
+def plot_cluster_scatter(data, figs_dir):
+    group, avg = data
+    avg = avg.sort_values("Quantity").reset_index(drop=True)
+    q33, q66 = avg["Quantity"].quantile([0.33, 0.66])
+    plt.figure(figsize=(10, 10))
+    sns.scatterplot(x=range(len(avg)), y="Quantity", data=avg, hue="Cluster", palette="Set1")
+    plt.axhline(y=q33, color="gray", linestyle="--")
+    plt.axhline(y=q66, color="black", linestyle="--")
+    plt.yscale("log"); plt.tight_layout()
+    return os.path.join(figs_dir, f"{group.lower()}_cluster_scatter.png")
+
+def plot_top_lift(data, figs_dir):
+    col, top = data
+    plt.figure(figsize=(10, 10))
+    sns.barplot(data=top, x=col, y="PromotionLift", palette="viridis", order=top[col])
+    plt.xticks(rotation=45); plt.tight_layout()
+    return os.path.join(figs_dir, f"top_{col.lower()}_lift.png")
+
+def plot_lift_by_cluster(cluster_lift, figs_dir):
+    cluster_type = cluster_lift.index.name.replace("Cluster", "")
+    plt.figure(figsize=(10, 6))
+    sns.barplot(x=cluster_lift.index, y="Lift", data=cluster_lift.reset_index(), palette="viridis")
+    plt.xlabel(f"{cluster_type} Cluster"); plt.ylabel("Avg Promotion Lift")
+    plt.tight_layout()
+    return os.path.join(figs_dir, f"lift_{cluster_type.lower()}_cluster.png")
+
+def plot_feature_importance(data, figs_dir, max_num_features=30):
+    # Same layout as lightgbm.plot_importance, without shipping the model to a worker
+    model_name, importance = data
+    importance = importance[importance > 0].sort_values().tail(max_num_features)
+    _, ax = plt.subplots(figsize=(12, 6))
+    ylocs = np.arange(len(importance))
+    ax.barh(ylocs, importance.values, align="center", height=0.2)
+    for x, y in zip(importance.values, ylocs):
+        ax.text(x + 1, y, str(int(x)), va="center")
+    ax.set_yticks(ylocs); ax.set_yticklabels(importance.index)
+    ax.set_xlim(0, importance.max() * 1.1 if len(importance) else 1); ax.set_ylim(-1, len(importance))
+    ax.set_title("Feature importance"); ax.set_xlabel("Feature importance"); ax.set_ylabel("Features")
+    plt.tight_layout()
+    return os.path.join(figs_dir, f"{model_name}_feature_importance.png")
+
+RENDERERS = {
+    "sales_over_time": plot_sales_over_time, "cluster_distribution": plot_cluster_distribution,
+    "return_rate": plot_return_rate, "item_cluster_scatter": plot_cluster_scatter,
+    "store_cluster_scatter": plot_cluster_scatter, "top_item_lift": plot_top_lift,
+    "top_store_lift": plot_top_lift, "item_cluster_lift": plot_lift_by_cluster,
+    "store_cluster_lift": plot_lift_by_cluster, "feature_importance": plot_feature_importance,
+}
+
+def use_agg():
+    """Pool initializer (and in-process setup): figures are only ever saved, and workers have no display."""
+    matplotlib.use("Agg")
+
+def render_figure(task):
+    name, data, figs_dir = task
+    plt.rcParams.update(PLOT_STYLE)
+    path = RENDERERS[name](data, figs_dir)
+    plt.savefig(path)
+    plt.close("all")
+    return path
+
+@instrumented(rows_from=("sales_full", "sales_b"))
+def visualize_all(sales_full, sales_b, promos1to4, promo5, product_groups, item_clusters, store_clusters, figs_dir,
+                  model, model_name, FEATURE_ENGINEERING, figures=None, n_workers=None, max_points=2000,
+                  lift_cube=None, tensor=None, stats=None):
+    """Render the selected FIGURES (all by default) from pre-aggregated inputs, in a process pool
+    when `n_workers` allows more than one; returns the item cluster lift table."""
     print("\n" + "="*40)
     print("   📊 Visualizing Data...   ")
     print("="*40 + "\n")
+    names = FIGURES if figures is None else list(figures)
+    unknown = sorted(set(names) - set(FIGURES))
+    if unknown:
+        raise ValueError(f"Unknown figures {unknown}. Options: {', '.join(FIGURES)}")
     os.makedirs(figs_dir, exist_ok=True)
-    
-    # Plot 1: Total Sales Over Time
-    def plot_sales_over_time():
-        plt.figure(figsize=(14, 6))
-        sales_full_daily = sales_full.groupby("Date")["Quantity"].sum()
-        sales_b_daily = sales_b.groupby("Date")["Quantity"].sum()
-        sales_b_daily_pred = sales_b.groupby("Date")["PredictedQuantity"].sum()
-        plt.plot(sales_full_daily.index, sales_full_daily.values, label="Train (Jan - Aug)", color="steelblue")
-        plt.plot(sales_b_daily.index, sales_b_daily.values, label="Test (Sept - Dec)", color="darkorange")
-        plt.plot(sales_b_daily_pred.index, sales_b_daily_pred.values, label="Predicted Test (Sept - Dec)", color="seagreen", linestyle='--')
-        promo1to4_label_added = False  # flag to add label only once
-        for _, promo in promos1to4.iterrows():
-            label = f"Promo 1-4 Period" if not promo1to4_label_added else None
-            plt.axvspan(promo["StartDate"], promo["EndDate"], color='blue', alpha=0.2, label=label)
-            promo1to4_label_added = True
-        plt.axvspan(promo5["StartDate"], promo5["EndDate"], color='red', alpha=0.2)
-        plt.title("Sales Quantity Over Time")
-        plt.xlabel("Date"); plt.ylabel("Total Quantity")
-        plt.legend(); plt.grid(True); plt.tight_layout()
-        plt.savefig(os.path.join(figs_dir, "sales_quantity_over_time.png"))
-
-    # Plot 2: Cluster Distributions
-    def plot_item_cluster_dist():
-        fig, axs = plt.subplots(1, 2, figsize=(14, 4))
-        sns.countplot(data=sales_full, x="ItemCluster", order=["Slow", "Medium", "Fast"], ax=axs[0])
-        axs[0].set_title("Train"); sns.countplot(data=sales_b, x="ItemCluster", order=["Slow", "Medium", "Fast"], ax=axs[1])
-        axs[1].set_title("Test"); plt.tight_layout()
-        plt.savefig(os.path.join(figs_dir, "item_clusters_distribution.png"))
-
-    # Plot 3: Return Rate
-    def plot_return_rate(days_num = 50):
-        if not FEATURE_ENGINEERING:
-            return
-        sales_full["TotalReturn"] = sales_full["Quantity"].apply(lambda x: -x if x < 0 else 0)
-        total_return = sales_full.groupby("PromoStartLag")["TotalReturn"].sum().iloc[:days_num]
-        plt.figure(figsize=(12, 6)); total_return.plot(kind='bar', color='#d95f02')
-        plt.yscale("log"); plt.xlabel("Promo Start Lag (days)"); plt.ylabel("Total Return (log)")
-        plt.xticks(ticks=range(0, days_num-1, 5), labels=range(0, days_num-1, 5))
-        plt.tight_layout(); plt.savefig(os.path.join(figs_dir, "total_return_rate.png"))
-
-    # Cluster Visualization
-    def plot_cluster_scatter(df, group, cluster_map):
-        avg = df[df["Promotion"] == False].groupby(group)["Quantity"].mean().reset_index()
-        avg["Cluster"] = avg[group].map(cluster_map)
-        avg = avg.sort_values("Quantity").reset_index(drop=True)
-        q33, q66 = avg["Quantity"].quantile([0.33, 0.66])
-        plt.figure(figsize=(10, 10))
-        sns.scatterplot(x=range(len(avg)), y="Quantity", data=avg, hue="Cluster", palette="Set1")
-        plt.axhline(y=q33, color="gray", linestyle="--")
-        plt.axhline(y=q66, color="black", linestyle="--")
-        plt.yscale("log"); plt.tight_layout()
-        plt.savefig(os.path.join(figs_dir, f"{group.lower()}_cluster_scatter.png"))
-
-    # Lift Visuals
-    def compute_and_plot_lift(col):
-        avg = sales_full[sales_full["Promotion"] == False].groupby(col)["Quantity"].mean().reset_index(name="NonPromoAvg")
-        avg_promo = sales_full[sales_full["Promotion"] == True].groupby(col)["Quantity"].mean().reset_index(name="PromoAvg")
-        merged = pd.merge(avg, avg_promo, on=col, how="inner")
-        merged["PromotionLift"] = merged["PromoAvg"] - merged["NonPromoAvg"]
-        top = merged.sort_values("PromotionLift", ascending=False).head(20)
-        plt.figure(figsize=(10, 10))
-        sns.barplot(data=top, x=col, y="PromotionLift", palette="viridis", order=top[col])
-        plt.xticks(rotation=45); plt.tight_layout()
-        plt.savefig(os.path.join(figs_dir, f"top_{col.lower()}_lift.png"))
-
-    # Cluster Lift Plots
-    def plot_lift_by_cluster(cluster_type, cluster_lift):
-        plt.figure(figsize=(10, 6))
-        sns.barplot(x=cluster_lift.index, y="Lift", data=cluster_lift.reset_index(), palette="viridis")
-        plt.xlabel(f"{cluster_type} Cluster"); plt.ylabel("Avg Promotion Lift")
-        plt.tight_layout(); plt.savefig(os.path.join(figs_dir, f"lift_{cluster_type.lower()}_cluster.png"))
-
-    # Feature Importance
-    def plot_feature_importance(model, model_name):
-        if model_name == "LGBM":
-            lgb.plot_importance(model, max_num_features=30, grid=False, figsize=(12, 6))
-            plt.tight_layout(); plt.savefig(os.path.join(figs_dir, f"{model_name}_feature_importance.png"))
-
-    # Execute
-    plot_sales_over_time()
-    plot_item_cluster_dist()
-    plot_return_rate()
-    plot_cluster_scatter(sales_full, "Item", item_clusters)
-    plot_cluster_scatter(sales_full, "Store", store_clusters)
-    compute_and_plot_lift("Item")
-    compute_and_plot_lift("Store")
-
-    item_cluster_lift = sales_full.groupby(["ItemCluster", "Promotion"])["Quantity"].mean().unstack().assign(Lift=lambda x: x[True] - x[False])
-    store_cluster_lift = sales_full.groupby(["StoreCluster", "Promotion"])["Quantity"].mean().unstack().assign(Lift=lambda x: x[True] - x[False])
-    plot_lift_by_cluster("Item", item_cluster_lift)
-    plot_lift_by_cluster("Store", store_cluster_lift)
-    plot_feature_importance(model, model_name)
 
+    inputs = figure_inputs(names, sales_full, sales_b, promos1to4, promo5, item_clusters, store_clusters,
+                           model, model_name, FEATURE_ENGINEERING, max_points, lift_cube, tensor,
+                           stats)
+    tasks = [(name, inputs[name], figs_dir) for name in names if name in inputs]
+    n_workers = max(1, min(n_workers or os.cpu_count() or 1, len(tasks)))
+    if n_workers == 1:
+        use_agg()
+        paths = [render_figure(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(n_workers, mp_context=mp.get_context("spawn"), initializer=use_agg) as pool:
+            paths = list(pool.map(render_figure, tasks))
+    print(f"   Rendered {len(paths)} figures with {n_workers} worker(s) into {figs_dir}")
+
+    item_cluster_lift = inputs.get("item_cluster_lift")
+    if item_cluster_lift is None:
+        item_cluster_lift = promo_means(sales_full, "ItemCluster").assign(Lift=lambda x: x[True] - x[False])
     return item_cluster_lift
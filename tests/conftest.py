@@ -0,0 +1,23 @@
+# tests/conftest.py
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def sales():
+    """Small tagged sales frame: 3 stores x 4 items over 60 days, with gaps, returns and promo runs."""
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2015-01-01", periods=60, freq="D")
+    rows = [(d, s, i) for s in range(1, 4) for i in range(1, 5) for d in days if rng.random() < 0.7]
+    df = pd.DataFrame(rows, columns=["Date", "Store", "Item"])
+    df["Quantity"] = rng.integers(-2, 12, len(df))
+    in_promo = ((df["Date"] >= "2015-01-10") & (df["Date"] <= "2015-01-17")) | \
+               ((df["Date"] >= "2015-02-05") & (df["Date"] <= "2015-02-12") & (df["Store"] != 2))
+    df["Promotion"] = in_promo.to_numpy()
+    return df.sort_values("Date", kind="stable").reset_index(drop=True)
@@ -0,0 +1,24 @@
+# tests/test_backtest.py
+import numpy as np
+import pandas as pd
+from src.backtest import WINDOWS, fold_frames, shift_windows
+from src.feature_engineering import SORT_KEYS, add_features_vectorized
+
+def test_windows_exclude_the_current_row(sales):
+    got = shift_windows(add_features_vectorized(sales.copy()))
+    expected = sales.sort_values(by=SORT_KEYS, kind="stable")
+    for col, window in WINDOWS.items():
+        ref = expected.groupby(["Store", "Item"])["Quantity"].transform(
+            lambda x: x.shift(1).rolling(window, 1).mean())
+        assert np.allclose(got[col], ref.loc[got.index], equal_nan=True)
+
+def test_test_rows_do_not_see_their_target(sales):
+    df = shift_windows(add_features_vectorized(sales.copy()))
+    promo = pd.Series({"StartDate": pd.Timestamp("2015-02-05"), "EndDate": pd.Timestamp("2015-02-12")})
+    _, test = fold_frames(df, promo)
+    changed = df.copy()
+    changed.loc[test.index, "Quantity"] += 100
+    _, test_changed = fold_frames(shift_windows(changed), promo)
+    first = test.groupby(["Store", "Item"]).head(1).index
+    for col in WINDOWS:
+        assert np.allclose(test.loc[first, col], test_changed.loc[first, col], equal_nan=True)
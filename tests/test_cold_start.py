@@ -0,0 +1,40 @@
+# tests/test_cold_start.py
+import os
+import sys
+import json
+import time
+import subprocess
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["lightgbm", "xgboost", "catboost", "sklearn"]
+SUBCOMMANDS = ["load", "features", "train", "plot", "score", "simulate"]
+# Generous: `--help` takes about 0.6s here, importing the boosting backends alone about 2.4s
+HELP_SECONDS = 2.0
+
+def loaded_heavy_modules(code):
+    """Heavy modules in sys.modules after running `code` in a fresh interpreter at the repo root."""
+    probe = code + f"\nimport json, sys\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_import_main_is_light():
+    assert loaded_heavy_modules("import main") == []
+
+@pytest.mark.parametrize("command", [None] + SUBCOMMANDS)
+def test_help_is_light(command):
+    argv = ["main.py"] + ([command] if command else []) + ["--help"]
+    code = ("import runpy, sys\n"
+            f"sys.argv = {argv!r}\n"
+            "try:\n"
+            "    runpy.run_path('main.py', run_name='__main__')\n"
+            "except SystemExit as exc:\n"
+            "    assert exc.code == 0, exc.code")
+    assert loaded_heavy_modules(code) == []
+
+@pytest.mark.parametrize("command", [None] + SUBCOMMANDS)
+def test_help_is_fast(command):
+    argv = [sys.executable, "main.py"] + ([command] if command else []) + ["--help"]
+    start = time.perf_counter()
+    subprocess.run(argv, cwd=ROOT, capture_output=True, check=True)
+    assert time.perf_counter() - start < HELP_SECONDS
@@ -0,0 +1,23 @@
+# tests/test_data_loader.py
+import pandas as pd
+from src.data_loader import read_promotions
+
+def test_promotion_dates_are_parsed_by_period(tmp_path):
+    # Store-scoped rows: more than four in each block, and the blocks interleaved
+    rows = ["Period,StartDate,EndDate,Store"]
+    rows += [f"Promo{p},2/10/2015,2/17/2015,{s}" for p in (1, 2) for s in (1, 2, 3)]
+    rows += [f"Promo5 ,1/9/2015,6/9/2015,{s}" for s in (1, 2, 3)]
+    rows += ["Promo3,5/24/2015,6/1/2015,", "Promo6,20/11/2015,27/11/2015,", "Promo4,6/21/2015,6/28/2015,",
+             "Promo6,13/11/2015,19/11/2015,4"]
+    path = tmp_path / "PromotionDates.csv"
+    path.write_text("\n".join(rows) + "\n")
+
+    promos = read_promotions(str(path))
+    assert len(promos) == len(rows) - 1
+    starts = promos.groupby("Period")["StartDate"].unique()
+    assert list(starts["Promo1"]) == [pd.Timestamp("2015-02-10")]
+    assert list(starts["Promo4"]) == [pd.Timestamp("2015-06-21")]
+    assert list(starts["Promo5"]) == [pd.Timestamp("2015-09-01")]
+    assert sorted(starts["Promo6"]) == [pd.Timestamp("2015-11-13"), pd.Timestamp("2015-11-20")]
+    assert promos.loc[promos["Period"] == "Promo5", "EndDate"].eq(pd.Timestamp("2015-09-06")).all()
+    assert promos["Store"].isna().sum() == 3
@@ -0,0 +1,12 @@
+# tests/test_feature_engineering.py
+import pandas as pd
+import pytest
+from src.feature_engineering import add_features_groupby, add_features_vectorized
+
+@pytest.mark.parametrize("order", ["sorted", "shuffled"])
+def test_vectorized_matches_groupby(sales, order):
+    if order == "shuffled":
+        sales = sales.sample(frac=1, random_state=1)
+    expected = add_features_groupby(sales.copy())
+    got = add_features_vectorized(sales.copy())
+    pd.testing.assert_frame_equal(got, expected)
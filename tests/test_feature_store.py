@@ -0,0 +1,9 @@
+# tests/test_feature_store.py
+import pytest
+from src.feature_store import FEATURE_COLUMNS, replay_check
+
+@pytest.mark.parametrize("batch_days, snapshot", [(1, False), (7, True)])
+def test_replay_matches_engineer_features(sales, tmp_path, batch_days, snapshot):
+    diffs = replay_check(sales, batch_days, str(tmp_path / "snapshot") if snapshot else None)
+    assert list(diffs.index) == FEATURE_COLUMNS
+    assert (diffs == 0).all(), diffs[diffs != 0].to_dict()
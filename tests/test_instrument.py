@@ -0,0 +1,42 @@
+# tests/test_instrument.py
+import sys
+import warnings
+import pandas as pd
+import pytest
+from src import instrument
+from src.instrument import instrumented
+
+@pytest.fixture
+def trace(monkeypatch):
+    monkeypatch.setattr(instrument, "TRACE", [])
+    monkeypatch.setitem(instrument.SETTINGS, "quiet", False)
+    return instrument.TRACE
+
+def test_rows_in_counts_only_the_declared_frames(trace, sales):
+    @instrumented(rows_from=("sales_full", "sales_b"))
+    def forecast(sales_full, sales_b, sales_b_promo5, lookup):
+        return sales_b_promo5
+
+    promo = sales[sales["Promotion"]]
+    forecast(sales, sales.head(10), promo, lookup=pd.DataFrame({"x": range(1000)}))
+    assert trace[-1]["rows_in"] == len(sales) + 10
+    assert trace[-1]["rows_out"] == len(promo)
+
+def test_unknown_rows_from_argument_is_rejected():
+    with pytest.raises(ValueError):
+        instrumented(rows_from=("sales",))(lambda df: df)
+
+def test_quiet_mode_keeps_stderr_and_warnings(trace, monkeypatch, capsys):
+    monkeypatch.setitem(instrument.SETTINGS, "quiet", True)
+
+    @instrumented(rows_from=())
+    def noisy():
+        print("banner")
+        print("problem", file=sys.stderr)
+        warnings.warn("careful")
+
+    with pytest.warns(UserWarning, match="careful"):
+        noisy()
+    out, err = capsys.readouterr()
+    assert "banner" not in out
+    assert "problem" in err
@@ -0,0 +1,28 @@
+# tests/test_metrics.py
+import numpy as np
+import pandas as pd
+from src.metrics import SegmentMetrics, error_metrics
+
+def test_non_finite_predictions_are_dropped_and_counted():
+    df = pd.DataFrame({"Store": [1, 1, 2, 2], "Quantity": [1.0, 2.0, 3.0, 4.0],
+                       "PredictedQuantity": [1.0, 2.0, np.nan, 5.0]})
+    metrics = SegmentMetrics(levels=["Store"]).update(df)
+    assert metrics.dropped == 1
+    overall = metrics.overall()
+    assert overall["n"] == 3
+    assert np.isclose(overall["mae"], 1 / 3)
+    table = metrics.table().set_index(["level", "segment"])
+    assert table.loc[("Store", 2), "n"] == 1
+    assert np.isclose(table.loc[("Store", 2), "mae"], 1.0)
+
+def test_error_metrics_match_finite_rows():
+    got = error_metrics([1, 2, 3, 4], [1, 2, np.inf, 5])
+    expected = error_metrics([1, 2, 4], [1, 2, 5])
+    assert got == expected
+
+def test_merge_adds_dropped_counts():
+    a = SegmentMetrics(levels=[]).update(pd.DataFrame({"Quantity": [1.0], "PredictedQuantity": [np.nan]}))
+    b = SegmentMetrics(levels=[]).update(pd.DataFrame({"Quantity": [2.0], "PredictedQuantity": [1.0]}))
+    merged = a.merge(b)
+    assert merged.dropped == 1
+    assert merged.overall()["n"] == 1
@@ -0,0 +1,101 @@
+# tests/test_serving.py
+import json
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pandas as pd
+import pytest
+from src.serving import MicroBatcher, TCPHTTPServer, make_handler
+
+class FailingModel:
+    def predict(self, X):
+        raise RuntimeError("backend failure")
+
+class BatchedScorer:
+    """Scorer stand-in: rows go through a real MicroBatcher into `model`."""
+
+    def __init__(self, model):
+        self.batcher = MicroBatcher(model.predict, batch_size=16, max_wait_ms=1.0)
+
+    def prepare(self, rows):
+        return pd.DataFrame(rows)
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(scorer):
+        httpd = TCPHTTPServer(("127.0.0.1", 0), make_handler(scorer))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return f"http://127.0.0.1:{httpd.server_address[1]}"
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+def post(url, payload):
+    request = urllib.request.Request(url + "/predict", data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.loads(exc.read())
+
+def test_predict_errors_return_json_500(server):
+    status, body = post(server(BatchedScorer(FailingModel())), {"rows": [{"Store": 1, "Item": 2}]})
+    assert status == 500
+    assert "backend failure" in body["error"]
+
+def test_predictions_round_trip(server):
+    class Doubler:
+        def predict(self, X):
+            return np.asarray(X["Item"], dtype=float) * 2
+
+    status, body = post(server(BatchedScorer(Doubler())), {"rows": [{"Store": 1, "Item": 2}, {"Store": 1, "Item": 5}]})
+    assert status == 200
+    assert body["predictions"] == [4.0, 10.0]
+
+def test_predict_value_errors_are_500_not_400(server):
+    class Rejecting:
+        def predict(self, X):
+            raise ValueError("feature mismatch")
+
+    status, body = post(server(BatchedScorer(Rejecting())), {"rows": [{"Store": 1, "Item": 2}]})
+    assert status == 500
+    assert "feature mismatch" in body["error"]
+
+def test_malformed_payload_is_400(server):
+    status, _ = post(server(BatchedScorer(FailingModel())), {"no_rows": []})
+    assert status == 400
+
+def test_failed_batch_only_fails_the_offending_request():
+    class RejectsNegativeItems:
+        def predict(self, X):
+            if (X["Item"] < 0).any():
+                raise ValueError("negative item")
+            return np.asarray(X["Item"], dtype=float)
+
+    batcher = MicroBatcher(RejectsNegativeItems().predict, batch_size=16, max_wait_ms=200.0)
+    results = {}
+
+    def submit(name, items):
+        try:
+            results[name] = batcher.submit(pd.DataFrame({"Item": items}))
+        except ValueError as exc:
+            results[name] = exc
+
+    threads = [threading.Thread(target=submit, args=(name, items))
+               for name, items in (("good", [1, 2]), ("bad", [-1]), ("other", [3]))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert list(results["good"]) == [1.0, 2.0]
+    assert list(results["other"]) == [3.0]
+    assert isinstance(results["bad"], ValueError)
+    stats = batcher.stats()
+    assert stats["errors"] == 1